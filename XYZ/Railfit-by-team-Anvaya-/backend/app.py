@@ -1,20 +1,37 @@
-from flask import Flask, request, jsonify, send_file, send_from_directory
+from flask import Flask, request, jsonify, send_file, send_from_directory, url_for, Response, stream_with_context
 from flask_cors import CORS
 import base64
+import csv
+import hashlib
 import io
+import itertools
 import os
+import uuid
 from dotenv import load_dotenv
 from services.qr_generator import RailwayQRGenerator
 from services.ai_analyzer import RailwayAIAnalyzer
 from services.udm_tms_integration import UDMTMSIntegrator
 from services.database_service import DatabaseService
-from utils.database import init_db, get_db_session
+from services.sharded_database_service import ShardedDatabaseService, DuplicateItemError
+from services.shard_router import normalize_zone, parse_zone_map
+from services.qr_ref_allocator import QRRefAllocator
+from services.qr_payload import decode_payload
+from services.label_sheet import LabelSheetRenderer, build_layout
+from services.qr_pool import QRPoolService
+from services.lookup_cache import ItemLookupCache, create_shared_cache
+from services.replica_router import set_actor
+from services.item_rollups import ROLLUP_DIMENSIONS
+from services.parquet_export import EXPORTS, stream_parquet, format_watermark
+from utils.database import init_db
+from models.column_types import code_names, is_known
+from utils.json_stream import dumps, iter_json_array, JSON_MIMETYPE
 import json
 from werkzeug.utils import secure_filename
 from datetime import datetime
 from services.advanced_qr_scanner import StateOfTheArtQRScanner
 from services.auth_service import AuthService, role_required
 from services.railway_parts_data import railway_parts_db
+from utils.image_processing import ImageProcessing
 
 # Load environment variables
 load_dotenv()
@@ -27,27 +44,90 @@ app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY', 'railway-secret-key')
 app.config['UPLOAD_FOLDER'] = os.getenv('UPLOAD_FOLDER', 'uploads')
 app.config['QR_CODE_FOLDER'] = os.getenv('QR_CODE_FOLDER', 'generated_qr_codes')
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+app.config['QR_PNG_COMPRESS_LEVEL'] = int(os.getenv('QR_PNG_COMPRESS_LEVEL', '6'))
+app.config['ITEMS_DEFAULT_PAGE_SIZE'] = int(os.getenv('ITEMS_DEFAULT_PAGE_SIZE', '100'))
+app.config['ITEMS_MAX_PAGE_SIZE'] = int(os.getenv('ITEMS_MAX_PAGE_SIZE', '1000'))
+app.config['EXPORT_ROW_GROUP_SIZE'] = int(os.getenv('EXPORT_ROW_GROUP_SIZE', '100000'))
 os.makedirs(app.config['QR_CODE_FOLDER'], exist_ok=True)
 
 # Initialize services
 auth_service = AuthService(app.config['JWT_SECRET_KEY'])
-qr_generator = RailwayQRGenerator()
+lookup_cache = ItemLookupCache(
+    local_size=int(os.getenv('LOOKUP_CACHE_SIZE', '10000')),
+    local_ttl=float(os.getenv('LOOKUP_CACHE_LOCAL_TTL', '60')),
+    shared=create_shared_cache(os.getenv('REDIS_URL')),
+    shared_ttl=int(os.getenv('LOOKUP_CACHE_TTL', '300')),
+    negative_ttl=int(os.getenv('LOOKUP_CACHE_NEGATIVE_TTL', '30')),
+)
+shard_urls = [u.strip() for u in os.getenv('DATABASE_SHARD_URLS', '').split(',') if u.strip()]
+if shard_urls:
+    # Items split over several databases by zone or item_id hash; refs are minted on the item's shard
+    db_service = ShardedDatabaseService(
+        shard_urls,
+        key=os.getenv('SHARD_KEY', 'zone'),
+        zone_map=parse_zone_map(os.getenv('SHARD_ZONES', '')),
+        lookup_cache=lookup_cache,
+        ref_block_size=int(os.getenv('QR_REF_BLOCK_SIZE', '1000')),
+    )
+    qr_ref_allocator = db_service.ref_allocator
+else:
+    db_service = DatabaseService(
+        lookup_cache=lookup_cache,
+        replica_urls=[u.strip() for u in os.getenv('DATABASE_REPLICA_URLS', '').split(',') if u.strip()],
+        replica_max_lag=float(os.getenv('REPLICA_MAX_LAG_SECONDS', '5')),
+        read_your_writes_seconds=float(os.getenv('READ_YOUR_WRITES_SECONDS', '5')),
+    )
+    if db_service.replicas:
+        db_service.replicas.start()
+    qr_ref_allocator = QRRefAllocator(db_service.engine, block_size=int(os.getenv('QR_REF_BLOCK_SIZE', '1000')))
+qr_generator = RailwayQRGenerator(ref_allocator=qr_ref_allocator, payload_mode=os.getenv('QR_PAYLOAD_MODE', 'auto'))
 ai_analyzer = RailwayAIAnalyzer()
 integrator = UDMTMSIntegrator()
-db_service = DatabaseService()
 qr_scanner = StateOfTheArtQRScanner()
 
-# Initialize database
-init_db()
+# Pre-minted QR pool for marking stations (disabled unless QR_POOL_TARGET > 0)
+qr_pool = None
+if int(os.getenv('QR_POOL_TARGET', '0')) > 0 and shard_urls:
+    # Pooled refs are minted before the item (and so its shard) is known
+    print("QR pool disabled: not supported with DATABASE_SHARD_URLS")
+elif int(os.getenv('QR_POOL_TARGET', '0')) > 0:
+    qr_pool = QRPoolService(
+        db_service.engine,
+        qr_generator,
+        app.config['QR_CODE_FOLDER'],
+        railway_parts_db.get_all_parts().keys(),
+        target_size=int(os.getenv('QR_POOL_TARGET')),
+        low_water=int(os.getenv('QR_POOL_LOW_WATER', '50')),
+        interval_seconds=float(os.getenv('QR_POOL_INTERVAL', '30')),
+        png_compress_level=app.config['QR_PNG_COMPRESS_LEVEL'],
+        claim_retention_seconds=float(os.getenv('QR_POOL_CLAIM_RETENTION', '3600')),
+    )
+
+# Initialize database (tables are created once per process) and scope sessions to requests.
+# remove_session ends the primary, read, replica and shard sessions alike
+if not shard_urls:
+    init_db()
+app.teardown_appcontext(lambda exc: db_service.remove_session())
+
+@app.before_request
+def _bind_db_actor():
+    # Read-your-writes key: the caller's token, or its address for anonymous requests
+    set_actor(request.headers.get('Authorization') or request.remote_addr)
+
+@app.before_request
+def _start_qr_pool():
+    # The replenisher starts with the first request, in the serving process, not on import
+    # (scripts and the debug reloader's watcher import this module too)
+    if qr_pool:
+        qr_pool.start()
 
 # Add seed data if database is empty
 def add_seed_data():
     try:
-        from utils.database import get_db_session
         from models.railway_item import RailwayItem
         from datetime import datetime
         
-        session = get_db_session()
+        session = db_service.session
         # Check if database is empty
         item_count = session.query(RailwayItem).count()
         if item_count == 0:
@@ -100,13 +180,16 @@ def add_seed_data():
                 session.add(item)
             
             session.commit()
+            # Seed rows carry legacy inspection_dates; mirror them into the inspections table
+            db_service.backfill_inspections()
+            db_service.rebuild_rollups()
             print(f"Added {len(sample_items)} sample items to database")
         else:
             print(f"Database already contains {item_count} items")
-        
-        session.close()
     except Exception as e:
         print(f"Error adding seed data: {e}")
+    finally:
+        db_service.remove_session()
 
 # Add seed data
 add_seed_data()
@@ -117,6 +200,35 @@ app.config['MAX_CONTENT_LENGTH'] = int(os.getenv('MAX_UPLOAD_SIZE', str(16 * 102
 def allowed_file(filename: str) -> bool:
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def _negotiate_qr_format():
+    """Pick the QR output format from ?format=, else the Accept header, else PNG"""
+    fmt = (request.args.get('format') or '').lower()
+    if fmt:
+        return fmt if fmt in ImageProcessing.MIMETYPES else None
+    by_mimetype = {v: k for k, v in ImageProcessing.MIMETYPES.items()}
+    best = request.accept_mimetypes.best_match(list(by_mimetype), default='image/png')
+    return by_mimetype[best]
+
+def _qr_filename(qr_ref: str, fmt: str = 'png') -> str:
+    return f"railway_qr_mfg_{qr_ref}.{fmt}"
+
+def _qr_etag(data: bytes) -> str:
+    return hashlib.sha1(data).hexdigest()
+
+def _multipart_mixed(parts):
+    """Build a multipart/mixed response from (headers, body_bytes) pairs"""
+    boundary = uuid.uuid4().hex
+    body = io.BytesIO()
+    for headers, payload in parts:
+        body.write(f"--{boundary}\r\n".encode())
+        for key, value in headers.items():
+            body.write(f"{key}: {value}\r\n".encode())
+        body.write(b"\r\n")
+        body.write(payload)
+        body.write(b"\r\n")
+    body.write(f"--{boundary}--\r\n".encode())
+    return Response(body.getvalue(), mimetype=f'multipart/mixed; boundary={boundary}')
+
 # Friendly index routes so opening http://localhost:5000 doesn't 404
 @app.route('/', methods=['GET'])
 def root_index():
@@ -150,10 +262,20 @@ def api_index():
             'POST /api/login',
             'GET  /api/verify-token',
             'POST /api/manufacturer/generate-qr',
+            'POST /api/manufacturer/label-sheets',
+            'POST /api/manufacturer/claim-qr',
+            'GET  /api/manufacturer/qr-pool',
             'POST /api/vendor/search-parts',
             'POST /api/vendor/parts-summary',
             'POST /api/official/scan-qr',
-            'GET  /api/items',
+            'GET  /api/items?limit=&cursor=&fields=',
+            'POST /api/items/bulk',
+            'GET  /api/items/search?q=&limit=',
+            'GET|POST /api/items/<item_id>/inspections',
+            'GET  /api/inspections/overdue?days=',
+            'GET  /api/warranties/expiring?days=&item_type=&expired=',
+            'GET  /api/stats?dimensions=&top=',
+            'GET  /api/export/<items|inspections|tombstones>.parquet?since=',
             'GET  /api/download/qr/<qr_ref>',
             'GET  /api/health'
         ]
@@ -207,52 +329,184 @@ def verify_token():
     return jsonify(result)
 
 
+def _unknown_code(kind: str) -> str:
+    return f"{kind} must be one of: {', '.join(code_names(kind))}"
+
+
+def _item_store():
+    """DatabaseService for per-shard feeds (changes, exports): ?shard=N when the store is sharded"""
+    if isinstance(db_service, ShardedDatabaseService):
+        return db_service.shard(request.args.get('shard'))
+    return db_service
+
+
+def _attach_part_specifications(item_data):
+    """Attach comprehensive part specifications if available"""
+    part_specs = railway_parts_db.get_part_specifications(item_data.get('item_type', ''))
+    if part_specs:
+        item_data['specifications'] = {
+            'material': part_specs.material,
+            'material_grade': part_specs.material_grade,
+            'service_life_years': part_specs.service_life_years,
+            'load_capacity_kn': part_specs.load_capacity_kn,
+            'rdso_specification': part_specs.rdso_specification,
+            'testing_requirements': part_specs.testing_requirements,
+            'maintenance_interval_months': part_specs.maintenance_interval_months,
+        }
+
+
 @app.route('/api/manufacturer/generate-qr', methods=['POST'])
 @role_required('manufacturer')
 def manufacturer_generate_qr():
     try:
         item_data = request.get_json() or {}
         item_data['manufacturer'] = getattr(request, 'user', {}).get('name')
+        if item_data.get('item_type') and not is_known('item_type', item_data['item_type']):
+            return jsonify({'success': False, 'error': _unknown_code('item_type')}), 400
+        # Also picks the shard the ref is minted on; a malformed zone is a 400
+        item_data['zone'] = normalize_zone(item_data.get('zone'))
+
+        _attach_part_specifications(item_data)
 
-        # Attach comprehensive part specifications if available
-        part_specs = railway_parts_db.get_part_specifications(item_data.get('item_type', ''))
-        if part_specs:
-            item_data['specifications'] = {
-                'material': part_specs.material,
-                'material_grade': part_specs.material_grade,
-                'service_life_years': part_specs.service_life_years,
-                'load_capacity_kn': part_specs.load_capacity_kn,
-                'rdso_specification': part_specs.rdso_specification,
-                'testing_requirements': part_specs.testing_requirements,
-                'maintenance_interval_months': part_specs.maintenance_interval_months,
-            }
-
-        # Generate QR with manufacturer styling
-        qr_image, qr_ref = qr_generator.generate_railway_qr(item_data, 'manufacturer')
+        # Response mode: base64 (default, legacy UI), url, or multipart
+        response_mode = (request.args.get('response') or 'base64').lower()
+        if response_mode not in ('base64', 'url', 'multipart'):
+            return jsonify({'success': False, 'error': f'Unsupported response mode: {response_mode}'}), 400
+        fmt = _negotiate_qr_format()
+        if not fmt:
+            return jsonify({'success': False, 'error': 'Unsupported QR format'}), 400
+
+        # Generate QR with manufacturer styling, encoded once
+        qr_bytes, mimetype, qr_ref = qr_generator.generate_railway_qr_encoded(
+            item_data, 'manufacturer', fmt, app.config['QR_PNG_COMPRESS_LEVEL']
+        )
 
         # Save to DB
         try:
             db_service.save_item(item_data, qr_ref)
+        except DuplicateItemError as e:
+            return jsonify({'success': False, 'error': str(e)}), 409
         except Exception as e:
             print(f"DB save error: {e}")
 
-        # Convert to base64
-        img_buffer = io.BytesIO()
-        qr_image.save(img_buffer, format='PNG')
-        img_base64 = base64.b64encode(img_buffer.getvalue()).decode()
-
-        # Save file
-        filename = f"railway_qr_mfg_{qr_ref}.png"
+        # Save file (raw bytes, no re-encode)
+        filename = _qr_filename(qr_ref, fmt)
         filepath = os.path.join(app.config['QR_CODE_FOLDER'], filename)
-        qr_image.save(filepath)
+        with open(filepath, 'wb') as fh:
+            fh.write(qr_bytes)
 
-        return jsonify({
+        result = {
             'success': True,
             'qr_ref': qr_ref,
-            'qr_image': img_base64,
             'filename': filename,
+            'format': fmt,
+            'etag': _qr_etag(qr_bytes),
+            'specifications': item_data.get('specifications', {})
+        }
+        if response_mode == 'base64':
+            result['qr_image'] = base64.b64encode(qr_bytes).decode()
+            return jsonify(result)
+
+        result['qr_url'] = url_for('download_qr', qr_ref=qr_ref, format=fmt)
+        if response_mode == 'url':
+            return jsonify(result)
+        return _multipart_mixed([
+            ({'Content-Type': 'application/json'}, json.dumps(result).encode('utf-8')),
+            ({'Content-Type': mimetype, 'Content-Disposition': f'attachment; filename="{filename}"'}, qr_bytes),
+        ])
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/manufacturer/claim-qr', methods=['POST'])
+@role_required('manufacturer')
+def manufacturer_claim_qr():
+    """Bind item metadata to a pre-minted QR from the pool (falls back to generating one)"""
+    try:
+        item_data = request.get_json() or {}
+        item_data['manufacturer'] = getattr(request, 'user', {}).get('name')
+        if not item_data.get('item_type'):
+            return jsonify({'success': False, 'error': 'item_type is required'}), 400
+        if not is_known('item_type', item_data['item_type']):
+            return jsonify({'success': False, 'error': _unknown_code('item_type')}), 400
+        try:
+            item_data['zone'] = normalize_zone(item_data.get('zone'))
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        _attach_part_specifications(item_data)
+
+        station = item_data.get('station_id') or item_data['manufacturer']
+        claimed = qr_pool.claim(item_data['item_type'], station) if qr_pool else None
+        if claimed:
+            qr_ref = claimed['qr_ref']
+        else:
+            qr_bytes, _, qr_ref = qr_generator.generate_railway_qr_encoded(
+                item_data, 'manufacturer', 'png', app.config['QR_PNG_COMPRESS_LEVEL']
+            )
+            with open(os.path.join(app.config['QR_CODE_FOLDER'], _qr_filename(qr_ref)), 'wb') as fh:
+                fh.write(qr_bytes)
+
+        try:
+            db_service.save_item(item_data, qr_ref)
+        except Exception:
+            # Nothing references the pooled ref yet: hand it to the next claim
+            if claimed:
+                qr_pool.release(qr_ref)
+            raise
+        return jsonify({
+            'success': True,
+            'qr_ref': qr_ref,
+            'filename': _qr_filename(qr_ref),
+            'qr_url': url_for('download_qr', qr_ref=qr_ref, format='png'),
+            'from_pool': bool(claimed),
             'specifications': item_data.get('specifications', {})
         })
+    except DuplicateItemError as e:
+        return jsonify({'success': False, 'error': str(e)}), 409
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/manufacturer/qr-pool', methods=['GET'])
+@role_required('manufacturer')
+def manufacturer_qr_pool_status():
+    if not qr_pool:
+        return jsonify({'success': True, 'enabled': False})
+    return jsonify({'success': True, 'enabled': True, 'target_size': qr_pool.target_size, 'available': qr_pool.stats()})
+
+@app.route('/api/manufacturer/label-sheets', methods=['POST'])
+@role_required('manufacturer')
+def manufacturer_label_sheets():
+    """Stream printable label sheets (PDF, or a ZIP of PNG pages) for a lot"""
+    try:
+        data = request.get_json() or {}
+        filters = {
+            'item_type': data.get('item_type'),
+            'vendor_lot': data.get('vendor_lot'),
+            'date_range': (data.get('date_from'), data.get('date_to'))
+        }
+        if not filters['item_type'] and not filters['vendor_lot']:
+            return jsonify({'success': False, 'error': 'Provide vendor_lot and/or item_type'}), 400
+        fmt = (data.get('format') or 'pdf').lower()
+        if fmt not in ('pdf', 'png'):
+            return jsonify({'success': False, 'error': f'Unsupported sheet format: {fmt}'}), 400
+        layout = build_layout(data.get('layout', 'a4_3x8'), data.get('layout_overrides'))
+        renderer = LabelSheetRenderer(qr_generator, layout)
+        items = db_service.iter_item_refs(filters)
+
+        name = secure_filename(filters['vendor_lot'] or filters['item_type']) or 'labels'
+        if fmt == 'pdf':
+            body, mimetype, filename = renderer.stream_pdf(items), 'application/pdf', f'labels_{name}.pdf'
+        else:
+            body = renderer.stream_png_zip(items, app.config['QR_PNG_COMPRESS_LEVEL'])
+            mimetype, filename = 'application/zip', f'labels_{name}.zip'
+        return Response(
+            stream_with_context(body),
+            mimetype=mimetype,
+            headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+        )
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -274,12 +528,10 @@ def official_scan_qr():
             try:
                 best = qr_scanner.scan_qr(file_path)
                 if best and best.get('success'):
-                    qr_data = best.get('data', '')
-                    if 'INDIAN_RAILWAYS:' in qr_data:
-                        qr_ref = qr_data.replace('INDIAN_RAILWAYS:', '')
-                        item = db_service.get_item_by_qr_ref(qr_ref)
-                        if item:
-                            item_data = item.to_dict()
+                    qr_ref = decode_payload(best.get('data', ''))
+                    if qr_ref:
+                        item_data = db_service.get_item_data_by_qr_ref(qr_ref)
+                        if item_data:
                             ai_insights = ai_analyzer.analyze_item_performance(item_data)
                             item_data['ai_insights'] = ai_insights
                             return jsonify({
@@ -306,24 +558,35 @@ def official_scan_qr():
 @app.route('/api/vendor/search-parts', methods=['POST'])
 @role_required('vendor')
 def vendor_search_parts():
+    """Matching items streamed as JSON straight from Core rows (no ORM objects)"""
     try:
         search_data = request.get_json() or {}
-        print(f"Vendor search request: {search_data}")
-        
-        # Get all items first to debug
-        all_items = db_service.list_items()
-        print(f"Total items in database: {len(all_items)}")
-        
-        items = db_service.search_items({
+        records = db_service.iter_item_records({
             'item_type': search_data.get('part_type'),
             'vendor_lot': search_data.get('supplier'),
-            'date_range': (search_data.get('date_from'), search_data.get('date_to'))
+            'date_range': (search_data.get('date_from'), search_data.get('date_to')),
+            'supply_year': search_data.get('supply_year'),
+            'zone': search_data.get('zone'),
         })
-        print(f"Search results: {len(items)} items found")
-        
-        udm_links = [{'item_id': i.item_id, 'link': f"https://ireps.gov.in/udm/item/{i.item_id}", 'status': 'Active'} for i in items]
-        tms_links = [{'item_id': i.item_id, 'link': f"https://www.irecept.gov.in/tms/item/{i.item_id}", 'status': 'Tracked'} for i in items]
-        return jsonify({'success': True, 'total_items': len(items), 'items': [i.to_dict() for i in items], 'udm_links': udm_links, 'tms_links': tms_links})
+        # Run the query before the response starts so database errors still return a 500
+        first = next(records, None)
+        item_ids = []
+
+        def collect():
+            for record in itertools.chain([first] if first is not None else [], records):
+                item_ids.append(record['item_id'])
+                yield record
+
+        def body():
+            yield b'{"success":true,"items":'
+            yield from iter_json_array(collect())
+            yield b',"udm_links":'
+            yield from iter_json_array({'item_id': i, 'link': f"https://ireps.gov.in/udm/item/{i}", 'status': 'Active'} for i in item_ids)
+            yield b',"tms_links":'
+            yield from iter_json_array({'item_id': i, 'link': f"https://www.irecept.gov.in/tms/item/{i}", 'status': 'Tracked'} for i in item_ids)
+            yield b',"total_items":' + dumps(len(item_ids)) + b'}'
+
+        return Response(stream_with_context(body()), mimetype=JSON_MIMETYPE)
     except Exception as e:
         print(f"Vendor search error: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -346,94 +609,151 @@ def vendor_parts_summary():
             print(f"Validation failed: part_type={part_type}, quantity={quantity}")
             return jsonify({'success': False, 'message': 'Please provide valid part type and quantity'}), 400
 
-        session = get_db_session()
-        try:
-            try:
-                from backend.models.railway_item import RailwayItem
-            except Exception:
-                from models.railway_item import RailwayItem
-
-            existing_parts = (
-                session.query(RailwayItem)
-                .filter(RailwayItem.item_type == part_type, RailwayItem.status == 'active')
-                .limit(quantity)
-                .all()
-            )
-            print(f"Found {len(existing_parts)} parts of type {part_type}")
-
-            if not existing_parts:
-                return jsonify({
-                    'success': False,
-                    'message': f'No {part_type.replace("_", " ").title()} parts found in database',
-                    'part_type': part_type,
-                    'requested_quantity': quantity,
-                    'found_quantity': 0
-                })
-
-            found_quantity = len(existing_parts)
-            if found_quantity < quantity:
-                return jsonify({
-                    'success': False,
-                    'message': f'Only {found_quantity} {part_type.replace("_", " ").title()} parts available (requested: {quantity})',
-                    'part_type': part_type,
-                    'requested_quantity': quantity,
-                    'found_quantity': found_quantity,
-                    'available_parts': [
-                        {
-                            'item_id': part.item_id,
-                            'vendor_lot': part.vendor_lot,
-                            'supply_date': part.supply_date.isoformat() if part.supply_date else None
-                        } for part in existing_parts
-                    ]
-                })
-
-            parts_data = []
-            for part in existing_parts:
-                parts_data.append({
-                    'item_id': part.item_id,
-                    'item_type': part.item_type,
-                    'vendor_lot': part.vendor_lot,
-                    'supply_date': part.supply_date.isoformat() if part.supply_date else None,
-                    'manufacturer': part.manufacturer,
-                    'quality_score': part.quality_score
-                })
-
-            udm_sync_result = integrator.sync_to_udm(parts_data)
-            tms_sync_result = integrator.sync_to_tms(parts_data)
+        existing_parts = db_service.find_active_parts(part_type, quantity)
+        print(f"Found {len(existing_parts)} parts of type {part_type}")
 
+        if not existing_parts:
             return jsonify({
-                'success': True,
-                'message': f'Summary generated for {found_quantity} {part_type.replace("_", " ").title()} parts',
-                'summary': {
-                    'part_type': part_type,
-                    'total_parts': found_quantity,
-                    'generated_at': datetime.now().isoformat(),
-                    'database_sync': True,
-                    'udm_sync': bool(udm_sync_result.get('success')),
-                    'tms_sync': bool(tms_sync_result.get('success'))
-                },
-                'parts_data': parts_data,
-                'udm_sync_result': udm_sync_result,
-                'tms_sync_result': tms_sync_result
+                'success': False,
+                'message': f'No {part_type.replace("_", " ").title()} parts found in database',
+                'part_type': part_type,
+                'requested_quantity': quantity,
+                'found_quantity': 0
             })
-        finally:
-            try:
-                session.close()
-            except Exception:
-                pass
+
+        found_quantity = len(existing_parts)
+        if found_quantity < quantity:
+            return jsonify({
+                'success': False,
+                'message': f'Only {found_quantity} {part_type.replace("_", " ").title()} parts available (requested: {quantity})',
+                'part_type': part_type,
+                'requested_quantity': quantity,
+                'found_quantity': found_quantity,
+                'available_parts': [
+                    {
+                        'item_id': part.item_id,
+                        'vendor_lot': part.vendor_lot,
+                        'supply_date': part.supply_date.isoformat() if part.supply_date else None
+                    } for part in existing_parts
+                ]
+            })
+
+        parts_data = []
+        for part in existing_parts:
+            parts_data.append({
+                'item_id': part.item_id,
+                'item_type': part.item_type,
+                'vendor_lot': part.vendor_lot,
+                'supply_date': part.supply_date.isoformat() if part.supply_date else None,
+                'manufacturer': part.manufacturer,
+                'quality_score': part.quality_score
+            })
+
+        udm_sync_result = integrator.sync_to_udm(parts_data)
+        tms_sync_result = integrator.sync_to_tms(parts_data)
+
+        return jsonify({
+            'success': True,
+            'message': f'Summary generated for {found_quantity} {part_type.replace("_", " ").title()} parts',
+            'summary': {
+                'part_type': part_type,
+                'total_parts': found_quantity,
+                'generated_at': datetime.now().isoformat(),
+                'database_sync': True,
+                'udm_sync': bool(udm_sync_result.get('success')),
+                'tms_sync': bool(tms_sync_result.get('success'))
+            },
+            'parts_data': parts_data,
+            'udm_sync_result': udm_sync_result,
+            'tms_sync_result': tms_sync_result
+        })
     except Exception as e:
         return jsonify({'success': False, 'message': f'Error generating parts summary: {str(e)}'}), 500
 
+@app.route('/api/stats', methods=['GET'])
+@role_required('vendor', 'railway_official', 'manufacturer')
+def fleet_stats():
+    """Item counts per dimension, served from the rollup table only.
+
+    Query: dimensions=item_type,status,... (default all), top=N keys per dimension (default 50).
+    """
+    try:
+        dimensions = [d.strip() for d in request.args.get('dimensions', '').split(',') if d.strip()]
+        unknown = [d for d in dimensions if d not in ROLLUP_DIMENSIONS]
+        if unknown:
+            return jsonify({'success': False, 'error': f'Unknown dimensions: {", ".join(unknown)}'}), 400
+        try:
+            top = max(1, min(int(request.args.get('top', 50)), 1000))
+        except ValueError:
+            return jsonify({'success': False, 'error': 'top must be an integer'}), 400
+        counts = db_service.get_rollups(tuple(dimensions) or ROLLUP_DIMENSIONS, top)
+        # Every item has exactly one status, so the status rollup also gives the total
+        status = counts.get('status') or db_service.get_rollups(('status',), 1000)['status']
+        return jsonify({'success': True, 'total_items': sum(status.values()), 'counts': counts})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/export/<table>.parquet', methods=['GET'])
+@role_required('vendor', 'railway_official')
+def export_parquet(table):
+    """Stream a table (items, inspections or tombstones) as one Parquet file, a row group at a time.
+
+    Query: since=<X-Export-Watermark of an earlier download> for only the rows changed after it;
+    shard=N (required when sharded: each shard is exported with its own watermark).
+    Incremental items files carry no archived rows: fetch tombstones (archive / restore
+    records, with their own watermark) to drop them.
+    """
+    if table not in EXPORTS:
+        return jsonify({'success': False, 'error': f'Unknown export: {table}'}), 404
+    try:
+        store = _item_store()
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    try:
+        watermark, chunks = stream_parquet(store.read_engine, table, request.args.get('since'),
+                                           app.config['EXPORT_ROW_GROUP_SIZE'])
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Invalid since watermark'}), 400
+    except RuntimeError as e:
+        return jsonify({'success': False, 'error': str(e)}), 501
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+    headers = {'Content-Disposition': f'attachment; filename="{table}.parquet"'}
+    if watermark is not None:
+        headers['X-Export-Watermark'] = str(format_watermark(watermark))
+    return Response(stream_with_context(chunks), mimetype='application/vnd.apache.parquet', headers=headers)
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
-    return jsonify({'status': 'healthy', 'service': 'Indian Railways QR System', 'version': '2.0.0'})
+    body = {'status': 'healthy', 'service': 'Indian Railways QR System', 'version': '2.0.0'}
+    if db_service.replicas:
+        body['replicas'] = db_service.replicas.stats()
+    if isinstance(db_service, ShardedDatabaseService):
+        body['shards'] = db_service.stats()
+    return jsonify(body)
 
 # Backwards compatibility routes (optional)
 @app.route('/api/download/qr/<qr_ref>', methods=['GET'])
 def download_qr(qr_ref):
     try:
-        filename = os.path.join(app.config['QR_CODE_FOLDER'], f'railway_qr_mfg_{qr_ref}.png')
-        return send_file(filename, as_attachment=True)
+        fmt = (request.args.get('format') or 'png').lower()
+        if fmt not in ImageProcessing.MIMETYPES:
+            return jsonify({'error': f'Unsupported QR format: {fmt}'}), 400
+        filename = _qr_filename(secure_filename(qr_ref), fmt)
+        with open(os.path.join(app.config['QR_CODE_FOLDER'], filename), 'rb') as fh:
+            data = fh.read()
+        # Content-hash ETag matches the one returned at generation time
+        return send_file(
+            io.BytesIO(data),
+            mimetype=ImageProcessing.mimetype_for(fmt),
+            as_attachment=True,
+            download_name=filename,
+            etag=_qr_etag(data),
+            conditional=True,
+            max_age=86400,
+        )
+    except FileNotFoundError:
+        return jsonify({'error': 'QR image not found'}), 404
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -459,12 +779,271 @@ def sync_with_tms():
 
 @app.route('/api/items', methods=['GET'])
 def get_all_items():
+    """Keyset-paginated item listing.
+
+    Query: limit (capped at ITEMS_MAX_PAGE_SIZE), cursor (from X-Next-Cursor),
+    fields=a,b,c, item_type, vendor_lot, status, manufacturer, zone, supply_from, supply_to, supply_year.
+    The body stays a JSON array; the next page is advertised via X-Next-Cursor / Link.
+    """
+    try:
+        args = request.args
+        try:
+            limit = int(args.get('limit', app.config['ITEMS_DEFAULT_PAGE_SIZE']))
+            after_id = int(args['cursor']) if args.get('cursor') else None
+        except ValueError:
+            return jsonify({'error': 'limit and cursor must be integers'}), 400
+        limit = max(1, min(limit, app.config['ITEMS_MAX_PAGE_SIZE']))
+        fields = [f.strip() for f in args.get('fields', '').split(',') if f.strip()] or None
+        filters = {
+            'item_type': args.get('item_type'),
+            'vendor_lot': args.get('vendor_lot'),
+            'status': args.get('status'),
+            'manufacturer': args.get('manufacturer'),
+            'date_range': (args.get('supply_from'), args.get('supply_to')),
+            'supply_year': args.get('supply_year'),
+            'zone': args.get('zone'),
+        }
+        try:
+            rows, next_cursor = db_service.list_items_page(filters, fields, after_id, limit)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        response = Response(dumps(rows), mimetype=JSON_MIMETYPE)
+        if next_cursor is not None:
+            query = args.to_dict()
+            query.update({'cursor': next_cursor, 'limit': limit})
+            response.headers['X-Next-Cursor'] = str(next_cursor)
+            response.headers['Link'] = f'<{url_for("get_all_items", **query)}>; rel="next"'
+        return response
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/items/bulk', methods=['POST'])
+@role_required('manufacturer', 'vendor')
+def bulk_ingest_items():
+    """Ingest a supplier manifest in set-based batches.
+
+    Body: JSON {"items": [...], "on_conflict": "update"|"ignore", "batch_size": n},
+    a bare JSON array, or text/csv with a header row. Existing item_ids are
+    upserted (or skipped) and keep their qr_ref; rows without qr_ref get new ones.
+    The request is bounded by MAX_UPLOAD_SIZE, so very large manifests are sent in chunks.
+    """
+    try:
+        options = request.args.to_dict()
+        if request.mimetype == 'text/csv':
+            reader = csv.DictReader(io.StringIO(request.get_data(as_text=True)))
+            items = ({k: v for k, v in row.items() if v != ''} for row in reader)
+        else:
+            body = request.get_json(silent=True)
+            if isinstance(body, dict):
+                items = body.get('items')
+                options.update({k: body[k] for k in ('on_conflict', 'batch_size') if k in body})
+            else:
+                items = body
+            if not isinstance(items, list):
+                return jsonify({'error': 'Expected a JSON array of items or {"items": [...]}'}), 400
+        try:
+            batch_size = max(1, min(int(options.get('batch_size', 5000)), 50000))
+        except ValueError:
+            return jsonify({'error': 'batch_size must be an integer'}), 400
+        if request.user.get('role') == 'manufacturer':
+            # Same as generate-qr: a manufacturer can only register its own parts
+            manufacturer = request.user.get('name')
+            items = ({**item, 'manufacturer': manufacturer} if isinstance(item, dict) else item for item in items)
+        try:
+            report = db_service.bulk_save_items(
+                items,
+                ref_factory=qr_generator.create_qr_references,
+                batch_size=batch_size,
+                on_conflict=options.get('on_conflict', 'update'),
+            )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        status = 200 if report['written'] or not report['total'] else 422
+        return jsonify({'success': report['written'] > 0 or report['total'] == 0, **report}), status
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/items/search', methods=['GET'])
+@role_required('railway_official', 'vendor', 'manufacturer')
+def quick_search_items():
+    """Ranked prefix / substring / fuzzy matches of q against item_id, vendor_lot and manufacturer.
+
+    Query: q (required), limit (default 20, max 100).
+    """
+    try:
+        query = (request.args.get('q') or '').strip()
+        if not query:
+            return jsonify({'success': False, 'error': 'q is required'}), 400
+        if len(query) > 100:
+            return jsonify({'success': False, 'error': 'q is limited to 100 characters'}), 400
+        try:
+            limit = max(1, min(int(request.args.get('limit', 20)), 100))
+        except ValueError:
+            return jsonify({'success': False, 'error': 'limit must be an integer'}), 400
+        items = db_service.quick_search(query, limit)
+        return jsonify({
+            'success': True,
+            'query': query,
+            'backend': db_service.search_backend,
+            'total': len(items),
+            'items': items,
+        })
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/items/<qr_ref>/restore', methods=['POST'])
+@role_required('railway_official')
+def restore_archived_item(qr_ref):
+    """Move an archived (retired) item back into the active table"""
+    try:
+        restored = db_service.restore_item(qr_ref)
+        if restored is None:
+            return jsonify({'success': False, 'error': 'No archived item with this QR ref'}), 404
+        return jsonify({'success': True, 'item': restored})
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 409
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/items/<qr_ref>/status', methods=['PATCH'])
+@role_required('railway_official')
+def update_item_status(qr_ref):
+    """Body: {"status": "replaced"} (active, replaced, scrapped, under_inspection, ...)"""
+    try:
+        status = (request.get_json() or {}).get('status')
+        if not is_known('status', status):
+            return jsonify({'success': False, 'error': _unknown_code('status')}), 400
+        item = db_service.update_item_status(qr_ref, status)
+        if item is None:
+            return jsonify({'success': False, 'error': 'Item not found'}), 404
+        return jsonify({'success': True, 'item': item.to_dict()})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/changes', methods=['GET'])
+@role_required('railway_official', 'vendor', 'manufacturer')
+def list_changes():
+    """Item change feed, oldest first.
+
+    Query: since (last id processed, default 0), limit (max 5000), ops=created,status,...,
+    item_id, shard=N (required when sharded: ids and feeds are per shard).
+    Keep `next` from the response and pass it as `since` on the next call.
+    """
+    try:
+        args = request.args
+        try:
+            since = int(args.get('since', 0))
+            limit = max(1, min(int(args.get('limit', 1000)), 5000))
+        except ValueError:
+            return jsonify({'success': False, 'error': 'since and limit must be integers'}), 400
+        ops = [o.strip() for o in args.get('ops', '').split(',') if o.strip()] or None
+        try:
+            store = _item_store()
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        changes = store.get_changes(since, limit, ops, args.get('item_id'))
+        return Response(dumps({
+            'success': True,
+            'changes': changes,
+            'next': changes[-1]['id'] if changes else since,
+            'has_more': len(changes) == limit,
+        }), mimetype=JSON_MIMETYPE)
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/items/<item_id>/inspections', methods=['POST'])
+@role_required('railway_official')
+def record_item_inspection(item_id):
+    """Append an inspection; body: inspected_at (ISO, default now), result, notes"""
+    try:
+        data = request.get_json() or {}
+        inspected_at = None
+        if data.get('inspected_at'):
+            inspected_at = db_service.parse_date(data['inspected_at'])
+            if inspected_at is None:
+                return jsonify({'success': False, 'error': 'inspected_at must be an ISO date'}), 400
+        recorded = db_service.record_inspection(
+            item_id,
+            inspected_at=inspected_at,
+            inspector=request.user.get('name'),
+            result=data.get('result'),
+            notes=data.get('notes'),
+        )
+        if recorded is None:
+            return jsonify({'success': False, 'error': 'Item not found'}), 404
+        inspection, created = recorded
+        return jsonify({'success': True, 'inspection': inspection}), 201 if created else 200
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/items/<item_id>/inspections', methods=['GET'])
+def list_item_inspections(item_id):
     try:
-        items = db_service.list_items()
-        return jsonify([i.to_dict() for i in items])
+        limit = max(1, min(int(request.args.get('limit', 100)), 1000))
+        return jsonify(db_service.list_inspections(item_id, limit))
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/inspections/overdue', methods=['GET'])
+@role_required('railway_official', 'vendor')
+def overdue_inspections():
+    """Active items not inspected for `days` (default 180), never-inspected first"""
+    try:
+        try:
+            days = int(request.args.get('days', 180))
+            limit = max(1, min(int(request.args.get('limit', 100)), app.config['ITEMS_MAX_PAGE_SIZE']))
+        except ValueError:
+            return jsonify({'success': False, 'error': 'days and limit must be integers'}), 400
+        include_never = request.args.get('include_never', 'true').lower() not in ('0', 'false', 'no')
+        items = db_service.find_overdue_items(days, request.args.get('item_type'), include_never, limit)
+        return jsonify({
+            'success': True,
+            'days': days,
+            'total': len(items),
+            'items': [{
+                'item_id': i.item_id,
+                'qr_ref': i.qr_ref,
+                'item_type': i.item_type,
+                'vendor_lot': i.vendor_lot,
+                'last_inspected_at': i.last_inspected_at.isoformat() if i.last_inspected_at else None,
+            } for i in items],
+        })
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/warranties/expiring', methods=['GET'])
+@role_required('railway_official', 'vendor')
+def expiring_warranties():
+    """Active items whose warranty runs out within `days` (default 90), soonest first;
+    expired=true lists those that ran out in the last `days` instead"""
+    try:
+        try:
+            days = max(0, int(request.args.get('days', 90)))
+            limit = max(1, min(int(request.args.get('limit', 100)), app.config['ITEMS_MAX_PAGE_SIZE']))
+        except ValueError:
+            return jsonify({'success': False, 'error': 'days and limit must be integers'}), 400
+        expired = request.args.get('expired', 'false').lower() in ('1', 'true', 'yes')
+        items = db_service.find_expiring_warranties(days, request.args.get('item_type'), expired, limit)
+        return jsonify({
+            'success': True,
+            'days': days,
+            'expired': expired,
+            'total': len(items),
+            'items': [{
+                'item_id': i.item_id,
+                'qr_ref': i.qr_ref,
+                'item_type': i.item_type,
+                'vendor_lot': i.vendor_lot,
+                'warranty_period': i.warranty_period,
+                'warranty_expiry_date': i.warranty_expiry_date.date().isoformat(),
+            } for i in items],
+        })
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 # --------- Parts Specification APIs ---------
 @app.route('/api/parts/specifications/<part_type>', methods=['GET'])
 def get_part_specifications(part_type):
@@ -502,21 +1081,12 @@ def search_parts_specifications():
 @app.route('/api/lookup/<qr_ref>', methods=['GET'])
 def lookup_qr_ref(qr_ref):
     try:
-        print(f"Looking up QR ref: {qr_ref}")
-        
-        # Debug: List all items
-        all_items = db_service.list_items()
-        print(f"Total items in database: {len(all_items)}")
-        for item in all_items:
-            print(f"Item: {item.item_id}, QR: {item.qr_ref}")
-        
-        item = db_service.get_item_by_qr_ref(qr_ref)
-        if not item:
-            print(f"QR ref {qr_ref} not found in database")
+        # Accept a raw scanned payload as well as a bare ref
+        qr_ref = decode_payload(qr_ref) or qr_ref
+        item_data = db_service.get_item_data_by_qr_ref(qr_ref)
+        if not item_data:
             return jsonify({'success': False, 'error': 'Not found'}), 404
-        
-        print(f"Found item: {item.item_id}")
-        return jsonify(item.to_dict())
+        return jsonify(item_data)
     except Exception as e:
         print(f"Lookup error: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
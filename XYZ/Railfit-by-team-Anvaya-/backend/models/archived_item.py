@@ -0,0 +1,46 @@
+from sqlalchemy import Column, Integer, String, DateTime, LargeBinary, Index
+from datetime import datetime
+import json
+import zlib
+
+try:
+    from backend.models.railway_item import Base, RailwayItem
+    from backend.models.column_types import CalendarDate
+except Exception:
+    from models.railway_item import Base, RailwayItem
+    from models.column_types import CalendarDate
+
+class ArchivedItem(Base):
+    """A retired railway_items row moved out of the hot table; the full row is kept as zlib-compressed JSON"""
+    __tablename__ = 'railway_items_archive'
+
+    id = Column(Integer, primary_key=True)
+    item_id = Column(String(50), nullable=False)
+    qr_ref = Column(String(12), nullable=False)
+    status = Column(String(20))
+    archived_at = Column(DateTime, default=datetime.utcnow)
+    payload = Column(LargeBinary, nullable=False)
+
+    # Lookup fallback by qr_ref, restore / duplicate checks by item_id
+    __table_args__ = (
+        Index('ix_railway_items_archive_qr_ref', 'qr_ref'),
+        Index('ix_railway_items_archive_item_id', 'item_id'),
+    )
+
+    @staticmethod
+    def pack(row) -> bytes:
+        """Compress a railway_items row mapping"""
+        data = {k: (v.isoformat() if isinstance(v, datetime) else v) for k, v in row.items()}
+        return zlib.compress(json.dumps(data, separators=(',', ':')).encode('utf-8'), 6)
+
+    def unpack(self) -> dict:
+        """The archived row with datetime columns parsed back"""
+        data = json.loads(zlib.decompress(self.payload))
+        for column in RailwayItem.__table__.columns:
+            if isinstance(column.type, (DateTime, CalendarDate)) and data.get(column.name):
+                data[column.name] = datetime.fromisoformat(data[column.name])
+        return data
+
+    def to_item(self) -> RailwayItem:
+        """Transient (never added to a session) RailwayItem with the archived values"""
+        return RailwayItem(**self.unpack())
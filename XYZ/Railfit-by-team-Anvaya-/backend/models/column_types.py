@@ -0,0 +1,146 @@
+"""Compact column types for railway_items.
+
+EnumCode stores a small-integer code for a fixed vocabulary (item_type,
+status) and hands the name back to Python; the codes live in the item_codes
+lookup table (models/item_code.py). CalendarDate stores a day: DATE on
+PostgreSQL, days since 1970-01-01 on SQLite; Python sees midnight datetimes,
+so API output and comparisons are the same as for a DateTime column.
+"""
+import threading
+from datetime import date, datetime, timedelta
+from sqlalchemy import Date, Integer, SmallInteger, String, case, cast
+from sqlalchemy.types import TypeDecorator
+
+# Built-in codes, never renumbered; further names can be added as item_codes rows
+DEFAULT_CODES = {
+    'item_type': {'elastic_rail_clip': 1, 'rail_pad': 2, 'liner': 3, 'sleeper': 4},
+    'status': {'active': 1, 'replaced': 2, 'scrapped': 3, 'under_inspection': 4},
+}
+# Code bound for an unknown name in a comparison: matches no row
+NO_CODE = -1
+EPOCH = date(1970, 1, 1)
+
+_codes = {kind: dict(names) for kind, names in DEFAULT_CODES.items()}
+_names = {kind: {code: name for name, code in names.items()} for kind, names in DEFAULT_CODES.items()}
+_codes_lock = threading.Lock()
+
+
+def register_code(kind: str, name: str, code: int):
+    with _codes_lock:
+        _codes.setdefault(kind, {})[name] = code
+        _names.setdefault(kind, {})[code] = name
+
+
+def code_names(kind: str):
+    """Known names of kind, in code order"""
+    return [name for _, name in sorted(_names.get(kind, {}).items())]
+
+
+def is_known(kind: str, name) -> bool:
+    return isinstance(name, str) and name in _codes.get(kind, {})
+
+
+def code_for(kind: str, name: str) -> int:
+    try:
+        return _codes[kind][name]
+    except KeyError:
+        raise ValueError(f"Unknown {kind}: {name} (expected one of: {', '.join(code_names(kind))})")
+
+
+def name_for(kind: str, code: int) -> str:
+    # A code added by another process since this one loaded item_codes reads as its number
+    return _names.get(kind, {}).get(code, str(code))
+
+
+class EnumCode(TypeDecorator):
+    """SMALLINT code of a name from the `kind` vocabulary; writing an unknown name raises
+    ValueError, comparing with one matches nothing"""
+    impl = SmallInteger
+    cache_ok = True
+
+    def __init__(self, kind: str, lenient: bool = False):
+        super().__init__()
+        self.kind = kind
+        self.lenient = lenient
+
+    def process_bind_param(self, value, dialect):
+        if value is None or isinstance(value, int):
+            return value
+        if self.lenient and not is_known(self.kind, value):
+            return NO_CODE
+        return code_for(self.kind, value)
+
+    def process_result_value(self, value, dialect):
+        # Text passes through (a database still on the legacy layout)
+        if value is None or isinstance(value, str):
+            return value
+        return name_for(self.kind, value)
+
+    def coerce_compared_value(self, op, value):
+        return EnumCode(self.kind, lenient=True)
+
+
+def calendar_day(value):
+    """value (datetime or date) as a midnight datetime; None stays None"""
+    if value is None:
+        return None
+    return datetime(value.year, value.month, value.day)
+
+
+def next_day_bound(value: datetime) -> datetime:
+    """Smallest midnight >= value: the same range bound on a day-granular column"""
+    day = calendar_day(value)
+    return day if day == value else day + timedelta(days=1)
+
+
+class CalendarDate(TypeDecorator):
+    """A day without time: DATE on PostgreSQL, INTEGER days since 1970-01-01 on SQLite.
+    Binds datetimes, dates or ISO strings (the time is dropped); returns midnight datetimes"""
+    impl = Date
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == 'sqlite':
+            return dialect.type_descriptor(Integer())
+        return dialect.type_descriptor(Date())
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        if isinstance(value, str):
+            value = datetime.fromisoformat(value)
+        day = value.date() if isinstance(value, datetime) else value
+        if dialect.name == 'sqlite':
+            return (day - EPOCH).days
+        return day
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        if isinstance(value, int):
+            return datetime.combine(EPOCH + timedelta(days=value), datetime.min.time())
+        if isinstance(value, str):
+            # Legacy TEXT timestamp on SQLite
+            return calendar_day(datetime.fromisoformat(value))
+        return calendar_day(value)
+
+
+def driver_rows(table, columns, rows, dialect):
+    """Value tuples of rows (dicts) as the DBAPI driver takes them, through each column type's
+    bind processing; for writes that bypass SQLAlchemy statements (COPY, raw executemany)"""
+    processors = [table.c[c].type.bind_processor(dialect) for c in columns]
+    for row in rows:
+        yield tuple(
+            value if value is None or process is None else process(value)
+            for value, process in zip((row[c] for c in columns), processors)
+        )
+
+
+def code_name_sql(column, kind: str):
+    """SQL expression for the name of column's code, for statements whose values never reach
+    Python (INSERT .. SELECT); unknown codes come out as their number"""
+    return case(
+        {code: name for code, name in _names.get(kind, {}).items()},
+        value=column,
+        else_=cast(column, String),
+    )
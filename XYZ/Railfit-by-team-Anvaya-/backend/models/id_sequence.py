@@ -0,0 +1,13 @@
+from sqlalchemy import Column, String, BigInteger
+
+try:
+    from backend.models.railway_item import Base
+except Exception:
+    from models.railway_item import Base
+
+class IdSequence(Base):
+    """Named counters from which ID allocators reserve blocks of values"""
+    __tablename__ = 'id_sequences'
+
+    name = Column(String(30), primary_key=True)
+    next_value = Column(BigInteger, nullable=False, default=1)
@@ -0,0 +1,37 @@
+from sqlalchemy import Column, Integer, String, DateTime, Text, Index
+from datetime import datetime
+
+try:
+    from backend.models.railway_item import Base
+except Exception:
+    from models.railway_item import Base
+
+class Inspection(Base):
+    """One recorded inspection of an item; rows are only ever appended"""
+    __tablename__ = 'inspections'
+
+    id = Column(Integer, primary_key=True)
+    # Not a foreign key: a partitioned railway_items cannot be referenced by item_id alone, and
+    # archiving moves items out of railway_items while their inspections stay
+    item_id = Column(String(50), nullable=False)
+    inspected_at = Column(DateTime, nullable=False)
+    inspector = Column(String(100))
+    result = Column(String(20))
+    notes = Column(Text)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    # History of one item in time order; also makes a repeated submission a no-op
+    __table_args__ = (
+        Index('ix_inspections_item_time', 'item_id', 'inspected_at', unique=True),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'item_id': self.item_id,
+            'inspected_at': self.inspected_at.isoformat() if self.inspected_at else None,
+            'inspector': self.inspector,
+            'result': self.result,
+            'notes': self.notes,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+        }
@@ -0,0 +1,30 @@
+from sqlalchemy import Column, Integer, String, DateTime, JSON, Index
+from datetime import datetime
+
+try:
+    from backend.models.railway_item import Base
+except Exception:
+    from models.railway_item import Base
+
+class ItemChange(Base):
+    """One change to an item, appended in the transaction that made it (change feed / outbox)"""
+    __tablename__ = 'item_changes'
+
+    # Consumers read in id order and keep the last id they processed
+    id = Column(Integer, primary_key=True)
+    item_id = Column(String(50), nullable=False)
+    qr_ref = Column(String(12))
+    # created, updated, insights, status, inspected, archived, restored
+    op = Column(String(20), nullable=False)
+    # Old / new values of the columns the change touched; before is null for new rows
+    before = Column(JSON)
+    after = Column(JSON)
+    changed_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    # History of one item; pruning by age. AUTOINCREMENT on SQLite: ids are never
+    # reused after pruning, so a consumer's cursor cannot skip new changes
+    __table_args__ = (
+        Index('ix_item_changes_item', 'item_id', 'id'),
+        Index('ix_item_changes_changed_at', 'changed_at'),
+        {'sqlite_autoincrement': True},
+    )
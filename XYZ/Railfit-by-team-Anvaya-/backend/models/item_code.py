@@ -0,0 +1,48 @@
+from sqlalchemy import Column, String, SmallInteger, UniqueConstraint, select
+
+try:
+    from backend.models.railway_item import Base
+    from backend.models.column_types import DEFAULT_CODES, register_code
+except Exception:
+    from models.railway_item import Base
+    from models.column_types import DEFAULT_CODES, register_code
+
+class ItemCode(Base):
+    """Lookup for the SMALLINT codes of railway_items.item_type and status, e.g. ('status', 2, 'replaced')"""
+    __tablename__ = 'item_codes'
+
+    kind = Column(String(20), primary_key=True)
+    code = Column(SmallInteger, primary_key=True)
+    name = Column(String(30), nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint('kind', 'name', name='uq_item_codes_kind_name'),
+    )
+
+
+def sync_item_codes(engine):
+    """Insert the built-in codes that are missing, then load every row into the code registry"""
+    table = ItemCode.__table__
+    with engine.begin() as conn:
+        present = {(r.kind, r.name): r.code for r in conn.execute(select(table))}
+        missing = [{'kind': kind, 'code': code, 'name': name}
+                   for kind, names in DEFAULT_CODES.items() for name, code in names.items()
+                   if (kind, name) not in present]
+        if missing:
+            conn.execute(table.insert(), missing)
+    for (kind, name), code in present.items():
+        register_code(kind, name, code)
+
+
+def add_item_code(conn, kind: str, name: str) -> int:
+    """Give name the next free code of kind (in the caller's transaction); returns the code"""
+    table = ItemCode.__table__
+    existing = conn.execute(select(table.c.code).where(table.c.kind == kind, table.c.name == name)).scalar()
+    if existing is not None:
+        register_code(kind, name, existing)
+        return existing
+    highest = max(conn.execute(select(table.c.code).where(table.c.kind == kind)).scalars().all(), default=0)
+    code = highest + 1
+    conn.execute(table.insert().values(kind=kind, code=code, name=name))
+    register_code(kind, name, code)
+    return code
@@ -0,0 +1,19 @@
+from sqlalchemy import Column, String, BigInteger, Index
+
+try:
+    from backend.models.railway_item import Base
+except Exception:
+    from models.railway_item import Base
+
+class ItemRollup(Base):
+    """Running item count per (dimension, key), e.g. ('status', 'active')"""
+    __tablename__ = 'item_rollups'
+
+    dimension = Column(String(20), primary_key=True)
+    key = Column(String(100), primary_key=True)
+    count = Column(BigInteger, nullable=False, default=0)
+
+    # Top-N per dimension for the stats endpoint
+    __table_args__ = (
+        Index('ix_item_rollups_dimension_count', 'dimension', 'count'),
+    )
@@ -0,0 +1,25 @@
+from sqlalchemy import Column, Integer, String, DateTime, Index
+from datetime import datetime
+
+try:
+    from backend.models.railway_item import Base
+except Exception:
+    from models.railway_item import Base
+
+class QRPoolEntry(Base):
+    """A pre-minted, pre-rendered qr_ref waiting to be claimed by a marking station"""
+    __tablename__ = 'qr_pool'
+
+    id = Column(Integer, primary_key=True)
+    qr_ref = Column(String(12), unique=True, nullable=False)
+    item_type = Column(String(30), nullable=False)
+    status = Column(String(20), nullable=False, default='available')
+    image_path = Column(String(255))
+    claimed_by = Column(String(100))
+    claimed_at = Column(DateTime)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    # Claims pick the lowest available id for a type, so this is the only index needed
+    __table_args__ = (
+        Index('ix_qr_pool_claim', 'item_type', 'status', 'id'),
+    )
@@ -1,11 +1,56 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text, Float, Boolean
+from sqlalchemy import Column, Integer, String, DateTime, Text, Float, Boolean, Index, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy import JSON
-from datetime import datetime
+from datetime import datetime, timedelta
+import calendar
 import json
+import re
+
+try:
+    from backend.models.column_types import EnumCode, CalendarDate, calendar_day
+except Exception:
+    from models.column_types import EnumCode, CalendarDate, calendar_day
 
 Base = declarative_base()
 
+_WARRANTY_PART = re.compile(r'(\d+(?:\.\d+)?)\s*(y|yr|yrs|years?|m|mo|mos|months?|w|wks?|weeks?|d|days?)\b', re.I)
+
+
+def add_months(day: datetime, months: int) -> datetime:
+    """day + months, clamped to the end of a shorter month (as PostgreSQL's interval arithmetic)"""
+    year, month = divmod(day.year * 12 + day.month - 1 + months, 12)
+    return day.replace(year=year, month=month + 1, day=min(day.day, calendar.monthrange(year, month + 1)[1]))
+
+
+def warranty_offset(warranty_period):
+    """(months, days) of a period like '5 years', '18 months' or '1 year 6 months'; None if unparseable"""
+    if not isinstance(warranty_period, str) or 'expired' in warranty_period.lower():
+        return None
+    parts = _WARRANTY_PART.findall(warranty_period)
+    if not parts:
+        return None
+    months, days = 0, 0.0
+    for number, unit in parts:
+        unit = unit[0].lower()
+        if unit == 'y':
+            months += round(float(number) * 12)
+        elif unit == 'm':
+            months += round(float(number))
+        elif unit == 'w':
+            days += float(number) * 7
+        else:
+            days += float(number)
+    return months, round(days)
+
+
+def warranty_expiry(supply_date, warranty_period):
+    """Day (midnight datetime) the warranty runs out; None without a supply date or a parseable period"""
+    offset = warranty_offset(warranty_period)
+    if supply_date is None or offset is None:
+        return None
+    months, days = offset
+    return add_months(calendar_day(supply_date), months) + timedelta(days=days)
+
 class RailwayItem(Base):
     __tablename__ = 'railway_items'
 
@@ -13,17 +58,51 @@ class RailwayItem(Base):
     item_id = Column(String(50), unique=True, nullable=False, index=True)
     qr_ref = Column(String(12), unique=True, nullable=False, index=True)
     vendor_lot = Column(String(50), nullable=False)
-    supply_date = Column(DateTime, nullable=False)
+    # A calendar day (DATE / epoch days on SQLite), read back as a midnight datetime
+    supply_date = Column(CalendarDate, nullable=False)
     warranty_period = Column(String(20))
-    item_type = Column(String(30), nullable=False)
+    # supply_date + warranty_period, kept in step by every write path (see warranty_expiry)
+    warranty_expiry_date = Column(CalendarDate)
+    # SMALLINT codes, names in item_codes (models/item_code.py); Python sees the names
+    item_type = Column(EnumCode('item_type'), nullable=False)
     manufacturer = Column(String(100))
+    # Railway zone code (NR, CR, ...); the shard key of a zone-sharded store
+    zone = Column(String(10))
     inspection_dates = Column(JSON)
     ai_insights = Column(JSON)
     quality_score = Column(Float)
-    status = Column(String(20), default='active')
+    status = Column(EnumCode('status'), default='active')
+    # Denormalised max(inspections.inspected_at), maintained on append
+    last_inspected_at = Column(DateTime)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    # Access paths: vendor search (lot [+ type] [+ supply window], type + supply window)
+    # and parts summary (type + status, first N by id)
+    __table_args__ = (
+        Index('ix_railway_items_lot_type_supply', 'vendor_lot', 'item_type', 'supply_date'),
+        Index('ix_railway_items_type_supply', 'item_type', 'supply_date'),
+        Index('ix_railway_items_type_status', 'item_type', 'status', 'id'),
+        # Overdue inspections: status + last_inspected_at range
+        Index('ix_railway_items_status_inspected', 'status', 'last_inspected_at'),
+        # Incremental exports: rows changed after a watermark, in (updated_at, id) order
+        Index('ix_railway_items_updated', 'updated_at', 'id'),
+        # Warranty expiry by status: expiry-window range scans
+        Index('ix_railway_items_status_warranty', 'status', 'warranty_expiry_date'),
+    )
+
+    @staticmethod
+    def serialize_row(row):
+        """Serialise a partial row mapping (Core select) the same way to_dict does"""
+        out = {}
+        for key, value in row.items():
+            if isinstance(value, datetime):
+                value = value.isoformat()
+            elif value is None and key == 'ai_insights':
+                value = {}
+            out[key] = value
+        return out
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -32,12 +111,21 @@ class RailwayItem(Base):
             'vendor_lot': self.vendor_lot,
             'supply_date': self.supply_date.isoformat() if self.supply_date else None,
             'warranty_period': self.warranty_period,
+            'warranty_expiry_date': self.warranty_expiry_date.isoformat() if self.warranty_expiry_date else None,
             'item_type': self.item_type,
             'manufacturer': self.manufacturer,
-            'inspection_dates': self.inspection_dates or [],
+            'zone': self.zone,
             'ai_insights': self.ai_insights or {},
             'quality_score': self.quality_score,
             'status': self.status,
+            'last_inspected_at': self.last_inspected_at.isoformat() if self.last_inspected_at else None,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None,
         }
+
+
+@event.listens_for(RailwayItem, 'before_insert')
+@event.listens_for(RailwayItem, 'before_update')
+def _set_warranty_expiry(mapper, connection, target):
+    # ORM writes; Core paths (bulk import, archive restore) set the column themselves
+    target.warranty_expiry_date = warranty_expiry(target.supply_date, target.warranty_period)
@@ -0,0 +1,13 @@
+from sqlalchemy import Column, String, DateTime
+
+try:
+    from backend.models.railway_item import Base
+except Exception:
+    from models.railway_item import Base
+
+class ReplicationHeartbeat(Base):
+    """Timestamp written on the primary; how far a replica's copy trails it is the replica's lag"""
+    __tablename__ = 'replication_heartbeat'
+
+    name = Column(String(30), primary_key=True)
+    beat_at = Column(DateTime, nullable=False)
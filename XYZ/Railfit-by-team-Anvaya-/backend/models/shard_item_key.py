@@ -0,0 +1,14 @@
+from sqlalchemy import Column, String, SmallInteger
+
+try:
+    from backend.models.railway_item import Base
+except Exception:
+    from models.railway_item import Base
+
+class ShardItemKey(Base):
+    """item_id -> shard it was created on; kept on shard 0 of a sharded store, so two shards
+    cannot both create one item_id (items created before sharding have no row)"""
+    __tablename__ = 'shard_item_keys'
+
+    item_id = Column(String(50), primary_key=True)
+    shard = Column(SmallInteger, nullable=False)
@@ -2,6 +2,10 @@
 import cv2
 import numpy as np
 from typing import List, Dict
+try:
+    from backend.services.qr_payload import is_railway_payload
+except Exception:
+    from services.qr_payload import is_railway_payload
 try:
     from pyzbar import pyzbar  # Optional: requires zbar DLL on Windows
     _HAS_PYZBAR = True
@@ -178,7 +182,7 @@ class StateOfTheArtQRScanner:
         # Data quality
         try:
             data = qr_code.data.decode('utf-8')
-            if 'INDIAN_RAILWAYS:' in data:
+            if is_railway_payload(data):
                 data_quality = 1.0
             elif len(data) > 10:
                 data_quality = 0.9
@@ -13,10 +13,11 @@ class RailwayAIAnalyzer:
         return insights
 
     def _calculate_quality_score(self, item_data):
-        inspection_dates = item_data.get('inspection_dates', [])
-        if len(inspection_dates) == 0:
+        inspection_dates = item_data.get('inspection_dates') or []
+        last_inspected_at = item_data.get('last_inspected_at')
+        if len(inspection_dates) == 0 and not last_inspected_at:
             return {'score': 50, 'status': 'No inspections recorded'}
-        days_since_last = self._days_since_last_inspection(inspection_dates)
+        days_since_last = self._days_since_last_inspection(inspection_dates, last_inspected_at)
         if days_since_last < 30:
             score = 95
         elif days_since_last < 90:
@@ -59,14 +60,24 @@ class RailwayAIAnalyzer:
         warranty_period = item_data.get('warranty_period', '') or ''
         if isinstance(warranty_period, str) and 'expired' in warranty_period.lower():
             risks.append('Warranty expired - increased failure risk')
-        inspection_dates = item_data.get('inspection_dates', [])
-        if len(inspection_dates) == 0:
+        elif self._warranty_expired(item_data.get('warranty_expiry_date')):
+            risks.append('Warranty expired - increased failure risk')
+        inspection_dates = item_data.get('inspection_dates') or []
+        if len(inspection_dates) == 0 and not item_data.get('last_inspected_at'):
             risks.append('No inspection history - unknown condition')
         return {
             'risk_level': 'High' if len(risks) > 1 else 'Medium' if len(risks) == 1 else 'Low',
             'identified_risks': risks
         }
 
+    def _warranty_expired(self, expiry):
+        # warranty_expiry_date as stored (datetime) or as in to_dict() (ISO string)
+        try:
+            expiry = datetime.fromisoformat(expiry) if isinstance(expiry, str) else expiry
+        except ValueError:
+            return False
+        return isinstance(expiry, datetime) and expiry <= datetime.utcnow()
+
     def _generate_recommendations(self, insights):
         recommendations = []
         if insights['quality_score'].get('score', 0) < 60:
@@ -77,15 +88,18 @@ class RailwayAIAnalyzer:
             recommendations.append('Consider replacement or intensive monitoring')
         return recommendations
 
-    def _days_since_last_inspection(self, inspection_dates):
-        if not inspection_dates:
-            return 999
-        try:
-            last = inspection_dates[-1]
-            last_dt = datetime.fromisoformat(last)
-        except Exception:
+    def _days_since_last_inspection(self, inspection_dates, last_inspected_at=None):
+        # Prefer the denormalised column; otherwise the latest parseable date, in any order
+        candidates = [last_inspected_at] if last_inspected_at else (inspection_dates or [])
+        parsed = []
+        for value in candidates:
+            try:
+                parsed.append(value if isinstance(value, datetime) else datetime.fromisoformat(value))
+            except Exception:
+                continue
+        if not parsed:
             return 999
-        return (datetime.now() - last_dt).days
+        return (datetime.now() - max(parsed)).days
 
     def _get_status_from_score(self, score):
         if score >= 90:
@@ -60,7 +60,7 @@ class AuthService:
             return {'success': False, 'message': 'Invalid token'}
 
 
-def role_required(required_role):
+def role_required(*required_roles):
     def decorator(f):
         @wraps(f)
         def decorated(*args, **kwargs):
@@ -73,7 +73,7 @@ def role_required(required_role):
                 result = auth_service.verify_token(token)
                 if not result['success']:
                     return jsonify({'error': result['message']}), 401
-                if result['user']['role'] != required_role:
+                if result['user']['role'] not in required_roles:
                     return jsonify({'error': 'Insufficient permissions'}), 403
                 # Attach user to request for handlers
                 request.user = result['user']
@@ -0,0 +1,132 @@
+# backend/services/change_feed.py
+import threading
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, Iterable, List
+from sqlalchemy import select, insert, delete, func
+
+try:
+    from backend.models.item_change import ItemChange
+except Exception:
+    from models.item_change import ItemChange
+
+CHANGE_OPS = ('created', 'updated', 'insights', 'status', 'inspected', 'archived', 'restored')
+# PostgreSQL ids come from a sequence and can commit out of order: the feed holds
+# back the newest seconds so a consumer's `since` never jumps over a late commit
+SETTLE_SECONDS = 2.0
+
+
+def _json_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def change(op: str, item_id: str, qr_ref: str = None, before: Dict = None, after: Dict = None) -> Dict:
+    """A change record for record_changes (datetimes become ISO strings)"""
+    return {
+        'item_id': item_id,
+        'qr_ref': qr_ref,
+        'op': op,
+        'before': None if before is None else {k: _json_value(v) for k, v in before.items()},
+        'after': None if after is None else {k: _json_value(v) for k, v in after.items()},
+    }
+
+
+def record_changes(conn, changes: List[Dict]) -> List[Dict]:
+    """Append change records in the caller's transaction (Connection or Session).
+
+    Returns them with their id and changed_at, ready to publish after commit.
+    """
+    if not changes:
+        return []
+    now = datetime.utcnow()
+    for record in changes:
+        record['changed_at'] = now
+    table = ItemChange.__table__
+    # Unordered RETURNING keeps executemany batched (ordered falls back to a row per
+    # statement on SQLite); ids are matched back by item_id, in insertion order
+    ids = defaultdict(list)
+    for change_id, item_id in sorted(conn.execute(insert(table).returning(table.c.id, table.c.item_id), changes)):
+        ids[item_id].append(change_id)
+    for record in changes:
+        record['id'] = ids[record['item_id']].pop(0)
+    return changes
+
+
+def serialize_change(record: Dict) -> Dict:
+    out = dict(record)
+    out['changed_at'] = _json_value(out.get('changed_at'))
+    return out
+
+
+def read_changes(conn, since: int = 0, limit: int = 1000, ops: Iterable[str] = None,
+                 item_id: str = None, settle_seconds: float = 0.0) -> List[Dict]:
+    """Changes after id `since` in id order; the page ends before the first change younger than
+    settle_seconds, which is left for the next call with everything after it"""
+    table = ItemChange.__table__
+    stmt = select(table).where(table.c.id > (since or 0))
+    if settle_seconds:
+        # Cut at the first unsettled id rather than skip it: a settled higher id would move the
+        # consumer's `since` past it for good (changed_at comes from the writer's clock)
+        cutoff = datetime.utcnow() - timedelta(seconds=settle_seconds)
+        unsettled = conn.execute(
+            select(func.min(table.c.id)).where(table.c.id > (since or 0), table.c.changed_at > cutoff)
+        ).scalar()
+        if unsettled is not None:
+            stmt = stmt.where(table.c.id < unsettled)
+    if ops:
+        stmt = stmt.where(table.c.op.in_(list(ops)))
+    if item_id:
+        stmt = stmt.where(table.c.item_id == item_id)
+    rows = conn.execute(stmt.order_by(table.c.id).limit(limit)).mappings().all()
+    return [dict(row) for row in rows]
+
+
+def prune_changes(engine, older_than_days: int) -> int:
+    """Delete changes older than the retention window; returns the number removed"""
+    table = ItemChange.__table__
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    with engine.begin() as conn:
+        return conn.execute(delete(table).where(table.c.changed_at < cutoff)).rowcount
+
+
+class ChangeFeed:
+    """In-process subscribers to committed item changes.
+
+    DatabaseService publishes each write's change records right after its
+    commit, on the writer's thread; a callback gets a list of records
+    (serialize_change form) and should hand heavy work to its own thread.
+    A failing callback is reported and does not affect the write or other
+    subscribers. Other processes read the table through read_changes.
+    """
+    def __init__(self):
+        self._subscribers: Dict[int, tuple] = {}
+        self._next_token = 0
+        self._lock = threading.Lock()
+
+    def subscribe(self, callback: Callable[[List[Dict]], None], ops: Iterable[str] = None) -> int:
+        """Register a callback, optionally for some ops only; returns a token for unsubscribe"""
+        with self._lock:
+            self._next_token += 1
+            self._subscribers[self._next_token] = (callback, frozenset(ops) if ops else None)
+            return self._next_token
+
+    def unsubscribe(self, token: int):
+        with self._lock:
+            self._subscribers.pop(token, None)
+
+    def publish(self, records: List[Dict]):
+        if not records or not self._subscribers:
+            return
+        records = [serialize_change(r) for r in records]
+        with self._lock:
+            subscribers = list(self._subscribers.values())
+        for callback, ops in subscribers:
+            batch = records if ops is None else [r for r in records if r['op'] in ops]
+            if not batch:
+                continue
+            try:
+                callback(batch)
+            except Exception as e:
+                print(f"Change feed subscriber {getattr(callback, '__name__', callback)} failed: {e}")
@@ -1,22 +1,183 @@
-import os
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from datetime import datetime
+import csv
+import io
+import json
+import time
+from sqlalchemy import select, update, func, bindparam, and_, Float, JSON
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import scoped_session
+from datetime import datetime, timedelta
 
 try:
-    from backend.models.railway_item import Base, RailwayItem
+    from backend.models.railway_item import Base, RailwayItem, warranty_expiry
+    from backend.models.column_types import calendar_day, code_for, driver_rows, next_day_bound
+    from backend.models.inspection import Inspection
+    from backend.models.item_rollup import ItemRollup
+    from backend.services.replica_router import ReplicaRouter
+    from backend.services.shard_router import normalize_zone
+    from backend.services.item_search import ItemSearch
+    from backend.services.change_feed import ChangeFeed, SETTLE_SECONDS, change, record_changes, read_changes
+    from backend.services.item_archive import (
+        ARCHIVE_STATUSES, ARCHIVE_AFTER_MONTHS, archive_inactive, find_archived, restore_item,
+    )
+    from backend.services.item_rollups import (
+        ROLLUP_DIMENSIONS, rollup_deltas, apply_rollup_deltas, rebuild_rollups, read_rollups,
+    )
+    from backend.utils.database import (
+        init_db, get_engine, get_read_engine, get_scoped_session, get_read_scoped_session,
+        create_db_engine, create_read_engine, create_session_factory, create_read_session_factory,
+        create_schema,
+    )
+    from backend.utils.partitioning import is_partitioned
 except Exception:
-    from models.railway_item import Base, RailwayItem
+    from models.railway_item import Base, RailwayItem, warranty_expiry
+    from models.column_types import calendar_day, code_for, driver_rows, next_day_bound
+    from models.inspection import Inspection
+    from models.item_rollup import ItemRollup
+    from services.replica_router import ReplicaRouter
+    from services.shard_router import normalize_zone
+    from services.item_search import ItemSearch
+    from services.change_feed import ChangeFeed, SETTLE_SECONDS, change, record_changes, read_changes
+    from services.item_archive import (
+        ARCHIVE_STATUSES, ARCHIVE_AFTER_MONTHS, archive_inactive, find_archived, restore_item,
+    )
+    from services.item_rollups import (
+        ROLLUP_DIMENSIONS, rollup_deltas, apply_rollup_deltas, rebuild_rollups, read_rollups,
+    )
+    from utils.database import (
+        init_db, get_engine, get_read_engine, get_scoped_session, get_read_scoped_session,
+        create_db_engine, create_read_engine, create_session_factory, create_read_session_factory,
+        create_schema,
+    )
+    from utils.partitioning import is_partitioned
 
 class DatabaseService:
-    def __init__(self):
-        db_url = os.getenv('DATABASE_URL', 'sqlite:///railway_qr.db')
-        self.engine = create_engine(db_url, future=True)
-        Base.metadata.create_all(self.engine)
-        Session = sessionmaker(bind=self.engine, autoflush=False, autocommit=False)
-        self.session = Session()
-    
-    def _parse_date(self, s: str):
+    def __init__(self, db_url: str = None, lookup_cache=None, sqlite_profile: str = None,
+                 replica_urls=None, replica_max_lag: float = 5.0, read_your_writes_seconds: float = 5.0):
+        # Optional ItemLookupCache for the qr_ref -> item hot path
+        self.lookup_cache = lookup_cache
+        if db_url:
+            # Dedicated engine (scripts, load tests); the app shares the process-wide one
+            self.engine = create_db_engine(db_url, sqlite_profile)
+            create_schema(self.engine, Base.metadata)
+            self.read_engine = create_read_engine(db_url, sqlite_profile, primary=self.engine)
+            self.Session = scoped_session(create_session_factory(self.engine))
+            self.ReadSession = scoped_session(create_read_session_factory(self.read_engine))
+        else:
+            init_db()
+            self.engine = get_engine()
+            self.read_engine = get_read_engine()
+            self.Session = get_scoped_session()
+            self.ReadSession = get_read_scoped_session()
+        # Partitioned railway_items: unique keys include supply_date (see utils/partitioning.py)
+        self.partitioned = is_partitioned(self.engine)
+        self._ensure_rollups()
+        # Prefix / substring / fuzzy item search (FTS5, pg_trgm or the Python fallback)
+        self.item_search = ItemSearch(self.engine)
+        self.item_search.ensure()
+        # Committed item changes for in-process subscribers (also kept in item_changes)
+        self.changes = ChangeFeed()
+        # Optional read replicas; the caller starts self.replicas (heartbeat + lag checks)
+        self.replicas = None
+        self._replica_sessions = {}
+        self._recently_written = {}
+        if replica_urls:
+            self.replicas = ReplicaRouter(self.engine, replica_urls, replica_max_lag,
+                                          read_your_writes_seconds, sqlite_profile=sqlite_profile)
+            self._replica_sessions = {
+                engine: scoped_session(create_read_session_factory(engine)) for engine in self.replicas.replicas
+            }
+
+    @property
+    def session(self):
+        """Session for the current thread/request; removed at request teardown"""
+        return self.Session()
+
+    @property
+    def read_session(self):
+        """Session for lookups and listings; never used to write. Served by a replica when
+        one is healthy and the current actor has not just written"""
+        if self.replicas is not None:
+            engine = self.replicas.engine_for_read()
+            if engine is not self.engine:
+                return self._replica_sessions[engine]()
+        return self.ReadSession()
+
+    @property
+    def search_backend(self) -> str:
+        """Item search in use: fts5, pg_trgm or python"""
+        return self.item_search.backend
+
+    def remove_session(self):
+        self.Session.remove()
+        self.ReadSession.remove()
+        for registry in self._replica_sessions.values():
+            registry.remove()
+
+    # Item columns the rollup tables count by
+    ROLLUP_COLUMNS = ('item_id', 'item_type', 'status', 'vendor_lot', 'manufacturer', 'quality_score')
+
+    def _ensure_rollups(self):
+        """Fill the rollups for a database that has items but no rollup rows yet"""
+        with self.engine.connect() as conn:
+            has_rollups = conn.execute(select(ItemRollup.dimension).limit(1)).first()
+            has_items = conn.execute(select(RailwayItem.id).limit(1)).first()
+        if has_items and not has_rollups:
+            self.rebuild_rollups()
+
+    def rebuild_rollups(self):
+        rebuild_rollups(self.engine)
+
+    def get_rollups(self, dimensions=ROLLUP_DIMENSIONS, top: int = 50):
+        return read_rollups(self.read_session, dimensions, top)
+
+    def _rollup_row(self, item):
+        return {c: getattr(item, c) for c in self.ROLLUP_COLUMNS}
+
+    def _existing_item_rows(self, conn, item_ids, names=ROLLUP_COLUMNS, chunk: int = 5000):
+        """Current values of the named columns (item_id among them) of the given item_ids, keyed by item_id"""
+        columns = [getattr(RailwayItem, c) for c in names]
+        existing = {}
+        for start in range(0, len(item_ids), chunk):
+            for row in conn.execute(select(*columns).where(RailwayItem.item_id.in_(item_ids[start:start + chunk]))):
+                existing[row.item_id] = dict(row._mapping)
+        return existing
+
+    # Item columns a change record carries (ai_insights only when it changes)
+    CHANGE_COLUMNS = ('item_id', 'qr_ref', 'vendor_lot', 'supply_date', 'warranty_period', 'item_type',
+                      'manufacturer', 'zone', 'quality_score', 'status', 'last_inspected_at')
+
+    def _change_values(self, row, columns=CHANGE_COLUMNS):
+        get = row.get if isinstance(row, dict) else lambda c: getattr(row, c)
+        return {c: get(c) for c in columns}
+
+    def get_changes(self, since: int = 0, limit: int = 1000, ops=None, item_id: str = None):
+        """Committed changes after id `since`, oldest first (see services/change_feed.py)"""
+        settle = SETTLE_SECONDS if self.engine.dialect.name == 'postgresql' else 0.0
+        return read_changes(self.read_session, since, limit, ops, item_id, settle)
+
+    def _note_write(self, qr_refs=()):
+        """Pin the writer's reads, and cache fills for these refs, to the primary for a while"""
+        if self.replicas is None:
+            return
+        self.replicas.note_write()
+        now = time.monotonic()
+        for qr_ref in qr_refs:
+            self._recently_written[qr_ref] = now
+        if len(self._recently_written) > 10000:
+            window = self.replicas.max_lag_seconds
+            self._recently_written = {k: t for k, t in list(self._recently_written.items()) if now - t < window}
+
+    def _read_session_for(self, qr_ref):
+        """Primary-side session for refs written within the replica lag window"""
+        written_at = self._recently_written.get(qr_ref)
+        if written_at is not None and time.monotonic() - written_at < self.replicas.max_lag_seconds:
+            return self.ReadSession()
+        return self.read_session
+
+    def parse_date(self, s: str):
+        """ISO, DD-MM-YYYY, DD/MM/YYYY or YYYY/MM/DD -> datetime; None if empty or unparseable"""
         if not s:
             return None
         # Try ISO first
@@ -33,50 +194,873 @@ class DatabaseService:
         # As a last resort, return None (caller should handle)
         return None
 
+    def _parse_inspection_dates(self, values):
+        """Legacy inspection_dates list -> (sorted unique datetimes, unparseable values)"""
+        dates, unparsed = set(), []
+        for value in values or []:
+            parsed = value if isinstance(value, datetime) else self.parse_date(value) if isinstance(value, str) else None
+            if parsed is None:
+                unparsed.append(value)
+            else:
+                dates.add(parsed)
+        return sorted(dates), unparsed
+
+    def _insert(self, table):
+        """Dialect INSERT that supports ON CONFLICT (PostgreSQL, else SQLite)"""
+        return pg_insert(table) if self.engine.dialect.name == 'postgresql' else sqlite_insert(table)
+
     def save_item(self, item_data, qr_ref):
+        # An item_type without a code raises ValueError before anything is written
+        code_for('item_type', item_data['item_type'])
+        # inspection_dates from the caller become inspection rows, not a JSON blob
+        inspection_dates, _ = self._parse_inspection_dates(item_data.get('inspection_dates'))
         item = RailwayItem(
             item_id=item_data['item_id'],
             qr_ref=qr_ref,
             vendor_lot=item_data['vendor_lot'],
-            supply_date=self._parse_date(item_data.get('supply_date')) or datetime.utcnow(),
+            # Stored as a day; truncated here so the change record matches the row
+            supply_date=calendar_day(self.parse_date(item_data.get('supply_date')) or datetime.utcnow()),
             warranty_period=item_data.get('warranty_period'),
             item_type=item_data['item_type'],
             manufacturer=item_data.get('manufacturer'),
-            inspection_dates=item_data.get('inspection_dates', [])
+            zone=normalize_zone(item_data.get('zone')),
+            last_inspected_at=inspection_dates[-1] if inspection_dates else None,
         )
-        self.session.add(item)
-        self.session.commit()
+        item.status = item.status or 'active'
+        session = self.session
+        session.add(item)
+        session.add_all(Inspection(item_id=item.item_id, inspected_at=d) for d in inspection_dates)
+        apply_rollup_deltas(session, rollup_deltas(None, self._rollup_row(item)))
+        try:
+            changes = record_changes(session, [change('created', item.item_id, qr_ref, None, self._change_values(item))])
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        self._invalidate(qr_ref)
+        self._note_write([qr_ref])
+        self.changes.publish(changes)
         return item
     
-    def get_item_by_qr_ref(self, qr_ref):
-        return self.session.query(RailwayItem).filter_by(qr_ref=qr_ref).first()
+    def get_item_by_qr_ref(self, qr_ref, session=None):
+        """Hot table first, then the archive (a transient, read-only item)"""
+        if session is None:
+            session = self._read_session_for(qr_ref) if self.replicas is not None else self.read_session
+        item = session.query(RailwayItem).filter_by(qr_ref=qr_ref).first()
+        if item is None:
+            archived = find_archived(session, qr_ref)
+            if archived is not None:
+                return archived.to_item()
+        return item
     
+    def get_item_data_by_qr_ref(self, qr_ref):
+        """Serialised item (to_dict) for a ref, read through the lookup cache when configured"""
+        if self.lookup_cache is None:
+            return self._load_item_data(qr_ref)
+        return self.lookup_cache.get(qr_ref, self._load_item_data)
+
+    def _load_item_data(self, qr_ref):
+        session = self._read_session_for(qr_ref) if self.replicas is not None else self.read_session
+        item = session.query(RailwayItem).filter_by(qr_ref=qr_ref).first()
+        archived = None
+        if not item:
+            # Cold tier: retired items keep resolving after they leave the hot table
+            archived = find_archived(session, qr_ref)
+            if archived is None:
+                return None
+            item = archived.to_item()
+        data = item.to_dict()
+        if archived is not None:
+            data['archived'] = True
+            data['archived_at'] = archived.archived_at.isoformat() if archived.archived_at else None
+        data['inspection_dates'] = []
+        if item.last_inspected_at is not None:
+            # inspection_dates is read from the inspections table (index range), never the legacy column
+            dates = session.execute(
+                select(Inspection.inspected_at)
+                .where(Inspection.item_id == item.item_id)
+                .order_by(Inspection.inspected_at)
+            ).scalars().all()
+            data['inspection_dates'] = [d.isoformat() for d in dates]
+        return data
+
+    def _invalidate(self, qr_ref):
+        if self.lookup_cache is not None:
+            self.lookup_cache.invalidate(qr_ref)
+
+    def archive_inactive_items(self, older_than_months: int = ARCHIVE_AFTER_MONTHS, statuses=ARCHIVE_STATUSES,
+                               batch_size: int = 1000, dry_run: bool = False):
+        """Move retired items into the archive table (see services/item_archive.py)"""
+        def moved(changes):
+            qr_refs = [c['qr_ref'] for c in changes]
+            for qr_ref in qr_refs:
+                self._invalidate(qr_ref)
+            self._note_write(qr_refs)
+            self.changes.publish(changes)
+        return archive_inactive(self.engine, older_than_months, statuses, batch_size, dry_run, on_batch=moved)
+
+    def restore_item(self, qr_ref):
+        """Archived item back into railway_items; None if not archived, ValueError on a clash"""
+        data = restore_item(self.engine, qr_ref, on_commit=self.changes.publish)
+        if data is None:
+            return None
+        self._invalidate(qr_ref)
+        self._note_write([qr_ref])
+        return RailwayItem.serialize_row(data)
+
     def update_item_insights(self, qr_ref, ai_insights, quality_score=None):
-        item = self.get_item_by_qr_ref(qr_ref)
+        item = self.session.query(RailwayItem).filter_by(qr_ref=qr_ref).first()
         if not item:
             return None
+        before = self._rollup_row(item)
         item.ai_insights = ai_insights
         if quality_score is not None:
             item.quality_score = quality_score
         item.updated_at = datetime.utcnow()
-        self.session.commit()
+        apply_rollup_deltas(self.session, rollup_deltas(before, self._rollup_row(item)))
+        try:
+            changes = record_changes(self.session, [change(
+                'insights', item.item_id, qr_ref,
+                {'quality_score': before['quality_score']},
+                {'quality_score': item.quality_score, 'ai_insights': ai_insights},
+            )])
+            self.session.commit()
+        except Exception:
+            self.session.rollback()
+            raise
+        self._invalidate(qr_ref)
+        self._note_write([qr_ref])
+        self.changes.publish(changes)
+        return item
+
+    def update_item_insights_batch(self, updates, chunk_size: int = 1000):
+        """Write many (qr_ref, ai_insights, quality_score[, expected_updated_at]) updates set-based.
+
+        Each chunk is one transaction with one statement: UPDATE .. FROM (VALUES ..)
+        on PostgreSQL, an executemany UPDATE elsewhere. A quality_score of None
+        keeps the stored score. With expected_updated_at (datetime or ISO string)
+        the row is only written if it has not changed since it was read; otherwise
+        its qr_ref is reported under `conflicts`. Rollups and the change feed are
+        maintained as for update_item_insights.
+        """
+        started = time.perf_counter()
+        report = {'total': 0, 'updated': 0, 'missing': [], 'conflicts': [], 'chunks': 0, 'errors': []}
+        chunk = []
+        for update_row in updates:
+            chunk.append(update_row)
+            if len(chunk) >= chunk_size:
+                self._write_insights_chunk(chunk, report)
+                chunk = []
+        if chunk:
+            self._write_insights_chunk(chunk, report)
+        elapsed = time.perf_counter() - started
+        report['elapsed_seconds'] = round(elapsed, 3)
+        report['rows_per_second'] = round(report['updated'] / elapsed) if elapsed else None
+        return report
+
+    def _write_insights_chunk(self, chunk, report):
+        now = datetime.utcnow()
+        rows = {}
+        for update_row in chunk:
+            qr_ref, ai_insights, quality_score = update_row[:3]
+            expected = update_row[3] if len(update_row) > 3 else None
+            if isinstance(expected, str):
+                expected = datetime.fromisoformat(expected)
+            # A ref repeated within the chunk: the last update wins
+            rows[qr_ref] = {'qr_ref': qr_ref, 'ai_insights': ai_insights,
+                            'quality_score': None if quality_score is None else float(quality_score),
+                            'expected': expected}
+        report['total'] += len(chunk)
+        report['chunks'] += 1
+        columns = [RailwayItem.qr_ref, RailwayItem.updated_at] + [getattr(RailwayItem, c) for c in self.ROLLUP_COLUMNS]
+        try:
+            with self.engine.begin() as conn:
+                current = {}
+                refs = list(rows)
+                for start in range(0, len(refs), 5000):
+                    for row in conn.execute(select(*columns).where(RailwayItem.qr_ref.in_(refs[start:start + 5000]))):
+                        current[row.qr_ref] = dict(row._mapping)
+                missing = [ref for ref in refs if ref not in current]
+                conflicts = [ref for ref, row in rows.items()
+                             if ref in current and row['expected'] is not None and current[ref]['updated_at'] != row['expected']]
+                skip = set(missing) | set(conflicts)
+                pending = [row for ref, row in rows.items() if ref not in skip]
+                if self.engine.dialect.name == 'postgresql':
+                    written = self._update_insights_values(conn, pending, now)
+                else:
+                    written = self._update_insights_executemany(conn, pending, now)
+                # Rows changed between the read above and the UPDATE fail the updated_at check
+                conflicts += [row['qr_ref'] for row in pending if row['qr_ref'] not in written]
+                deltas, changes = None, []
+                for ref in written:
+                    before, row = current[ref], rows[ref]
+                    after = dict(before, quality_score=before['quality_score'] if row['quality_score'] is None
+                                 else row['quality_score'])
+                    deltas = rollup_deltas({c: before[c] for c in self.ROLLUP_COLUMNS},
+                                           {c: after[c] for c in self.ROLLUP_COLUMNS}, deltas)
+                    changes.append(change('insights', before['item_id'], ref, {'quality_score': before['quality_score']},
+                                          {'quality_score': after['quality_score'], 'ai_insights': row['ai_insights']}))
+                if deltas:
+                    apply_rollup_deltas(conn, deltas)
+                changes = record_changes(conn, changes)
+        except Exception as e:
+            # The chunk is rolled back; report it and carry on with the next one
+            report['errors'].append({'chunk': report['chunks'] - 1, 'error': f'chunk failed: {e}'})
+            return
+        for ref in written:
+            self._invalidate(ref)
+        self._note_write(list(written))
+        self.changes.publish(changes)
+        report['updated'] += len(written)
+        report['missing'] += missing
+        report['conflicts'] += conflicts
+
+    def _update_insights_values(self, conn, rows, now):
+        """PostgreSQL: one UPDATE .. FROM (VALUES ..) RETURNING for the chunk"""
+        if not rows:
+            return set()
+        from psycopg2.extras import execute_values
+        # Built on the DBAPI cursor: compiling a 1000-row VALUES construct costs more than running it
+        cur = conn.connection.cursor()
+        try:
+            result = execute_values(
+                cur,
+                "UPDATE railway_items AS t SET ai_insights = v.ai_insights::json, "
+                "quality_score = COALESCE(v.quality_score, t.quality_score), updated_at = v.updated_at "
+                "FROM (VALUES %s) AS v(qr_ref, ai_insights, quality_score, expected, updated_at) "
+                "WHERE t.qr_ref = v.qr_ref AND (v.expected IS NULL OR t.updated_at = v.expected) "
+                "RETURNING t.qr_ref",
+                [(r['qr_ref'], json.dumps(r['ai_insights']), r['quality_score'], r['expected'], now) for r in rows],
+                template='(%s, %s, %s::float8, %s::timestamp, %s::timestamp)',
+                page_size=len(rows),
+                fetch=True,
+            )
+        finally:
+            cur.close()
+        return {r[0] for r in result}
+
+    def _update_insights_executemany(self, conn, rows, now):
+        """SQLite / generic: one prepared UPDATE run for every row of the chunk"""
+        table = RailwayItem.__table__
+        written = set()
+        for checked in (False, True):
+            group = [r for r in rows if (r['expected'] is not None) == checked]
+            if not group:
+                continue
+            condition = table.c.qr_ref == bindparam('ref')
+            if checked:
+                condition = and_(condition, table.c.updated_at == bindparam('expected'))
+            stmt = update(table).where(condition).values(
+                ai_insights=bindparam('insights', type_=JSON),
+                quality_score=func.coalesce(bindparam('score', type_=Float), table.c.quality_score),
+                updated_at=now,
+            )
+            params = [{'ref': r['qr_ref'], 'insights': r['ai_insights'], 'score': r['quality_score'],
+                       'expected': r['expected']} for r in group]
+            result = conn.execute(stmt, params)
+            if result.rowcount != len(group):
+                # executemany cannot say which rows matched: a mismatch means another
+                # writer got in after the read above, so the chunk fails and can be rerun
+                raise RuntimeError(f'{len(group) - result.rowcount} rows changed during the update')
+            written.update(r['qr_ref'] for r in group)
+        return written
+
+    def update_item_status(self, qr_ref, status):
+        """Set an item's status (e.g. replaced, scrapped); None if the item does not exist.
+        Raises ValueError for a status without a code in item_codes"""
+        code_for('status', status)
+        session = self.session
+        item = session.query(RailwayItem).filter_by(qr_ref=qr_ref).first()
+        if not item:
+            return None
+        before = self._rollup_row(item)
+        if item.status == status:
+            return item
+        item.status = status
+        item.updated_at = datetime.utcnow()
+        apply_rollup_deltas(session, rollup_deltas(before, self._rollup_row(item)))
+        try:
+            changes = record_changes(session, [
+                change('status', item.item_id, qr_ref, {'status': before['status']}, {'status': status})
+            ])
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        self._invalidate(qr_ref)
+        self._note_write([qr_ref])
+        self.changes.publish(changes)
         return item
     
+    def record_inspection(self, item_id, inspected_at=None, inspector=None, result=None, notes=None):
+        """Append one inspection and advance last_inspected_at.
+
+        Returns (inspection dict, created) or None if the item does not exist;
+        re-submitting the same (item_id, inspected_at) returns the stored row.
+        """
+        inspected_at = inspected_at or datetime.utcnow()
+        session = self.session
+        qr_ref = session.execute(select(RailwayItem.qr_ref).where(RailwayItem.item_id == item_id)).scalar()
+        if qr_ref is None:
+            return None
+        same_time = select(Inspection).where(Inspection.item_id == item_id, Inspection.inspected_at == inspected_at)
+        existing = session.execute(same_time).scalar()
+        if existing:
+            return existing.to_dict(), False
+        inspection = Inspection(item_id=item_id, inspected_at=inspected_at, inspector=inspector,
+                                result=result, notes=notes)
+        session.add(inspection)
+        # Back-dated entries must not move last_inspected_at backwards
+        session.execute(
+            update(RailwayItem)
+            .where(RailwayItem.item_id == item_id)
+            .where((RailwayItem.last_inspected_at.is_(None)) | (RailwayItem.last_inspected_at < inspected_at))
+            .values(last_inspected_at=inspected_at, updated_at=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        )
+        try:
+            changes = record_changes(session, [
+                change('inspected', item_id, qr_ref, None, {'inspected_at': inspected_at, 'result': result})
+            ])
+            session.commit()
+        except IntegrityError:
+            # A concurrent submission of the same (item_id, inspected_at) committed first
+            session.rollback()
+            existing = session.execute(same_time).scalar()
+            if existing is None:
+                raise
+            return existing.to_dict(), False
+        except Exception:
+            session.rollback()
+            raise
+        self._invalidate(qr_ref)
+        self._note_write([qr_ref])
+        self.changes.publish(changes)
+        return inspection.to_dict(), True
+
+    def list_inspections(self, item_id, limit: int = 100):
+        """Latest inspections first"""
+        rows = self.read_session.execute(
+            select(Inspection)
+            .where(Inspection.item_id == item_id)
+            .order_by(Inspection.inspected_at.desc())
+            .limit(limit)
+        ).scalars().all()
+        return [r.to_dict() for r in rows]
+
+    def overdue_query(self, cutoff, item_type=None, never_inspected=False, limit: int = 100):
+        """Active items last inspected before cutoff (or never), oldest first; served by
+        ix_railway_items_status_inspected"""
+        query = self.read_session.query(RailwayItem).filter(RailwayItem.status == 'active')
+        if never_inspected:
+            query = query.filter(RailwayItem.last_inspected_at.is_(None))
+        else:
+            query = query.filter(RailwayItem.last_inspected_at < cutoff).order_by(RailwayItem.last_inspected_at)
+        if item_type:
+            query = query.filter(RailwayItem.item_type == item_type)
+        return query.limit(limit)
+
+    def find_overdue_items(self, days: int = 180, item_type=None, include_never: bool = True, limit: int = 100):
+        cutoff = datetime.utcnow() - timedelta(days=days)
+        items = []
+        if include_never:
+            items = self.overdue_query(cutoff, item_type, never_inspected=True, limit=limit).all()
+        if len(items) < limit:
+            items += self.overdue_query(cutoff, item_type, limit=limit - len(items)).all()
+        return items
+
+    def expiring_warranty_query(self, start, end, item_type=None, descending=False, limit: int = 100):
+        """Active items whose warranty runs out in [start, end), by expiry date; served by
+        ix_railway_items_status_warranty"""
+        expiry = RailwayItem.warranty_expiry_date
+        query = self.read_session.query(RailwayItem).filter(
+            RailwayItem.status == 'active', expiry >= start, expiry < end
+        )
+        if item_type:
+            query = query.filter(RailwayItem.item_type == item_type)
+        return query.order_by(expiry.desc() if descending else expiry).limit(limit)
+
+    def find_expiring_warranties(self, days: int = 90, item_type=None, expired: bool = False, limit: int = 100):
+        """Warranties running out within `days` from today, soonest first; with expired, the ones
+        that ran out in the last `days`, latest first"""
+        today = calendar_day(datetime.utcnow())
+        if expired:
+            return self.expiring_warranty_query(today - timedelta(days=days), today, item_type, True, limit).all()
+        return self.expiring_warranty_query(today, today + timedelta(days=days + 1), item_type, limit=limit).all()
+
+    def _append_manifest_inspections(self, dates_by_item):
+        """Insert manifest inspection dates (duplicates ignored) and refresh last_inspected_at"""
+        if not dates_by_item:
+            return
+        rows = [{'item_id': item_id, 'inspected_at': d, 'created_at': datetime.utcnow()}
+                for item_id, dates in dates_by_item.items() for d in dates]
+        latest = (
+            select(func.max(Inspection.inspected_at))
+            .where(Inspection.item_id == RailwayItem.item_id)
+            .scalar_subquery()
+        )
+        with self.engine.begin() as conn:
+            conn.execute(self._insert(Inspection.__table__).on_conflict_do_nothing(), rows)
+            conn.execute(
+                update(RailwayItem)
+                .where(RailwayItem.item_id.in_(list(dates_by_item)))
+                .values(last_inspected_at=latest)
+            )
+
+    def backfill_inspections(self, batch_size: int = 1000):
+        """One-off migration: move legacy inspection_dates JSON into the inspections table.
+        Returns (items migrated, rows skipped because of unparseable dates)"""
+        migrated, skipped, after_id = 0, 0, 0
+        while True:
+            with self.read_engine.connect() as conn:
+                batch = conn.execute(
+                    select(RailwayItem.id, RailwayItem.item_id, RailwayItem.qr_ref, RailwayItem.inspection_dates)
+                    .where(RailwayItem.id > after_id, RailwayItem.inspection_dates.isnot(None))
+                    .order_by(RailwayItem.id)
+                    .limit(batch_size)
+                ).all()
+            if not batch:
+                return migrated, skipped
+            after_id = batch[-1].id
+            dates_by_item = {}
+            for row in batch:
+                dates, unparsed = self._parse_inspection_dates(row.inspection_dates)
+                skipped += len(unparsed)
+                if dates:
+                    dates_by_item[row.item_id] = dates
+            self._append_manifest_inspections(dates_by_item)
+            for row in batch:
+                if row.item_id in dates_by_item:
+                    self._invalidate(row.qr_ref)
+            migrated += len(dates_by_item)
+
+    # Columns a manifest row may set; id/created_at are owned by the DB
+    BULK_COLUMNS = ('item_id', 'qr_ref', 'vendor_lot', 'supply_date', 'warranty_period', 'item_type',
+                    'manufacturer', 'zone', 'ai_insights', 'quality_score', 'status')
+    # On conflict (same item_id) the existing qr_ref is kept: it is already marked on the fitting
+    BULK_UPDATE_COLUMNS = ('vendor_lot', 'supply_date', 'warranty_period', 'warranty_expiry_date', 'item_type',
+                           'manufacturer', 'zone', 'ai_insights', 'quality_score', 'status', 'updated_at')
+    # Columns of a bulk change record, in both before and after
+    BULK_CHANGE_COLUMNS = BULK_COLUMNS[2:]
+    # Stored values read before a bulk write: for the rollup deltas and the change records
+    BULK_EXISTING_COLUMNS = ROLLUP_COLUMNS + ('supply_date', 'warranty_period', 'zone', 'ai_insights')
+
+    def bulk_save_items(self, items, ref_factory=None, batch_size: int = 5000, on_conflict: str = 'update'):
+        """Validate and write many items with set-based statements.
+
+        items: iterable of item dicts (same keys as save_item, qr_ref optional).
+        ref_factory(count) -> list of qr_refs for rows without one.
+        on_conflict: 'update' (upsert on item_id) or 'ignore'.
+        Returns a report with per-batch written counts and row errors.
+        """
+        if on_conflict not in ('update', 'ignore'):
+            raise ValueError(f"Unknown on_conflict mode: {on_conflict}")
+        started = time.perf_counter()
+        report = {'total': 0, 'written': 0, 'rejected': 0, 'batches': []}
+        batch = []
+        for item in items:
+            batch.append(item)
+            if len(batch) >= batch_size:
+                self._bulk_write_batch(batch, len(report['batches']), report, ref_factory, on_conflict)
+                batch = []
+        if batch:
+            self._bulk_write_batch(batch, len(report['batches']), report, ref_factory, on_conflict)
+        elapsed = time.perf_counter() - started
+        report['elapsed_seconds'] = round(elapsed, 3)
+        report['rows_per_second'] = round(report['written'] / elapsed) if elapsed else None
+        return report
+
+    def _bulk_write_batch(self, batch, number, report, ref_factory, on_conflict):
+        offset = report['total']
+        rows, errors = self._validate_bulk_rows(batch, offset)
+        missing_refs = [row for row in rows if not row.get('qr_ref')]
+        if missing_refs:
+            if ref_factory is None:
+                for row in missing_refs:
+                    errors.append({'row': row.pop('_row'), 'item_id': row['item_id'], 'error': 'qr_ref missing'})
+                rows = [row for row in rows if row.get('qr_ref')]
+            else:
+                for row, qr_ref in zip(missing_refs, ref_factory(len(missing_refs))):
+                    row['qr_ref'] = qr_ref
+        inspections, row_numbers = {}, {}
+        for row in rows:
+            row_numbers[row['item_id']] = row.pop('_row', None)
+            dates = row.pop('_inspections')
+            if dates:
+                inspections[row['item_id']] = dates
+
+        written, changes = [], []
+        batch_report = {'batch': number, 'rows': len(batch), 'written': 0, 'errors': errors}
+        if rows:
+            try:
+                if self.engine.dialect.name == 'postgresql':
+                    written, changes, conflicts = self._bulk_copy_postgres(rows, on_conflict)
+                else:
+                    written, changes, conflicts = self._bulk_insert_values(rows, on_conflict)
+                errors += [{'row': row_numbers[item_id], 'item_id': item_id, 'error': message}
+                           for item_id, message in conflicts]
+                self._append_manifest_inspections(
+                    {item_id: inspections[item_id] for _, item_id in written if item_id in inspections}
+                )
+            except Exception as e:
+                # The whole batch is rolled back; report it rather than aborting the import
+                errors.append({'row': None, 'item_id': None, 'error': f'batch failed: {e}'})
+        for qr_ref, _ in written:
+            self._invalidate(qr_ref)
+        self._note_write([qr_ref for qr_ref, _ in written])
+        self.changes.publish(changes)
+        batch_report['written'] = len(written)
+        report['batches'].append(batch_report)
+        report['total'] += len(batch)
+        report['written'] += len(written)
+        report['rejected'] += sum(1 for e in errors if e['row'] is not None)
+
+    def _validate_bulk_rows(self, batch, offset):
+        """Column-wise validation of one batch; returns (clean rows, errors)"""
+        errors = []
+        bad = set()
+        now = datetime.utcnow()
+
+        def reject(i, message):
+            if i not in bad:
+                bad.add(i)
+                errors.append({'row': offset + i, 'item_id': (batch[i] or {}).get('item_id'), 'error': message})
+
+        for i, item in enumerate(batch):
+            if not isinstance(item, dict):
+                reject(i, 'row must be an object')
+        for column, limit in (('item_id', 50), ('vendor_lot', 50), ('item_type', 30)):
+            for i, item in enumerate(batch):
+                if i in bad:
+                    continue
+                value = item.get(column)
+                if not value or not isinstance(value, str):
+                    reject(i, f'{column} is required')
+                elif len(value) > limit:
+                    reject(i, f'{column} longer than {limit} characters')
+        for column, limit in (('qr_ref', 12), ('warranty_period', 20), ('manufacturer', 100)):
+            for i, item in enumerate(batch):
+                value = None if i in bad else item.get(column)
+                if value is not None and len(str(value)) > limit:
+                    reject(i, f'{column} longer than {limit} characters')
+        # item_type and status are stored as codes: only names listed in item_codes
+        for column in ('item_type', 'status'):
+            for i, item in enumerate(batch):
+                value = None if i in bad else item.get(column)
+                if value:
+                    try:
+                        code_for(column, value)
+                    except ValueError as e:
+                        reject(i, str(e))
+        zones = {}
+        for i, item in enumerate(batch):
+            if i in bad:
+                continue
+            try:
+                zones[i] = normalize_zone(item.get('zone'))
+            except ValueError as e:
+                reject(i, str(e))
+        supply_dates = {}
+        for i, item in enumerate(batch):
+            if i in bad:
+                continue
+            raw = item.get('supply_date')
+            parsed = self.parse_date(raw) if isinstance(raw, str) else raw
+            if raw and not isinstance(parsed, datetime):
+                reject(i, f'unparseable supply_date: {raw}')
+            supply_dates[i] = calendar_day(parsed or now)
+        scores = {}
+        for i, item in enumerate(batch):
+            if i in bad or item.get('quality_score') in (None, ''):
+                continue
+            try:
+                scores[i] = float(item['quality_score'])
+            except (TypeError, ValueError):
+                reject(i, 'quality_score must be a number')
+        inspection_dates = {}
+        for i, item in enumerate(batch):
+            if i in bad:
+                continue
+            raw = item.get('inspection_dates') or []
+            if isinstance(raw, str):
+                raw = [d for d in raw.replace(';', ',').split(',') if d.strip()]
+            dates, unparsed = self._parse_inspection_dates(raw)
+            if unparsed:
+                reject(i, f'unparseable inspection_dates: {unparsed[0]}')
+            inspection_dates[i] = dates
+        seen = {}
+        for i, item in enumerate(batch):
+            if i in bad:
+                continue
+            if item['item_id'] in seen:
+                reject(i, f"duplicate item_id in batch (row {offset + seen[item['item_id']]})")
+            else:
+                seen[item['item_id']] = i
+
+        rows = []
+        for i, item in enumerate(batch):
+            if i in bad:
+                continue
+            row = {column: item.get(column) for column in self.BULK_COLUMNS}
+            row.update(
+                _row=offset + i,
+                supply_date=supply_dates[i],
+                zone=zones[i],
+                warranty_expiry_date=warranty_expiry(supply_dates[i], item.get('warranty_period')),
+                quality_score=scores.get(i),
+                _inspections=inspection_dates[i],
+                status=item.get('status') or 'active',
+                created_at=now,
+                updated_at=now,
+            )
+            rows.append(row)
+        return rows, errors
+
+    def _drop_ref_conflicts(self, conn, rows, existing, chunk: int = 5000):
+        """Leave out new items whose qr_ref is stored for another item, or taken by an earlier row
+        of the batch, so one reused ref does not fail the batch. Items that exist keep their stored
+        qr_ref and cannot conflict. Returns (rows to write, [(item_id, error)])"""
+        new_refs = [row['qr_ref'] for row in rows if row['item_id'] not in existing]
+        stored = {}
+        for start in range(0, len(new_refs), chunk):
+            stored.update(conn.execute(
+                select(RailwayItem.qr_ref, RailwayItem.item_id).where(RailwayItem.qr_ref.in_(new_refs[start:start + chunk]))
+            ).all())
+        kept, conflicts, taken = [], [], {}
+        for row in rows:
+            item_id, qr_ref = row['item_id'], row['qr_ref']
+            if item_id not in existing:
+                if qr_ref in stored:
+                    conflicts.append((item_id, f'qr_ref {qr_ref} already belongs to item {stored[qr_ref]}'))
+                    continue
+                if qr_ref in taken:
+                    conflicts.append((item_id, f'qr_ref {qr_ref} is also given to item {taken[qr_ref]} in this batch'))
+                    continue
+                taken[qr_ref] = item_id
+            kept.append(row)
+        return kept, conflicts
+
+    def _bulk_insert_values(self, rows, on_conflict):
+        """Multi-row INSERT .. ON CONFLICT (SQLite / generic); returns ((qr_ref, item_id) written,
+        changes, qr_ref conflicts)"""
+        table = RailwayItem.__table__
+        stmt = sqlite_insert(table)
+        if on_conflict == 'update':
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['item_id'],
+                set_={c: getattr(stmt.excluded, c) for c in self.BULK_UPDATE_COLUMNS},
+            )
+        else:
+            stmt = stmt.on_conflict_do_nothing(index_elements=['item_id'])
+        with self.engine.begin() as conn:
+            existing = self._existing_item_rows(conn, [row['item_id'] for row in rows], self.BULK_EXISTING_COLUMNS)
+            rows, conflicts = self._drop_ref_conflicts(conn, rows, existing)
+            if not rows:
+                return [], [], conflicts
+            written = [tuple(r) for r in conn.execute(stmt.returning(table.c.qr_ref, table.c.item_id), rows)]
+            self._apply_bulk_rollups(conn, rows, existing, written)
+            return written, self._record_bulk_changes(conn, rows, existing, written), conflicts
+
+    def _apply_bulk_rollups(self, conn, rows, existing, written):
+        by_item = {row['item_id']: row for row in rows}
+        deltas = None
+        for _, item_id in written:
+            deltas = rollup_deltas(existing.get(item_id), by_item[item_id], deltas)
+        if deltas:
+            apply_rollup_deltas(conn, deltas)
+
+    def _record_bulk_changes(self, conn, rows, existing, written):
+        by_item = {row['item_id']: row for row in rows}
+        changes = []
+        for qr_ref, item_id in written:
+            before = existing.get(item_id)
+            # An update keeps the stored qr_ref, so the row's own may differ
+            changes.append(change(
+                'updated' if before else 'created', item_id, qr_ref,
+                self._change_values(before, self.BULK_CHANGE_COLUMNS) if before else None,
+                self._change_values(by_item[item_id], self.BULK_CHANGE_COLUMNS),
+            ))
+        return record_changes(conn, changes)
+
+    def _bulk_copy_postgres(self, rows, on_conflict):
+        """COPY the batch into a temp table, then upsert it in one INSERT .. SELECT"""
+        columns = list(self.BULK_COLUMNS) + ['warranty_expiry_date', 'created_at', 'updated_at']
+        column_list = ', '.join(columns)
+        conflict_target = 'item_id, supply_date' if self.partitioned else 'item_id'
+        if on_conflict == 'update':
+            conflict = 'DO UPDATE SET ' + ', '.join(f'{c} = EXCLUDED.{c}' for c in self.BULK_UPDATE_COLUMNS)
+        else:
+            conflict = 'DO NOTHING'
+        with self.engine.begin() as conn:
+            existing = self._existing_item_rows(conn, [row['item_id'] for row in rows], self.BULK_EXISTING_COLUMNS)
+            rows, conflicts = self._drop_ref_conflicts(conn, rows, existing)
+            if not rows:
+                return [], [], conflicts
+            buf = io.StringIO()
+            writer = csv.writer(buf)
+            for values in driver_rows(RailwayItem.__table__, columns, rows, self.engine.dialect):
+                writer.writerow(['' if v is None else v for v in values])
+            buf.seek(0)
+            # COPY needs the DBAPI cursor; it runs inside the same transaction
+            cur = conn.connection.cursor()
+            try:
+                cur.execute('CREATE TEMP TABLE bulk_items_stage (LIKE railway_items INCLUDING DEFAULTS) ON COMMIT DROP')
+                cur.copy_expert(f"COPY bulk_items_stage ({column_list}) FROM STDIN WITH (FORMAT csv)", buf)
+                source = 'bulk_items_stage'
+                if self.partitioned and on_conflict == 'update':
+                    # The conflict target includes supply_date: move items whose supply_date changed
+                    # to their new partition first (the key triggers follow the row), so the upsert
+                    # below meets them instead of inserting a second row for the item_id
+                    cur.execute(
+                        "UPDATE railway_items AS t SET supply_date = s.supply_date FROM bulk_items_stage AS s "
+                        "WHERE t.item_id = s.item_id AND t.supply_date <> s.supply_date"
+                    )
+                elif self.partitioned:
+                    # Existing item_ids under another supply_date would pass ON CONFLICT and fail the
+                    # railway_item_keys check; leave them out like any other conflict
+                    source = ("bulk_items_stage AS s WHERE NOT EXISTS "
+                              "(SELECT 1 FROM railway_item_keys AS k WHERE k.item_id = s.item_id)")
+                cur.execute(
+                    f"INSERT INTO railway_items ({column_list}) SELECT {column_list} FROM {source} "
+                    f"ON CONFLICT ({conflict_target}) {conflict} RETURNING qr_ref, item_id"
+                )
+                written = [tuple(r) for r in cur.fetchall()]
+            finally:
+                cur.close()
+            self._apply_bulk_rollups(conn, rows, existing, written)
+            return written, self._record_bulk_changes(conn, rows, existing, written), conflicts
+
     def list_items(self):
-        return self.session.query(RailwayItem).all()
+        return self.read_session.query(RailwayItem).all()
+
+    def list_items_page(self, filters: dict = None, fields=None, after_id: int = None, limit: int = 100):
+        """Keyset page over id selecting only the requested columns (no ORM hydration).
+
+        Returns (records, next_cursor); next_cursor is None on the last page.
+        Records hold raw datetimes for the JSON encoder (utils/json_stream.py).
+        """
+        table = RailwayItem.__table__
+        fields = self._item_fields(fields)
+        columns = [table.c[f] for f in fields]
+        if 'id' not in fields:
+            columns.append(table.c.id)
+        id_index = fields.index('id') if 'id' in fields else len(fields)
+
+        stmt = select(*columns)
+        if after_id is not None:
+            stmt = stmt.where(table.c.id > after_id)
+        stmt = self._apply_filters(stmt, filters or {}).order_by(table.c.id).limit(limit + 1)
+        rows = self.read_session.execute(stmt).all()
+
+        next_cursor = rows[limit - 1][id_index] if len(rows) > limit else None
+        return list(self._records(fields, rows[:limit])), next_cursor
+
+    def iter_item_records(self, filters: dict = None, fields=None, batch_size: int = 1000):
+        """Stream matching items as plain dicts from Core rows in id order, `batch_size` rows
+        per fetch (a server-side cursor on PostgreSQL), without building ORM objects"""
+        table = RailwayItem.__table__
+        fields = self._item_fields(fields)
+        stmt = self._apply_filters(select(*[table.c[f] for f in fields]), filters or {}).order_by(table.c.id)
+        yield from self._records(fields, self._stream(stmt, batch_size))
+
+    def _stream(self, stmt, batch_size: int):
+        """Rows of stmt, batch_size per fetch. Read sessions autocommit, but PostgreSQL's
+        server-side cursor needs a transaction: the stream gets one on its own connection"""
+        bind = self.read_session.get_bind()
+        with bind.connect() as conn:
+            conn = conn.execution_options(isolation_level=bind.dialect.default_isolation_level)
+            with conn.begin():
+                yield from conn.execute(stmt.execution_options(yield_per=batch_size))
+
+    # JSON columns that to_dict() reports as empty rather than null
+    _JSON_DEFAULTS = {'ai_insights': dict}
+    # Legacy inspection_dates JSON is no longer written (see backfill_inspections);
+    # last_inspected_at and the inspections endpoint replace it
+    _LEGACY_FIELDS = ('inspection_dates',)
+
+    def _item_fields(self, fields=None):
+        table = RailwayItem.__table__
+        fields = list(fields) if fields else [c.name for c in table.columns if c.name not in self._LEGACY_FIELDS]
+        unknown = [f for f in fields if f not in table.c or f in self._LEGACY_FIELDS]
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+        return fields
+
+    def _records(self, fields, rows):
+        """Dicts keyed by fields from row tuples (extra trailing columns are dropped)"""
+        defaults = [(f, factory) for f, factory in self._JSON_DEFAULTS.items() if f in fields]
+        for row in rows:
+            record = dict(zip(fields, row))
+            for field, factory in defaults:
+                if record[field] is None:
+                    record[field] = factory()
+            yield record
+
+    def find_active_parts(self, item_type: str, limit: int):
+        return self.active_parts_query(item_type, limit).all()
+
+    def active_parts_query(self, item_type: str, limit: int):
+        # Ordered by id so the (item_type, status, id) index serves it without a sort
+        return (
+            self.read_session.query(RailwayItem)
+            .filter(RailwayItem.item_type == item_type, RailwayItem.status == 'active')
+            .order_by(RailwayItem.id)
+            .limit(limit)
+        )
 
     def search_items(self, filters: dict):
-        q = self.session.query(RailwayItem)
+        return self.search_query(filters).all()
+
+    def search_query(self, filters: dict):
+        return self._apply_filters(self.read_session.query(RailwayItem), filters)
+
+    def quick_search(self, query: str, limit: int = 20):
+        """Ranked matches of free text against item_id, vendor_lot and manufacturer"""
+        return self.item_search.search(self.read_session, query, limit)
+
+    def iter_item_refs(self, filters: dict, batch_size: int = 500):
+        """Stream (item_id, qr_ref) pairs for matching items without loading full rows"""
+        stmt = self._apply_filters(select(RailwayItem.item_id, RailwayItem.qr_ref), filters).order_by(RailwayItem.id)
+        for item_id, qr_ref in self._stream(stmt, batch_size):
+            yield item_id, qr_ref
+
+    def _apply_filters(self, q, filters: dict):
         if filters.get('item_type'):
             q = q.filter(RailwayItem.item_type == filters['item_type'])
         if filters.get('vendor_lot'):
             q = q.filter(RailwayItem.vendor_lot == filters['vendor_lot'])
-        date_range = filters.get('date_range')
-        if date_range and all(date_range):
+        if filters.get('status'):
+            q = q.filter(RailwayItem.status == filters['status'])
+        if filters.get('manufacturer'):
+            q = q.filter(RailwayItem.manufacturer == filters['manufacturer'])
+        if filters.get('zone'):
+            q = q.filter(RailwayItem.zone == normalize_zone(filters['zone']))
+        # Plain ranges on the raw column, so partitioned tables prune to the matching years
+        date_range = filters.get('date_range') or (None, None)
+        start, end = self._supply_window(*date_range)
+        if filters.get('supply_year'):
             try:
-                df = datetime.fromisoformat(date_range[0])
-                dt = datetime.fromisoformat(date_range[1])
-                q = q.filter(RailwayItem.supply_date.between(df, dt))
-            except Exception:
+                year = int(filters['supply_year'])
+                start = max(start or datetime.min, datetime(year, 1, 1))
+                end = min(end or datetime.max, datetime(year + 1, 1, 1))
+            except (TypeError, ValueError):
                 pass
-        return q.all()
+        # supply_date holds whole days: a bound with a time of day rounds up to the next midnight
+        if start is not None:
+            q = q.filter(RailwayItem.supply_date >= next_day_bound(start))
+        if end is not None:
+            q = q.filter(RailwayItem.supply_date < next_day_bound(end))
+        return q
+
+    def _supply_window(self, date_from=None, date_to=None):
+        """Half-open [start, end) supply window; a date-only end includes that whole day"""
+        start = end = None
+        try:
+            if date_from:
+                start = datetime.fromisoformat(date_from)
+            if date_to:
+                end = datetime.fromisoformat(date_to)
+                end = end + timedelta(days=1) if len(date_to) <= 10 else end + timedelta(microseconds=1)
+        except (TypeError, ValueError):
+            return None, None
+        return start, end
@@ -0,0 +1,153 @@
+# backend/services/item_archive.py
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, Optional
+from sqlalchemy import select, delete, func
+
+try:
+    from backend.models.railway_item import RailwayItem, warranty_expiry
+    from backend.models.archived_item import ArchivedItem
+    from backend.services.item_rollups import rollup_deltas, apply_rollup_deltas
+    from backend.services.change_feed import change, record_changes
+except Exception:
+    from models.railway_item import RailwayItem, warranty_expiry
+    from models.archived_item import ArchivedItem
+    from services.item_rollups import rollup_deltas, apply_rollup_deltas
+    from services.change_feed import change, record_changes
+
+# Fittings that will not be scanned in service again
+ARCHIVE_STATUSES = ('replaced', 'scrapped')
+ARCHIVE_AFTER_MONTHS = 12
+BATCH_SIZE = 1000
+
+
+def archive_cutoff(older_than_months: int, now: datetime = None) -> datetime:
+    # 30-day months: the cut-off only has to be roughly "N months untouched"
+    return (now or datetime.utcnow()) - timedelta(days=30 * older_than_months)
+
+
+def _candidates(statuses: Iterable[str], cutoff: datetime):
+    items = RailwayItem.__table__
+    return items.c.status.in_(list(statuses)) & (items.c.updated_at < cutoff)
+
+
+def count_archivable(engine, older_than_months: int = ARCHIVE_AFTER_MONTHS,
+                     statuses: Iterable[str] = ARCHIVE_STATUSES) -> int:
+    items = RailwayItem.__table__
+    with engine.connect() as conn:
+        return conn.execute(
+            select(func.count()).select_from(items).where(_candidates(statuses, archive_cutoff(older_than_months)))
+        ).scalar_one()
+
+
+def archive_inactive(engine, older_than_months: int = ARCHIVE_AFTER_MONTHS,
+                     statuses: Iterable[str] = ARCHIVE_STATUSES, batch_size: int = BATCH_SIZE,
+                     dry_run: bool = False, on_batch: Callable[[list], None] = None) -> Dict:
+    """Move inactive items untouched for `older_than_months` into railway_items_archive.
+
+    Each batch is one transaction: archive rows in, hot rows out (the search
+    index and partition-key triggers follow the delete), rollups decremented.
+    Each moved item gets an 'archived' change record; `on_batch` gets the
+    batch's records after each commit, e.g. to drop cached lookups. Inspections stay in their table; they are keyed by item_id.
+    """
+    cutoff = archive_cutoff(older_than_months)
+    report = {'cutoff': cutoff.isoformat(), 'statuses': list(statuses), 'archived': 0, 'batches': 0,
+              'packed_bytes': 0}
+    if dry_run:
+        report['candidates'] = count_archivable(engine, older_than_months, statuses)
+        return report
+
+    items = RailwayItem.__table__
+    archive = ArchivedItem.__table__
+    last_id = 0
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(
+                select(*items.columns)
+                .where(_candidates(statuses, cutoff), items.c.id > last_id)
+                .order_by(items.c.id)
+                .limit(batch_size)
+            ).mappings().all()
+            if not rows:
+                break
+            now = datetime.utcnow()
+            archived, changes, deltas = [], [], Counter()
+            for row in rows:
+                payload = ArchivedItem.pack(row)
+                report['packed_bytes'] += len(payload)
+                archived.append({'item_id': row['item_id'], 'qr_ref': row['qr_ref'], 'status': row['status'],
+                                 'archived_at': now, 'payload': payload})
+                rollup_deltas(dict(row), None, deltas)
+                changes.append(change('archived', row['item_id'], row['qr_ref'], {'status': row['status']}, None))
+            conn.execute(archive.insert(), archived)
+            conn.execute(delete(items).where(items.c.id.in_([row['id'] for row in rows])))
+            apply_rollup_deltas(conn, deltas)
+            record_changes(conn, changes)
+        last_id = rows[-1]['id']
+        report['archived'] += len(rows)
+        report['batches'] += 1
+        if on_batch is not None:
+            on_batch(changes)
+    return report
+
+
+def find_archived(session, qr_ref: str) -> Optional[ArchivedItem]:
+    """Latest archive entry for a ref, or None"""
+    return (
+        session.query(ArchivedItem)
+        .filter(ArchivedItem.qr_ref == qr_ref)
+        .order_by(ArchivedItem.archived_at.desc(), ArchivedItem.id.desc())
+        .first()
+    )
+
+
+def restore_item(engine, qr_ref: str, on_commit: Callable[[list], None] = None) -> Optional[Dict]:
+    """Move an archived item back into railway_items; returns its row, or None if not archived.
+
+    Raises ValueError when the item_id or qr_ref is in use in the hot table again.
+    The original id is kept unless another row has taken it since. `on_commit`
+    gets the 'restored' change record.
+    """
+    items = RailwayItem.__table__
+    archive = ArchivedItem.__table__
+    with engine.begin() as conn:
+        entry = conn.execute(
+            select(archive)
+            .where(archive.c.qr_ref == qr_ref)
+            .order_by(archive.c.archived_at.desc(), archive.c.id.desc())
+            .limit(1)
+        ).first()
+        if entry is None:
+            return None
+        data = ArchivedItem(payload=entry.payload).unpack()
+        clash = conn.execute(
+            select(items.c.id).where((items.c.item_id == data['item_id']) | (items.c.qr_ref == qr_ref)).limit(1)
+        ).first()
+        if clash is not None:
+            raise ValueError(f"{data['item_id']} / {qr_ref} is already in railway_items")
+        if conn.execute(select(items.c.id).where(items.c.id == data['id'])).first() is not None:
+            data.pop('id')
+        # A fresh updated_at keeps it out of the next archive run and in the next incremental export
+        data['updated_at'] = datetime.utcnow()
+        # Rows archived before warranty_expiry_date existed do not carry it
+        data['warranty_expiry_date'] = warranty_expiry(data.get('supply_date'), data.get('warranty_period'))
+        data = {k: v for k, v in data.items() if k in items.c}
+        new_id = conn.execute(items.insert().values(**data)).inserted_primary_key[0]
+        data['id'] = new_id
+        conn.execute(delete(archive).where(archive.c.qr_ref == qr_ref))
+        apply_rollup_deltas(conn, rollup_deltas(None, data))
+        changes = record_changes(conn, [change('restored', data['item_id'], qr_ref, None, {'status': data['status']})])
+    if on_commit is not None:
+        on_commit(changes)
+    return data
+
+
+def archive_stats(engine) -> Dict:
+    items = RailwayItem.__table__
+    archive = ArchivedItem.__table__
+    with engine.connect() as conn:
+        return {
+            'hot_items': conn.execute(select(func.count()).select_from(items)).scalar_one(),
+            'archived_items': conn.execute(select(func.count()).select_from(archive)).scalar_one(),
+            'archived_bytes': conn.execute(select(func.coalesce(func.sum(func.length(archive.c.payload)), 0))).scalar_one(),
+        }
@@ -0,0 +1,112 @@
+# backend/services/item_rollups.py
+from collections import Counter
+from typing import Dict, Iterable, Optional
+from sqlalchemy import select, insert, delete, func, case, literal
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+try:
+    from backend.models.item_rollup import ItemRollup
+    from backend.models.railway_item import RailwayItem
+    from backend.models.column_types import code_name_sql
+except Exception:
+    from models.item_rollup import ItemRollup
+    from models.railway_item import RailwayItem
+    from models.column_types import code_name_sql
+
+ROLLUP_DIMENSIONS = ('item_type', 'status', 'vendor_lot', 'manufacturer', 'quality_band')
+NONE_KEY = '(none)'
+# Same cut-offs as RailwayAIAnalyzer._get_status_from_score
+QUALITY_BANDS = ((90, 'excellent'), (75, 'good'), (60, 'fair'))
+
+
+def quality_band(score: Optional[float]) -> str:
+    if score is None:
+        return 'unscored'
+    for floor, band in QUALITY_BANDS:
+        if score >= floor:
+            return band
+    return 'poor'
+
+
+def rollup_keys(item: Dict) -> Iterable:
+    """(dimension, key) pairs an item row counts towards"""
+    for dimension in ROLLUP_DIMENSIONS[:-1]:
+        value = item.get(dimension)
+        if dimension == 'status' and value is None:
+            value = 'active'
+        yield dimension, NONE_KEY if value in (None, '') else str(value)[:100]
+    yield 'quality_band', quality_band(item.get('quality_score'))
+
+
+def rollup_deltas(old: Optional[Dict], new: Optional[Dict], deltas: Counter = None) -> Counter:
+    """Count changes for one row going from old to new (None = absent)"""
+    deltas = deltas if deltas is not None else Counter()
+    if old is not None:
+        for key in rollup_keys(old):
+            deltas[key] -= 1
+    if new is not None:
+        for key in rollup_keys(new):
+            deltas[key] += 1
+    return deltas
+
+
+def apply_rollup_deltas(conn, deltas: Counter):
+    """Add deltas to the rollup rows in the caller's transaction (Connection or Session)"""
+    # Fixed (dimension, key) order: concurrent transactions lock the same rows in the same order
+    rows = [{'dimension': d, 'key': k, 'count': n} for (d, k), n in sorted(deltas.items()) if n]
+    if not rows:
+        return
+    table = ItemRollup.__table__
+    dialect = conn.get_bind().dialect.name if hasattr(conn, 'get_bind') else conn.dialect.name
+    stmt = (pg_insert if dialect == 'postgresql' else sqlite_insert)(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['dimension', 'key'],
+        set_={'count': table.c.count + stmt.excluded.count},
+    )
+    conn.execute(stmt, rows)
+
+
+def rebuild_rollups(engine):
+    """Recompute every rollup from railway_items (initial fill or repair)"""
+    table = ItemRollup.__table__
+    score = RailwayItem.quality_score
+    band = case(
+        (score.is_(None), literal('unscored')),
+        *[(score >= floor, literal(name)) for floor, name in QUALITY_BANDS],
+        else_=literal('poor'),
+    )
+    def key(value):
+        # Same keys as rollup_keys: cut to 100 characters, empty or missing as NONE_KEY
+        return func.coalesce(func.nullif(func.substr(value, 1, 100), ''), NONE_KEY)
+
+    expressions = {
+        # Codes to names in SQL: these values go straight into item_rollups
+        'item_type': key(code_name_sql(RailwayItem.item_type, 'item_type')),
+        'status': key(func.coalesce(code_name_sql(RailwayItem.status, 'status'), 'active')),
+        'vendor_lot': key(RailwayItem.vendor_lot),
+        'manufacturer': key(RailwayItem.manufacturer),
+        'quality_band': band,
+    }
+    with engine.begin() as conn:
+        conn.execute(delete(table))
+        for dimension, expr in expressions.items():
+            conn.execute(insert(table).from_select(
+                ['dimension', 'key', 'count'],
+                select(literal(dimension), expr, func.count()).group_by(expr),
+            ))
+
+
+def read_rollups(session, dimensions: Iterable[str], top: int = 50) -> Dict[str, Dict]:
+    """{dimension: {key: count}} for the `top` largest keys, read from the rollup table only"""
+    out = {}
+    table = ItemRollup.__table__
+    for dimension in dimensions:
+        rows = session.execute(
+            select(table.c.key, table.c.count)
+            .where(table.c.dimension == dimension, table.c.count > 0)
+            .order_by(table.c.count.desc())
+            .limit(top)
+        ).all()
+        out[dimension] = {k: c for k, c in rows}
+    return out
@@ -0,0 +1,302 @@
+# backend/services/item_search.py
+import os
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import select, or_, column, func, text
+
+try:
+    from backend.models.item_rollup import ItemRollup
+    from backend.models.railway_item import RailwayItem
+    from backend.services.item_rollups import NONE_KEY
+except Exception:
+    from models.item_rollup import ItemRollup
+    from models.railway_item import RailwayItem
+    from services.item_rollups import NONE_KEY
+
+# 'auto' uses FTS5 (SQLite) or pg_trgm (PostgreSQL) when available, else 'python'
+SEARCH_BACKEND = os.getenv('ITEM_SEARCH_BACKEND', 'auto')
+SEARCH_FIELDS = ('item_id', 'vendor_lot', 'manufacturer')
+# Fields matched fuzzily against their distinct values (kept in item_rollups)
+TERM_FIELDS = ('vendor_lot', 'manufacturer')
+# Same default as pg_trgm.similarity_threshold
+MIN_SIMILARITY = 0.3
+RESULT_COLUMNS = (
+    RailwayItem.id, RailwayItem.item_id, RailwayItem.qr_ref, RailwayItem.vendor_lot,
+    RailwayItem.manufacturer, RailwayItem.item_type, RailwayItem.status, RailwayItem.supply_date,
+)
+
+# External-content FTS5 index over railway_items; the trigram tokenizer answers substring MATCHes
+_FTS_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS item_search USING fts5(
+  item_id, vendor_lot, manufacturer, content='railway_items', content_rowid='id', tokenize='trigram')""",
+    """CREATE TRIGGER IF NOT EXISTS item_search_insert AFTER INSERT ON railway_items BEGIN
+  INSERT INTO item_search (rowid, item_id, vendor_lot, manufacturer)
+  VALUES (new.id, new.item_id, new.vendor_lot, new.manufacturer);
+END""",
+    """CREATE TRIGGER IF NOT EXISTS item_search_delete AFTER DELETE ON railway_items BEGIN
+  INSERT INTO item_search (item_search, rowid, item_id, vendor_lot, manufacturer)
+  VALUES ('delete', old.id, old.item_id, old.vendor_lot, old.manufacturer);
+END""",
+    """CREATE TRIGGER IF NOT EXISTS item_search_update AFTER UPDATE OF item_id, vendor_lot, manufacturer
+ON railway_items BEGIN
+  INSERT INTO item_search (item_search, rowid, item_id, vendor_lot, manufacturer)
+  VALUES ('delete', old.id, old.item_id, old.vendor_lot, old.manufacturer);
+  INSERT INTO item_search (rowid, item_id, vendor_lot, manufacturer)
+  VALUES (new.id, new.item_id, new.vendor_lot, new.manufacturer);
+END""",
+]
+
+# Prefix LIKE on PostgreSQL only uses a B-tree built with text_pattern_ops (any collation)
+_PG_PATTERN_DDL = [
+    'CREATE INDEX IF NOT EXISTS ix_railway_items_item_id_pattern ON railway_items (item_id text_pattern_ops)',
+    'CREATE INDEX IF NOT EXISTS ix_railway_items_lot_pattern ON railway_items (vendor_lot text_pattern_ops)',
+    # Case-insensitive prefixes: lower(column) LIKE 'prefix%'
+    'CREATE INDEX IF NOT EXISTS ix_railway_items_item_id_lower ON railway_items (lower(item_id) text_pattern_ops)',
+    'CREATE INDEX IF NOT EXISTS ix_railway_items_lot_lower ON railway_items (lower(vendor_lot) text_pattern_ops)',
+]
+# SQLite: a BINARY range over lower(column) (SQLite's lower() folds ASCII only)
+_SQLITE_PREFIX_DDL = [
+    'CREATE INDEX IF NOT EXISTS ix_railway_items_item_id_lower ON railway_items (lower(item_id))',
+    'CREATE INDEX IF NOT EXISTS ix_railway_items_lot_lower ON railway_items (lower(vendor_lot))',
+]
+_ASCII_LOWER = str.maketrans('ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz')
+_PG_TRGM_DDL = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    """CREATE INDEX IF NOT EXISTS ix_railway_items_search_trgm ON railway_items
+  USING gin (item_id gin_trgm_ops, vendor_lot gin_trgm_ops, manufacturer gin_trgm_ops)""",
+]
+
+_WORD = re.compile(r'[0-9a-z]+')
+
+
+def trigrams(value: Optional[str]) -> set:
+    """pg_trgm-style trigrams: lower-cased alphanumeric words padded with two leading and one trailing blank"""
+    grams = set()
+    for word in _WORD.findall((value or '').lower()):
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def similarity(a: Optional[str], b: Optional[str]) -> float:
+    """Shared trigrams over all trigrams, as pg_trgm's similarity()"""
+    ga, gb = trigrams(a), trigrams(b)
+    if not ga or not gb:
+        return 0.0
+    return len(ga & gb) / len(ga | gb)
+
+
+def score_match(query: str, value: Optional[str]) -> float:
+    """Rank of one field value: exact 3, prefix 2-3, substring 1-2, otherwise trigram similarity 0-1"""
+    if not value:
+        return 0.0
+    q, v = query.lower(), value.lower()
+    if v == q:
+        return 3.0
+    if v.startswith(q):
+        return 2.0 + len(q) / len(v)
+    if len(q) >= 3 and q in v:
+        return 1.0 + len(q) / len(v)
+    return similarity(q, v)
+
+
+def best_match(query: str, row) -> Tuple[float, Optional[str]]:
+    """(score, field) of the best-matching search field of a row mapping"""
+    best = (0.0, None)
+    for field in SEARCH_FIELDS:
+        score = score_match(query, row.get(field))
+        if score > best[0]:
+            best = (score, field)
+    return best
+
+
+def _escape_like(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+class TermIndex:
+    """Pure-Python trigram index over a set of short strings (pg_trgm similarity)"""
+    def __init__(self, terms):
+        self.terms = list(terms)
+        self._grams = [trigrams(t) for t in self.terms]
+        self._postings = defaultdict(list)
+        for i, grams in enumerate(self._grams):
+            for gram in grams:
+                self._postings[gram].append(i)
+
+    def __len__(self):
+        return len(self.terms)
+
+    def containing(self, query: str, limit: int = 10) -> List[str]:
+        """Terms containing query (case-insensitive), shortest first"""
+        q = query.lower()
+        return sorted((t for t in self.terms if q in t.lower()), key=lambda t: (len(t), t))[:limit]
+
+    def similar(self, query: str, threshold: float = MIN_SIMILARITY, limit: int = 10) -> List[Tuple[str, float]]:
+        """Terms sharing at least `threshold` of their trigrams with query, best first"""
+        wanted = trigrams(query)
+        if not wanted:
+            return []
+        shared = Counter()
+        for gram in wanted:
+            shared.update(self._postings.get(gram, ()))
+        matches = []
+        for i, n in shared.items():
+            score = n / (len(wanted) + len(self._grams[i]) - n)
+            if score >= threshold:
+                matches.append((self.terms[i], score))
+        matches.sort(key=lambda m: (-m[1], m[0]))
+        return matches[:limit]
+
+
+class ItemSearch:
+    """Ranked prefix / substring / fuzzy search over item_id, vendor_lot and manufacturer.
+
+    Stages run in rank order and stop once `limit` results are found: prefix
+    matches on item_id and vendor_lot (B-tree ranges), substring matches on all
+    three fields (FTS5 trigram on SQLite, pg_trgm GIN on PostgreSQL) and fuzzy
+    matches of vendor lots and manufacturers against their distinct values in
+    item_rollups, held in a TermIndex refreshed every `term_refresh_seconds`.
+    The 'python' fallback answers substrings from the TermIndex as well, so it
+    finds item_ids by prefix only.
+    """
+    def __init__(self, engine, backend: str = None, term_refresh_seconds: float = 60.0):
+        self.engine = engine
+        self.requested = backend or SEARCH_BACKEND
+        self.backend = 'python'
+        self.term_refresh_seconds = term_refresh_seconds
+        self._terms: Optional[Dict[str, TermIndex]] = None
+        self._terms_loaded = 0.0
+        self._lock = threading.Lock()
+
+    def ensure(self) -> str:
+        """Create the FTS5 table and triggers or the pg_trgm indexes; returns the backend in use"""
+        dialect = self.engine.dialect.name
+        prefix_ddl = {'postgresql': _PG_PATTERN_DDL, 'sqlite': _SQLITE_PREFIX_DDL}.get(dialect, [])
+        if prefix_ddl:
+            with self.engine.begin() as conn:
+                for statement in prefix_ddl:
+                    conn.exec_driver_sql(statement)
+        if self.requested == 'python':
+            self.backend = 'python'
+            return self.backend
+        try:
+            if dialect == 'sqlite':
+                self._ensure_fts5()
+                self.backend = 'fts5'
+            elif dialect == 'postgresql':
+                with self.engine.begin() as conn:
+                    for statement in _PG_TRGM_DDL:
+                        conn.exec_driver_sql(statement)
+                self.backend = 'pg_trgm'
+        except Exception as e:
+            print(f"Item search: no {dialect} trigram index ({e}); using the Python fallback")
+            self.backend = 'python'
+        return self.backend
+
+    def _ensure_fts5(self):
+        with self.engine.begin() as conn:
+            exists = conn.exec_driver_sql(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'item_search'"
+            ).first()
+            for statement in _FTS_DDL:
+                conn.exec_driver_sql(statement)
+            if not exists:
+                # Index rows written before the search table existed
+                conn.exec_driver_sql("INSERT INTO item_search (item_search) VALUES ('rebuild')")
+
+    def search(self, session, query: str, limit: int = 20) -> List[Dict]:
+        """Best `limit` items for query, each with `score` and the `matched` field"""
+        query = (query or '').strip()
+        if not query:
+            return []
+        found = {}
+        for stage in (self._prefix_rows, self._substring_rows, self._fuzzy_rows):
+            for row in stage(session, query, limit):
+                if row['id'] in found:
+                    continue
+                score, field = best_match(query, row)
+                if score >= MIN_SIMILARITY:
+                    found[row['id']] = (score, field, row)
+            if len(found) >= limit:
+                # Later stages only find lower-ranked matches
+                break
+        ranked = sorted(found.values(), key=lambda f: (-f[0], f[2]['item_id']))[:limit]
+        results = []
+        for score, field, row in ranked:
+            data = RailwayItem.serialize_row(row)
+            data.update(score=round(score, 3), matched=field)
+            results.append(data)
+        return results
+
+    def _prefix_rows(self, session, query: str, limit: int):
+        rows = []
+        for col in (RailwayItem.item_id, RailwayItem.vendor_lot):
+            stmt = select(*RESULT_COLUMNS).where(self._prefix_clause(col, query)).limit(limit)
+            rows.extend(session.execute(stmt).mappings())
+        return rows
+
+    def _prefix_clause(self, col, prefix: str):
+        """Case-insensitive prefix match served by the lower(column) index"""
+        if self.engine.dialect.name == 'postgresql':
+            return func.lower(col).like(_escape_like(prefix.lower()) + '%', escape='\\')
+        # SQLite's LIKE cannot use the index; a BINARY range over lower(column) can. The
+        # query is folded as SQLite's lower() folds the stored values: ASCII only
+        prefix = prefix.translate(_ASCII_LOWER)
+        return (func.lower(col) >= prefix) & (func.lower(col) < prefix[:-1] + chr(ord(prefix[-1]) + 1))
+
+    def _substring_rows(self, session, query: str, limit: int):
+        if len(query) < 3:
+            return []
+        if self.backend == 'python':
+            # No trigram index on the table: substrings of lots and manufacturers only
+            return self._term_rows(session, lambda index: index.containing(query), limit)
+        if self.backend == 'fts5':
+            matched = text('SELECT rowid FROM item_search WHERE item_search MATCH :phrase LIMIT :n').bindparams(
+                phrase='"' + query.replace('"', '""') + '"', n=limit,
+            ).columns(column('rowid'))
+            stmt = select(*RESULT_COLUMNS).where(RailwayItem.id.in_(matched))
+        else:
+            # Served by the pg_trgm GIN index
+            pattern = '%' + _escape_like(query) + '%'
+            stmt = select(*RESULT_COLUMNS).where(or_(
+                *[getattr(RailwayItem, f).ilike(pattern, escape='\\') for f in SEARCH_FIELDS]
+            )).limit(limit)
+        return session.execute(stmt).mappings().all()
+
+    def _fuzzy_rows(self, session, query: str, limit: int):
+        return self._term_rows(session, lambda index: [term for term, _ in index.similar(query)], limit)
+
+    def _term_rows(self, session, pick_terms, limit: int):
+        """Rows whose vendor_lot / manufacturer is one of the terms pick_terms(TermIndex) returns, in order"""
+        rows = []
+        for field, index in self._term_indexes(session).items():
+            col = getattr(RailwayItem, field)
+            for term in pick_terms(index):
+                if len(rows) >= limit:
+                    return rows
+                stmt = select(*RESULT_COLUMNS).where(col == term).limit(limit - len(rows))
+                rows.extend(session.execute(stmt).mappings())
+        return rows
+
+    def _term_indexes(self, session) -> Dict[str, TermIndex]:
+        with self._lock:
+            if self._terms is None or time.monotonic() - self._terms_loaded > self.term_refresh_seconds:
+                table = ItemRollup.__table__
+                grouped = defaultdict(list)
+                for dimension, key in session.execute(
+                    select(table.c.dimension, table.c.key)
+                    .where(table.c.dimension.in_(TERM_FIELDS), table.c.count > 0, table.c.key != NONE_KEY)
+                ):
+                    grouped[dimension].append(key)
+                self._terms = {field: TermIndex(grouped[field]) for field in TERM_FIELDS}
+                self._terms_loaded = time.monotonic()
+            return self._terms
+
+    def refresh_terms(self):
+        """Reload the fuzzy-match vocabulary on the next search"""
+        with self._lock:
+            self._terms = None
@@ -0,0 +1,254 @@
+# backend/services/label_sheet.py
+import io
+import math
+import zipfile
+import zlib
+from dataclasses import dataclass, replace
+from typing import Dict, Iterable, Iterator, List, Tuple
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+MM_PER_INCH = 25.4
+# Bounds on request-supplied layouts: a page is rendered whole in memory
+DPI_RANGE = (72, 1200)
+MAX_PAGE_MM = 500.0
+MAX_PAGE_PIXELS = 150_000_000
+MAX_LABELS_PER_PAGE = 500
+
+
+@dataclass(frozen=True)
+class LabelSheetLayout:
+    """Physical layout of a label sheet; all lengths in millimetres"""
+    page_width_mm: float = 210.0
+    page_height_mm: float = 297.0
+    columns: int = 3
+    rows: int = 8
+    margin_left_mm: float = 7.0
+    margin_top_mm: float = 10.0
+    label_width_mm: float = 65.0
+    label_height_mm: float = 34.0
+    gutter_x_mm: float = 3.0
+    gutter_y_mm: float = 0.0
+    caption_height_mm: float = 5.0
+    padding_mm: float = 2.0
+    dpi: int = 300
+
+    @property
+    def labels_per_page(self) -> int:
+        return self.columns * self.rows
+
+    def px(self, mm: float) -> int:
+        return int(round(mm * self.dpi / MM_PER_INCH))
+
+    def validate(self):
+        if self.columns <= 0 or self.rows <= 0:
+            raise ValueError('columns and rows must be positive')
+        if self.labels_per_page > MAX_LABELS_PER_PAGE:
+            raise ValueError(f'At most {MAX_LABELS_PER_PAGE} labels per page')
+        if not DPI_RANGE[0] <= self.dpi <= DPI_RANGE[1]:
+            raise ValueError(f'dpi must be between {DPI_RANGE[0]} and {DPI_RANGE[1]}')
+        if not (0 < self.page_width_mm <= MAX_PAGE_MM and 0 < self.page_height_mm <= MAX_PAGE_MM):
+            raise ValueError(f'Page width and height must be positive and at most {MAX_PAGE_MM:g} mm')
+        if self.px(self.page_width_mm) * self.px(self.page_height_mm) > MAX_PAGE_PIXELS:
+            raise ValueError('Page too large at this dpi')
+        if self.label_width_mm <= 0 or self.label_height_mm <= 0:
+            raise ValueError('Label width and height must be positive')
+        if min(self.margin_left_mm, self.margin_top_mm, self.gutter_x_mm, self.gutter_y_mm,
+               self.caption_height_mm, self.padding_mm) < 0:
+            raise ValueError('Margins, gutters, caption height and padding cannot be negative')
+        right = self.margin_left_mm + self.columns * self.label_width_mm + (self.columns - 1) * self.gutter_x_mm
+        bottom = self.margin_top_mm + self.rows * self.label_height_mm + (self.rows - 1) * self.gutter_y_mm
+        if right > self.page_width_mm + 1e-6 or bottom > self.page_height_mm + 1e-6:
+            raise ValueError('Labels do not fit on the page')
+        return self
+
+
+# Common stock sizes; any field can be overridden per request
+LABEL_LAYOUTS: Dict[str, LabelSheetLayout] = {
+    'a4_3x8': LabelSheetLayout(),
+    'a4_4x10': LabelSheetLayout(columns=4, rows=10, margin_left_mm=8.0, margin_top_mm=13.5,
+                                label_width_mm=48.5, label_height_mm=27.0, gutter_x_mm=0.0),
+    'a4_2x5': LabelSheetLayout(columns=2, rows=5, margin_left_mm=4.0, margin_top_mm=13.5,
+                               label_width_mm=99.0, label_height_mm=54.0, gutter_x_mm=4.0),
+}
+
+
+def _coerce(name: str, field_type: type, value):
+    """A request value as the layout field's type (int or float); ValueError if it is not one"""
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        raise ValueError(f'Layout field {name} must be a number')
+    try:
+        number = float(value)
+    except (ValueError, OverflowError):
+        raise ValueError(f'Layout field {name} must be a number') from None
+    if not math.isfinite(number):
+        raise ValueError(f'Layout field {name} must be finite')
+    if field_type is int:
+        if not number.is_integer():
+            raise ValueError(f'Layout field {name} must be a whole number')
+        return int(number)
+    return number
+
+
+def build_layout(name: str = 'a4_3x8', overrides: Dict = None) -> LabelSheetLayout:
+    """A named layout with request overrides applied, coerced to the field types and bounded"""
+    if name not in LABEL_LAYOUTS:
+        raise ValueError(f'Unknown label layout: {name}')
+    layout = LABEL_LAYOUTS[name]
+    if overrides:
+        if not isinstance(overrides, dict):
+            raise ValueError('layout_overrides must be an object')
+        fields = LabelSheetLayout.__dataclass_fields__
+        unknown = set(overrides) - set(fields)
+        if unknown:
+            raise ValueError(f'Unknown layout fields: {sorted(unknown)}')
+        layout = replace(layout, **{k: _coerce(k, fields[k].type, v) for k, v in overrides.items()})
+    return layout.validate()
+
+
+class LabelSheetRenderer:
+    """Tiles QR labels onto pages at exact physical size.
+
+    Pages are produced one at a time from an iterable of (item_id, qr_ref), so a
+    lot of any size is streamed with a single page in memory. QR modules come
+    straight from RailwayQRGenerator.get_qr_matrix and are drawn once, at an
+    integer number of device pixels per module.
+    """
+    def __init__(self, qr_generator, layout: LabelSheetLayout = None):
+        self.qr_generator = qr_generator
+        self.layout = (layout or LABEL_LAYOUTS['a4_3x8']).validate()
+        self._font = self._load_font(self.layout.px(self.layout.caption_height_mm * 0.7))
+
+    def _load_font(self, size_px: int):
+        try:
+            return ImageFont.truetype("arial.ttf", size_px)
+        except Exception:
+            try:
+                return ImageFont.load_default(size=size_px)
+            except TypeError:
+                return ImageFont.load_default()
+
+    def iter_pages(self, items: Iterable[Tuple[str, str]]) -> Iterator[Image.Image]:
+        page: List[Tuple[str, str]] = []
+        for item in items:
+            page.append(item)
+            if len(page) == self.layout.labels_per_page:
+                yield self.render_page(page)
+                page = []
+        if page:
+            yield self.render_page(page)
+
+    def render_page(self, labels: List[Tuple[str, str]]) -> Image.Image:
+        lay = self.layout
+        page = Image.new('L', (lay.px(lay.page_width_mm), lay.px(lay.page_height_mm)), 255)
+        draw = ImageDraw.Draw(page)
+        for index, (item_id, qr_ref) in enumerate(labels):
+            row, col = divmod(index, lay.columns)
+            x0 = lay.px(lay.margin_left_mm + col * (lay.label_width_mm + lay.gutter_x_mm))
+            y0 = lay.px(lay.margin_top_mm + row * (lay.label_height_mm + lay.gutter_y_mm))
+            self._draw_label(page, draw, x0, y0, item_id, qr_ref)
+        return page
+
+    def _draw_label(self, page, draw, x0: int, y0: int, item_id: str, qr_ref: str):
+        lay = self.layout
+        pad = lay.px(lay.padding_mm)
+        label_w = lay.px(lay.label_width_mm)
+        caption_h = lay.px(lay.caption_height_mm)
+        avail = min(label_w, lay.px(lay.label_height_mm) - caption_h) - 2 * pad
+
+        matrix = np.asarray(self.qr_generator.get_qr_matrix(qr_ref), dtype=bool)
+        module_px = max(1, avail // matrix.shape[0])
+        modules = np.where(matrix, 0, 255).astype(np.uint8)
+        qr_img = Image.fromarray(np.kron(modules, np.ones((module_px, module_px), dtype=np.uint8)), 'L')
+        page.paste(qr_img, (x0 + (label_w - qr_img.width) // 2, y0 + pad))
+
+        caption = str(item_id or qr_ref)
+        bbox = draw.textbbox((0, 0), caption, font=self._font)
+        text_x = x0 + (label_w - (bbox[2] - bbox[0])) // 2
+        draw.text((text_x, y0 + pad + qr_img.height), caption, fill=0, font=self._font)
+
+    def stream_pdf(self, items: Iterable[Tuple[str, str]]) -> Iterator[bytes]:
+        """Yield a multi-page PDF, one page image per PDF page, without buffering the document"""
+        lay = self.layout
+        width_pt = lay.page_width_mm * 72 / MM_PER_INCH
+        height_pt = lay.page_height_mm * 72 / MM_PER_INCH
+        offsets: Dict[int, int] = {}
+        written = 0
+        page_ids: List[int] = []
+
+        def emit(obj_id: int, body: bytes) -> bytes:
+            nonlocal written
+            offsets[obj_id] = written
+            chunk = f'{obj_id} 0 obj\n'.encode() + body + b'\nendobj\n'
+            written += len(chunk)
+            return chunk
+
+        header = b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n'
+        written += len(header)
+        yield header
+        # Object 2 (the page tree) is written last, once every page id is known
+        yield emit(1, b'<< /Type /Catalog /Pages 2 0 R >>')
+
+        next_id = 3
+        for page in self.iter_pages(items):
+            image_id, content_id, page_id = next_id, next_id + 1, next_id + 2
+            next_id += 3
+            data = zlib.compress(page.tobytes(), 6)
+            yield emit(image_id, (
+                f'<< /Type /XObject /Subtype /Image /Width {page.width} /Height {page.height} '
+                f'/ColorSpace /DeviceGray /BitsPerComponent 8 /Filter /FlateDecode /Length {len(data)} >>\n'
+                'stream\n'
+            ).encode() + data + b'\nendstream')
+            content = f'q {width_pt:.2f} 0 0 {height_pt:.2f} 0 0 cm /Im0 Do Q'.encode()
+            yield emit(content_id, f'<< /Length {len(content)} >>\nstream\n'.encode() + content + b'\nendstream')
+            yield emit(page_id, (
+                f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {width_pt:.2f} {height_pt:.2f}] '
+                f'/Resources << /XObject << /Im0 {image_id} 0 R >> >> /Contents {content_id} 0 R >>'
+            ).encode())
+            page_ids.append(page_id)
+
+        kids = ' '.join(f'{pid} 0 R' for pid in page_ids)
+        yield emit(2, f'<< /Type /Pages /Kids [{kids}] /Count {len(page_ids)} >>'.encode())
+
+        xref = [f'xref\n0 {next_id}\n', '0000000000 65535 f \n']
+        xref.extend(f'{offsets[i]:010d} 00000 n \n' for i in range(1, next_id))
+        yield ''.join(xref).encode()
+        yield f'trailer\n<< /Size {next_id} /Root 1 0 R >>\nstartxref\n{written}\n%%EOF\n'.encode()
+
+    def stream_png_zip(self, items: Iterable[Tuple[str, str]], png_compress_level: int = 6) -> Iterator[bytes]:
+        """Yield a ZIP archive of PNG sheets (sheet_0001.png, ...), one page at a time"""
+        sink = _ChunkSink()
+        dpi = (self.layout.dpi, self.layout.dpi)
+        with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_STORED) as archive:
+            for number, page in enumerate(self.iter_pages(items), start=1):
+                buf = io.BytesIO()
+                page.save(buf, format='PNG', dpi=dpi, compress_level=png_compress_level)
+                archive.writestr(f'sheet_{number:04d}.png', buf.getvalue())
+                yield sink.drain()
+        yield sink.drain()
+
+
+class _ChunkSink:
+    """Write-only, non-seekable file object that lets zipfile stream its output"""
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def seekable(self) -> bool:
+        return False
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
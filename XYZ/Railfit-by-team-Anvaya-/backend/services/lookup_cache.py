@@ -0,0 +1,166 @@
+# backend/services/lookup_cache.py
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+try:
+    import redis  # Optional: shared tier across workers
+    _HAS_REDIS = True
+except Exception:
+    redis = None
+    _HAS_REDIS = False
+
+# Cached marker for refs known not to exist
+_MISSING = object()
+
+
+class LRUCache:
+    """Thread-safe in-process LRU with per-entry TTL"""
+    def __init__(self, max_size: int = 10000, ttl_seconds: float = 60.0):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl_seconds: float = None):
+        expires = time.monotonic() + (ttl_seconds if ttl_seconds is not None else self.ttl_seconds)
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class LocalSharedCache:
+    """Stand-in for the Redis tier (tests, single-process dev); stores raw bytes with TTL"""
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            if entry[1] < time.monotonic():
+                del self._data[key]
+                return None
+            return entry[0]
+
+    def setex(self, key: str, ttl_seconds: int, value: bytes):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl_seconds)
+
+    def delete(self, *keys: str):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+
+def create_shared_cache(url: str = None):
+    """Redis client for redis:// URLs, the local stand-in for local://, else None"""
+    if not url:
+        return None
+    if url.startswith('local://'):
+        return LocalSharedCache()
+    if not _HAS_REDIS:
+        print("REDIS_URL set but the redis package is not installed; shared lookup cache disabled")
+        return None
+    return redis.Redis.from_url(url, socket_timeout=0.05, socket_connect_timeout=0.2)
+
+
+class ItemLookupCache:
+    """Read-through cache from qr_ref to the serialised item dict.
+
+    Tier 1 is a per-process LRU; tier 2 (optional) is shared, e.g. the Redis
+    service from docker-compose. Unknown refs are cached for a shorter TTL.
+    Writes invalidate both tiers in this process; other processes' LRUs age out
+    after `local_ttl`, so keep it short when several workers are running.
+    """
+    KEY_PREFIX = 'railway:item:'
+
+    def __init__(self, local_size: int = 10000, local_ttl: float = 60.0, shared=None,
+                 shared_ttl: int = 300, negative_ttl: int = 30):
+        self.local = LRUCache(local_size, local_ttl)
+        self.shared = shared
+        self.shared_ttl = shared_ttl
+        self.negative_ttl = negative_ttl
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, qr_ref: str, loader: Callable[[str], Optional[dict]]) -> Optional[dict]:
+        value = self.local.get(qr_ref)
+        if value is not None:
+            self.hits += 1
+            return None if value is _MISSING else dict(value)
+
+        raw = self._shared_get(qr_ref)
+        if raw is not None:
+            self.hits += 1
+            value = json.loads(raw)
+            self.local.set(qr_ref, _MISSING if value is None else value,
+                           self.negative_ttl if value is None else None)
+            return None if value is None else dict(value)
+
+        self.misses += 1
+        value = loader(qr_ref)
+        if value is None:
+            self.local.set(qr_ref, _MISSING, self.negative_ttl)
+            self._shared_set(qr_ref, b'null', self.negative_ttl)
+            return None
+        self.local.set(qr_ref, value)
+        self._shared_set(qr_ref, json.dumps(value).encode('utf-8'), self.shared_ttl)
+        return dict(value)
+
+    def invalidate(self, qr_ref: str):
+        self.local.delete(qr_ref)
+        if self.shared is not None:
+            try:
+                self.shared.delete(self.KEY_PREFIX + qr_ref)
+            except Exception as e:
+                print(f"Shared cache invalidate error: {e}")
+
+    def stats(self) -> dict:
+        return {'hits': self.hits, 'misses': self.misses, 'local_entries': len(self.local),
+                'shared': self.shared is not None}
+
+    def _shared_get(self, qr_ref: str) -> Optional[bytes]:
+        if self.shared is None:
+            return None
+        try:
+            return self.shared.get(self.KEY_PREFIX + qr_ref)
+        except Exception:
+            # The shared tier is an optimisation; fall through to the DB
+            return None
+
+    def _shared_set(self, qr_ref: str, raw: bytes, ttl: int):
+        if self.shared is None:
+            return
+        try:
+            self.shared.setex(self.KEY_PREFIX + qr_ref, ttl, raw)
+        except Exception:
+            pass
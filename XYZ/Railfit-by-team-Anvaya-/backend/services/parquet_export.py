@@ -0,0 +1,348 @@
+# backend/services/parquet_export.py
+import json
+import os
+import uuid
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, Optional, Tuple
+from sqlalchemy import select, func, Integer, Float, Boolean, DateTime, JSON
+
+try:
+    import pyarrow as pa  # Optional: only needed for exports
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+    _HAS_PYARROW = True
+except Exception:
+    pa = pc = pq = None
+    _HAS_PYARROW = False
+
+try:
+    from backend.models.railway_item import RailwayItem
+    from backend.models.inspection import Inspection
+    from backend.models.item_change import ItemChange
+    from backend.models.column_types import CalendarDate
+except Exception:
+    from models.railway_item import RailwayItem
+    from models.inspection import Inspection
+    from models.item_change import ItemChange
+    from models.column_types import CalendarDate
+
+MANIFEST = '_export_manifest.json'
+ROW_GROUP_SIZE = 100000
+# updated_at is stamped before commit, and sequence ids can commit out of order: leave the
+# newest seconds to the next run so a slow transaction cannot commit behind the watermark
+WATERMARK_LAG_SECONDS = 5
+
+
+@dataclass(frozen=True)
+class ExportSpec:
+    """How one table is exported: watermark column for incremental runs, Hive partition by year;
+    optionally only the rows matching `where`, under an export name of its own"""
+    table: object
+    watermark_column: str
+    partition_column: str
+    partition_key: str
+    # Insert time of id-watermarked rows (see _upper_watermark)
+    created_column: str = 'created_at'
+    where: Optional[object] = None
+    export_name: Optional[str] = None
+
+    @property
+    def name(self) -> str:
+        return self.export_name or self.table.name
+
+
+# Items leave railway_items only when archived (see item_archive)
+TOMBSTONE_OPS = ('archived', 'restored')
+
+EXPORTS = {
+    # Items change in place: incremental runs pick up rows with a newer updated_at. Rows that
+    # leave the table never show up again: consumers apply the tombstones export for those
+    'items': ExportSpec(RailwayItem.__table__, 'updated_at', 'supply_date', 'supply_year'),
+    # Inspections are append-only: the id is the watermark
+    'inspections': ExportSpec(Inspection.__table__, 'id', 'inspected_at', 'inspected_year'),
+    # Archive and restore records from the item_changes outbox, in id order: an item whose
+    # latest record is 'archived' is gone from items. Changes pruned before an export are lost
+    'tombstones': ExportSpec(ItemChange.__table__, 'id', 'changed_at', 'changed_year',
+                             created_column='changed_at', where=ItemChange.__table__.c.op.in_(TOMBSTONE_OPS),
+                             export_name='item_tombstones'),
+}
+
+
+def require_pyarrow():
+    if not _HAS_PYARROW:
+        raise RuntimeError('Parquet export needs pyarrow (pip install pyarrow)')
+
+
+def arrow_schema(table):
+    """Arrow schema for a table; JSON columns (e.g. ai_insights) are exported as JSON text"""
+    fields = []
+    for column in table.columns:
+        if isinstance(column.type, Integer):
+            arrow_type = pa.int64()
+        elif isinstance(column.type, Float):
+            arrow_type = pa.float64()
+        elif isinstance(column.type, Boolean):
+            arrow_type = pa.bool_()
+        elif isinstance(column.type, (DateTime, CalendarDate)):
+            # Days stay timestamps, so files from before the compact layout keep the same schema
+            arrow_type = pa.timestamp('us')
+        else:
+            arrow_type = pa.string()
+        fields.append(pa.field(column.name, arrow_type))
+    return pa.schema(fields)
+
+
+def _to_table(rows, schema, json_indexes) -> 'pa.Table':
+    columns = list(zip(*rows)) if rows else [()] * len(schema)
+    arrays = []
+    for i, (values, field) in enumerate(zip(columns, schema)):
+        if i in json_indexes:
+            values = [None if v is None else json.dumps(v, separators=(',', ':')) for v in values]
+        arrays.append(pa.array(values, type=field.type))
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+def parse_watermark(spec: ExportSpec, value):
+    """Watermark from its manifest / query-string form"""
+    if value in (None, ''):
+        return None
+    if spec.watermark_column == 'id':
+        return int(value)
+    return value if isinstance(value, datetime) else datetime.fromisoformat(str(value))
+
+
+def format_watermark(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _select(spec: ExportSpec, since=None, upper=None):
+    table = spec.table
+    watermark = table.c[spec.watermark_column]
+    stmt = select(*table.columns)
+    if spec.where is not None:
+        stmt = stmt.where(spec.where)
+    if since is None:
+        # Full export: primary-key order, rows without a watermark value included
+        return stmt.order_by(table.c.id)
+    stmt = stmt.where(watermark > since)
+    if upper is not None:
+        stmt = stmt.where(watermark <= upper)
+    return stmt.order_by(watermark, table.c.id) if spec.watermark_column != 'id' else stmt.order_by(table.c.id)
+
+
+def _upper_watermark(conn, spec: ExportSpec, since=None):
+    """Snapshot of the newest settled watermark value; the run exports up to it and the next one
+    continues after it"""
+    cutoff = datetime.utcnow() - timedelta(seconds=WATERMARK_LAG_SECONDS)
+    table = spec.table
+    if spec.watermark_column == 'id':
+        # Stop below the first row created within the lag: a lower id still in flight then
+        # falls after the watermark instead of behind it
+        recent = select(func.min(table.c.id)).where(table.c[spec.created_column] > cutoff)
+        if since is not None:
+            recent = recent.where(table.c.id > since)
+        first_recent = conn.execute(recent).scalar()
+        newest = select(func.max(table.c.id))
+        if first_recent is not None:
+            newest = newest.where(table.c.id < first_recent)
+        return conn.execute(newest).scalar()
+    newest = conn.execute(select(func.max(table.c[spec.watermark_column]))).scalar()
+    if isinstance(newest, datetime):
+        newest = min(newest, cutoff)
+    return newest
+
+
+def _iter_row_groups(conn, stmt, row_group_size: int):
+    result = conn.execution_options(stream_results=True, yield_per=row_group_size).execute(stmt)
+    for rows in result.partitions():
+        yield rows
+
+
+class _DrainableSink:
+    """Write-only file object whose contents are taken out after every row group"""
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data):
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data, self._chunks = b''.join(self._chunks), []
+        return data
+
+
+def stream_parquet(engine, table: str = 'items', since=None, row_group_size: int = ROW_GROUP_SIZE,
+                   compression: str = 'zstd') -> Tuple[object, Iterator[bytes]]:
+    """(watermark, chunks) for one Parquet file of the rows after `since`, written a row group at a time.
+
+    The watermark is fixed before streaming starts, so it can go in a response header.
+    An incremental items file holds rows inserted or updated since; archived items
+    are not in it, their removal is in the 'tombstones' export.
+    """
+    require_pyarrow()
+    spec = EXPORTS[table]
+    since = parse_watermark(spec, since)
+    with engine.connect() as conn:
+        upper = _upper_watermark(conn, spec, since)
+    if upper is None:
+        # Nothing settled yet: an incremental stream stays empty rather than unbounded
+        upper = since
+    schema = arrow_schema(spec.table)
+    json_indexes = {i for i, c in enumerate(spec.table.columns) if isinstance(c.type, JSON)}
+
+    def chunks():
+        sink = _DrainableSink()
+        writer = pq.ParquetWriter(sink, schema, compression=compression)
+        try:
+            with engine.connect() as conn:
+                stmt = _select(spec, since, upper if since is not None else None)
+                for rows in _iter_row_groups(conn, stmt, row_group_size):
+                    writer.write_table(_to_table(rows, schema, json_indexes), row_group_size=row_group_size)
+                    yield sink.drain()
+        finally:
+            writer.close()
+        yield sink.drain()
+
+    return upper, chunks()
+
+
+class ParquetExporter:
+    """Writes tables as Hive-partitioned Parquet datasets (<out>/<table>/<key>=<year>/part-<run>.parquet).
+
+    Rows are read in `row_group_size` batches through a streaming cursor,
+    converted to Arrow and split by year; at most about two row groups are
+    held before writing, so memory depends on the row group size, not on the
+    table size.
+    `_export_manifest.json` in the output directory keeps each table's
+    watermark; incremental runs export rows past it into new files.
+    """
+    def __init__(self, engine, out_dir: str, row_group_size: int = ROW_GROUP_SIZE, compression: str = 'zstd'):
+        require_pyarrow()
+        self.engine = engine
+        self.out_dir = out_dir
+        self.row_group_size = row_group_size
+        self.compression = compression
+
+    @property
+    def manifest_path(self) -> str:
+        return os.path.join(self.out_dir, MANIFEST)
+
+    def load_manifest(self) -> Dict:
+        try:
+            with open(self.manifest_path) as fh:
+                return json.load(fh)
+        except FileNotFoundError:
+            return {}
+
+    def _save_manifest(self, manifest: Dict):
+        tmp = self.manifest_path + '.tmp'
+        with open(tmp, 'w') as fh:
+            json.dump(manifest, fh, indent=2)
+        os.replace(tmp, self.manifest_path)
+
+    def export(self, table: str = 'items', full: bool = False) -> Dict:
+        """Export one table (full, or incremental from the manifest watermark); returns the run record"""
+        spec = EXPORTS[table]
+        manifest = self.load_manifest()
+        state = manifest.get(spec.name, {})
+        since = None if full else parse_watermark(spec, state.get('watermark'))
+        run_id = datetime.utcnow().strftime('%Y%m%dT%H%M%S') + '-' + uuid.uuid4().hex[:6]
+        started = datetime.utcnow()
+        table_dir = os.path.join(self.out_dir, spec.name)
+        os.makedirs(table_dir, exist_ok=True)
+
+        with self.engine.connect() as conn:
+            upper = _upper_watermark(conn, spec, since)
+            if upper is None or (since is not None and upper <= since):
+                rows, files = 0, []
+            else:
+                stmt = _select(spec, since, upper if since is not None else None)
+                rows, files = self._write_partitions(conn, spec, stmt, table_dir, run_id)
+
+        if full:
+            # The new run replaces every earlier file of the table
+            kept = {os.path.abspath(os.path.join(table_dir, f)) for f in files}
+            for root, _, names in os.walk(table_dir):
+                for name in names:
+                    path = os.path.abspath(os.path.join(root, name))
+                    if name.endswith('.parquet') and path not in kept:
+                        os.remove(path)
+        record = {
+            'run_id': run_id,
+            'mode': 'full' if since is None else 'incremental',
+            'since': format_watermark(since),
+            'watermark': format_watermark(upper if upper is not None else since),
+            'rows': rows,
+            'files': files,
+            'seconds': round((datetime.utcnow() - started).total_seconds(), 2),
+        }
+        runs = [] if full else state.get('runs', [])
+        manifest[spec.name] = {'watermark': record['watermark'], 'runs': (runs + [record])[-50:]}
+        self._save_manifest(manifest)
+        return record
+
+    def _write_partitions(self, conn, spec: ExportSpec, stmt, table_dir: str, run_id: str):
+        schema = arrow_schema(spec.table)
+        json_indexes = {i for i, c in enumerate(spec.table.columns) if isinstance(c.type, JSON)}
+        # Per-year Arrow slices waiting for a full row group; at most ~2 row groups in total
+        pending = defaultdict(list)
+        counts = defaultdict(int)
+        writers = {}
+        total = 0
+
+        def flush(year):
+            if year not in writers:
+                directory = os.path.join(table_dir, f'{spec.partition_key}={year}')
+                os.makedirs(directory, exist_ok=True)
+                # Dot-prefixed while writing: dataset readers skip it until the rename
+                tmp = os.path.join(directory, f'.part-{run_id}.parquet.tmp')
+                writers[year] = (pq.ParquetWriter(tmp, schema, compression=self.compression), tmp)
+            writers[year][0].write_table(pa.concat_tables(pending.pop(year)), row_group_size=self.row_group_size)
+            counts.pop(year)
+
+        try:
+            for rows in _iter_row_groups(conn, stmt, self.row_group_size):
+                chunk = _to_table(rows, schema, json_indexes)
+                years = pc.year(chunk.column(spec.partition_column))
+                for year in pc.unique(years).to_pylist():
+                    mask = pc.is_null(years) if year is None else pc.equal(years, year)
+                    key = '__HIVE_DEFAULT_PARTITION__' if year is None else year
+                    part = chunk.filter(mask)
+                    pending[key].append(part)
+                    counts[key] += part.num_rows
+                    if counts[key] >= self.row_group_size:
+                        flush(key)
+                total += len(rows)
+                while sum(counts.values()) > 2 * self.row_group_size:
+                    # Many years in flight: write the largest early, as a smaller row group
+                    flush(max(counts, key=counts.get))
+            for key in list(pending):
+                flush(key)
+        except Exception:
+            for writer, tmp in writers.values():
+                writer.close()
+                os.remove(tmp)
+            raise
+        files = []
+        for key, (writer, tmp) in sorted(writers.items(), key=lambda w: str(w[0])):
+            writer.close()
+            final = os.path.join(os.path.dirname(tmp), f'part-{run_id}.parquet')
+            os.replace(tmp, final)
+            files.append(os.path.relpath(final, table_dir))
+        return total, files
@@ -7,15 +7,75 @@ import hashlib
 from datetime import datetime
 import uuid
 from PIL import Image, ImageDraw, ImageFont
+from xml.sax.saxutils import escape
+
+try:
+    from backend.utils.image_processing import ImageProcessing
+except Exception:
+    from utils.image_processing import ImageProcessing
+
+try:
+    from backend.services.qr_payload import encode_payload
+except Exception:
+    from services.qr_payload import encode_payload
+
+# Foreground colours per role, shared by the raster and SVG renderers
+STYLE_COLORS = {
+    'manufacturer': (0, 51, 102),
+    'vendor': (0, 102, 51),
+    'official': (255, 103, 31),
+}
+
+STYLE_LABELS = {
+    'manufacturer': 'MANUFACTURER',
+    'vendor': 'VENDOR',
+    'official': 'RAILWAY',
+}
 
 class RailwayQRGenerator:
-    def __init__(self):
+    def __init__(self, ref_allocator=None, payload_mode: str = 'auto'):
         self.lookup_table = {}
+        # Optional QRRefAllocator; without one, refs fall back to the legacy hash
+        self.ref_allocator = ref_allocator
+        # See services/qr_payload.py; 'auto' picks the smallest QR version
+        self.payload_mode = payload_mode
 
     def generate_railway_qr(self, item_data, style: str = 'default'):
         """Generate QR code for railway items with enhanced styling"""
         qr_ref = self._create_qr_reference(item_data)
+        qr = self._prepare_qr(item_data, qr_ref)
+        return self._render_image(qr, style), qr_ref
 
+    def generate_railway_qr_encoded(self, item_data, style: str = 'default', fmt: str = 'png',
+                                    png_compress_level: int = 6):
+        """Generate a QR code and encode it exactly once.
+
+        Returns (image_bytes, mimetype, qr_ref); fmt is one of png, webp or svg.
+        """
+        if fmt not in ImageProcessing.MIMETYPES:
+            raise ValueError(f"Unsupported QR format: {fmt}")
+        qr_ref = self._create_qr_reference(item_data)
+        qr = self._prepare_qr(item_data, qr_ref)
+        return self._encode(qr, style, fmt, png_compress_level), ImageProcessing.mimetype_for(fmt), qr_ref
+
+    def encode_qr_for_ref(self, qr_ref, style: str = 'default', fmt: str = 'png', png_compress_level: int = 6):
+        """Render and encode the QR for an already-allocated ref; returns (image_bytes, mimetype)"""
+        if fmt not in ImageProcessing.MIMETYPES:
+            raise ValueError(f"Unsupported QR format: {fmt}")
+        return self._encode(self._build_qr(qr_ref), style, fmt, png_compress_level), ImageProcessing.mimetype_for(fmt)
+
+    def create_qr_references(self, count: int):
+        """Allocate several refs at once (one block reservation when an allocator is set)"""
+        if self.ref_allocator is not None:
+            return self.ref_allocator.next_refs(count)
+        return [self._create_qr_reference({}) for _ in range(count)]
+
+    def _encode(self, qr, style: str, fmt: str, png_compress_level: int) -> bytes:
+        if fmt == 'svg':
+            return self._render_svg(qr, style).encode('utf-8')
+        return ImageProcessing.encode_image(self._render_image(qr, style), fmt, png_compress_level)
+
+    def _prepare_qr(self, item_data, qr_ref):
         # Store in in-memory lookup (optional; DB is source of truth)
         self.lookup_table[qr_ref] = {
             'item_id': item_data.get('item_id'),
@@ -27,8 +87,14 @@ class RailwayQRGenerator:
             'manufacturer': item_data.get('manufacturer', ''),
             'created_at': datetime.now().isoformat()
         }
+        return self._build_qr(qr_ref)
+
+    def get_qr_matrix(self, qr_ref):
+        """Module matrix (rows of bools, quiet zone included) for an existing ref"""
+        return self._build_qr(qr_ref).get_matrix()
 
-        qr_data = f"INDIAN_RAILWAYS:{qr_ref}"
+    def _build_qr(self, qr_ref):
+        qr_data = encode_payload(qr_ref, self.payload_mode)
 
         qr = qrcode.QRCode(
             version=1,
@@ -38,7 +104,9 @@ class RailwayQRGenerator:
         )
         qr.add_data(qr_data)
         qr.make(fit=True)
+        return qr
 
+    def _render_image(self, qr, style: str):
         if style == 'manufacturer':
             img = self._create_manufacturer_qr(qr)
         elif style == 'vendor':
@@ -47,14 +115,13 @@ class RailwayQRGenerator:
             img = self._create_official_qr(qr)
         else:
             img = qr.make_image(fill_color="black", back_color="white")
-
-        return img, qr_ref
+        return img
 
     def _create_manufacturer_qr(self, qr):
         img = qr.make_image(
             image_factory=StyledPilImage,
             module_drawer=RoundedModuleDrawer(),
-            color_mask=SolidFillColorMask(back_color=(255, 255, 255), front_color=(0, 51, 102))
+            color_mask=SolidFillColorMask(back_color=(255, 255, 255), front_color=STYLE_COLORS['manufacturer'])
         )
         return self._add_railway_header_footer(img, "MANUFACTURER")
 
@@ -62,7 +129,7 @@ class RailwayQRGenerator:
         img = qr.make_image(
             image_factory=StyledPilImage,
             module_drawer=SquareModuleDrawer(),
-            color_mask=SolidFillColorMask(back_color=(255, 255, 255), front_color=(0, 102, 51))
+            color_mask=SolidFillColorMask(back_color=(255, 255, 255), front_color=STYLE_COLORS['vendor'])
         )
         return self._add_railway_header_footer(img, "VENDOR")
 
@@ -70,7 +137,7 @@ class RailwayQRGenerator:
         img = qr.make_image(
             image_factory=StyledPilImage,
             module_drawer=RoundedModuleDrawer(),
-            color_mask=SolidFillColorMask(back_color=(255, 255, 255), front_color=(255, 103, 31))
+            color_mask=SolidFillColorMask(back_color=(255, 255, 255), front_color=STYLE_COLORS['official'])
         )
         return self._add_railway_header_footer(img, "RAILWAY")
 
@@ -100,6 +167,45 @@ class RailwayQRGenerator:
 
         return new_img
 
+    def _render_svg(self, qr, style: str) -> str:
+        """Vector rendering of the QR matrix, with the same header/footer as the PNG"""
+        matrix = qr.get_matrix()
+        box = qr.box_size
+        size = len(matrix) * box
+        color = '#%02x%02x%02x' % STYLE_COLORS.get(style, (0, 0, 0))
+        label = STYLE_LABELS.get(style)
+        top = 40 if label else 0
+        height = size + (80 if label else 0)
+
+        # Merge horizontal runs of dark modules into single rectangles
+        path = []
+        for y, row in enumerate(matrix):
+            x = 0
+            while x < len(row):
+                if row[x]:
+                    start = x
+                    while x < len(row) and row[x]:
+                        x += 1
+                    path.append(f"M{start * box} {top + y * box}h{(x - start) * box}v{box}h-{(x - start) * box}z")
+                else:
+                    x += 1
+
+        parts = [
+            f'<svg xmlns="http://www.w3.org/2000/svg" width="{size}" height="{height}" '
+            f'viewBox="0 0 {size} {height}" shape-rendering="crispEdges">',
+            f'<rect width="{size}" height="{height}" fill="#ffffff"/>',
+            f'<path fill="{color}" d="{"".join(path)}"/>',
+        ]
+        if label:
+            text_style = 'font-family="Arial, sans-serif" font-size="16" text-anchor="middle" fill="#000000"'
+            parts.append(f'<text x="{size // 2}" y="26" {text_style}>{escape(f"INDIAN RAILWAYS - {label}")}</text>')
+            parts.append(f'<text x="{size // 2}" y="{size + 66}" {text_style}>भारतीय रेल</text>')
+        parts.append('</svg>')
+        return ''.join(parts)
+
     def _create_qr_reference(self, item_data):
+        if self.ref_allocator is not None:
+            # A sharded allocator mints from the shard the item will be stored on
+            return self.ref_allocator.for_item(item_data).next_ref()
         unique_string = f"{item_data.get('item_id')}{datetime.now().isoformat()}{uuid.uuid4()}"
         return hashlib.md5(unique_string.encode()).hexdigest()[:12]
@@ -0,0 +1,85 @@
+# backend/services/qr_payload.py
+"""QR payload codec shared by the generator and the scanners.
+
+Three payload forms are understood:
+  legacy  - "INDIAN_RAILWAYS:<qr_ref>"          byte mode, version 4 at level H
+  alnum   - "IR:<QR_REF>"                       alphanumeric mode, version 2 at level H
+  numeric - "91" + 14-digit sequence + check    numeric mode, version 1 (21x21) at level H
+Numeric needs a sequence-allocated ref (see qr_ref_allocator); other refs use alnum.
+"""
+import re
+from typing import Optional
+
+try:
+    from backend.services.qr_ref_allocator import REF_WIDTH, decode_ref, encode_ref, is_valid_ref
+except Exception:
+    from services.qr_ref_allocator import REF_WIDTH, decode_ref, encode_ref, is_valid_ref
+
+LEGACY_PREFIX = 'INDIAN_RAILWAYS:'
+ALNUM_PREFIX = 'IR:'
+NUMERIC_PREFIX = '91'
+# Decimal digits of the largest sequence value a REF_WIDTH-symbol ref holds (14)
+NUMERIC_DIGITS = len(str(32 ** REF_WIDTH - 1))
+LEGACY_REF_LENGTH = 12
+PAYLOAD_MODES = ('auto', 'numeric', 'alnum', 'legacy')
+
+# Sequence refs are REF_WIDTH Crockford symbols plus a check symbol; legacy refs are 12 lowercase chars
+_SEQUENCE_REF = re.compile(r'^[0-9A-HJKMNP-TV-Z]{%d}$' % (REF_WIDTH + 1))
+_LEGACY_REF = re.compile(r'^[0-9a-z]{%d}$' % LEGACY_REF_LENGTH)
+_NUMERIC_PAYLOAD = re.compile(r'^%s\d{%d}$' % (NUMERIC_PREFIX, NUMERIC_DIGITS + 1))
+
+
+def _luhn_digit(digits: str) -> str:
+    total = 0
+    for i, ch in enumerate(reversed(digits)):
+        d = int(ch)
+        if i % 2 == 0:
+            d *= 2
+            if d > 9:
+                d -= 9
+        total += d
+    return str((10 - total % 10) % 10)
+
+
+def _is_sequence_ref(qr_ref: str) -> bool:
+    return bool(_SEQUENCE_REF.match(qr_ref or '')) and is_valid_ref(qr_ref)
+
+
+def encode_payload(qr_ref: str, mode: str = 'auto') -> str:
+    """Build the QR payload for a ref using the most compact mode it allows"""
+    if mode not in PAYLOAD_MODES:
+        raise ValueError(f'Unknown payload mode: {mode}')
+    if mode == 'legacy':
+        return f'{LEGACY_PREFIX}{qr_ref}'
+    if mode in ('auto', 'numeric') and _is_sequence_ref(qr_ref):
+        body = NUMERIC_PREFIX + str(decode_ref(qr_ref)).rjust(NUMERIC_DIGITS, '0')
+        return body + _luhn_digit(body)
+    if mode == 'numeric':
+        raise ValueError(f'qr_ref {qr_ref} cannot be encoded numerically')
+    if _is_sequence_ref(qr_ref) or _LEGACY_REF.match(qr_ref or ''):
+        return f'{ALNUM_PREFIX}{qr_ref.upper()}'
+    # Refs outside both shapes would not round-trip through upper-casing
+    return f'{LEGACY_PREFIX}{qr_ref}'
+
+
+def decode_payload(data: str) -> Optional[str]:
+    """Return the qr_ref carried by a scanned payload, or None if it is not ours"""
+    data = (data or '').strip()
+    if data.startswith(LEGACY_PREFIX):
+        return data[len(LEGACY_PREFIX):] or None
+    if data.startswith(ALNUM_PREFIX):
+        ref = data[len(ALNUM_PREFIX):]
+        if len(ref) == LEGACY_REF_LENGTH:
+            return ref.lower()
+        return ref if _is_sequence_ref(ref) else None
+    if _NUMERIC_PAYLOAD.match(data) and _luhn_digit(data[:-1]) == data[-1]:
+        # Same width as the refs the encoder accepts for numeric payloads; larger values are not ours
+        try:
+            return encode_ref(int(data[len(NUMERIC_PREFIX):-1]), REF_WIDTH)
+        except ValueError:
+            return None
+    return None
+
+
+def is_railway_payload(data: str) -> bool:
+    return decode_payload(data) is not None
@@ -0,0 +1,201 @@
+# backend/services/qr_pool.py
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Optional
+from sqlalchemy import select, update, insert, delete, func
+
+try:
+    from backend.models.qr_pool import QRPoolEntry
+    from backend.utils.database import try_process_lock
+except Exception:
+    from models.qr_pool import QRPoolEntry
+    from utils.database import try_process_lock
+
+# pg_advisory_lock key of the replenisher (see SCHEMA_LOCK_KEY in utils/database.py)
+REPLENISH_LOCK_KEY = 7215000350
+
+
+class QRPoolService:
+    """Pool of pre-minted, pre-rendered QR refs per item_type.
+
+    A background replenisher keeps `target_size` refs available for every item
+    type (refilling once a type drops below `low_water`), so a marking station's
+    claim is a single indexed UPDATE instead of allocate + render + insert + write.
+    Every worker process runs a replenisher, but only one at a time mints; claimed
+    rows are deleted once `claim_retention_seconds` old (the item keeps the ref).
+    """
+    def __init__(self, engine, qr_generator, image_folder: str, item_types: Iterable[str],
+                 target_size: int = 200, low_water: int = 50, interval_seconds: float = 30.0,
+                 style: str = 'manufacturer', png_compress_level: int = 6, batch_size: int = 100,
+                 claim_retention_seconds: float = 3600.0):
+        self.engine = engine
+        self.qr_generator = qr_generator
+        self.image_folder = image_folder
+        self.item_types = list(item_types)
+        self.target_size = target_size
+        self.low_water = min(low_water, target_size)
+        self.interval_seconds = interval_seconds
+        self.style = style
+        self.png_compress_level = png_compress_level
+        self.batch_size = batch_size
+        self.claim_retention_seconds = claim_retention_seconds
+        self._replenish_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        QRPoolEntry.__table__.create(bind=engine, checkfirst=True)
+
+    def claim(self, item_type: str, claimed_by: str = None) -> Optional[Dict]:
+        """Atomically take the oldest available ref for item_type, or None if the pool is empty"""
+        next_id = (
+            select(QRPoolEntry.id)
+            .where(QRPoolEntry.item_type == item_type, QRPoolEntry.status == 'available')
+            .order_by(QRPoolEntry.id)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+            .scalar_subquery()
+        )
+        stmt = (
+            update(QRPoolEntry)
+            .where(QRPoolEntry.id == next_id, QRPoolEntry.status == 'available')
+            .values(status='claimed', claimed_by=claimed_by, claimed_at=datetime.utcnow())
+        )
+        returning = self.engine.dialect.update_returning
+        for _ in range(5):
+            with self.engine.begin() as conn:
+                if returning:
+                    row = conn.execute(stmt.returning(QRPoolEntry.qr_ref, QRPoolEntry.image_path)).first()
+                else:
+                    row = self._claim_without_returning(conn, item_type, claimed_by)
+            if row:
+                self._wake.set()
+                return {'qr_ref': row[0], 'image_path': row[1]}
+            # A concurrent claimer won the race, or the pool is empty
+            if not self.available_count(item_type):
+                break
+        self._wake.set()
+        return None
+
+    def release(self, qr_ref: str) -> bool:
+        """Return a claimed ref to the pool (its item was not saved); False if it was not claimed"""
+        with self.engine.begin() as conn:
+            res = conn.execute(
+                update(QRPoolEntry)
+                .where(QRPoolEntry.qr_ref == qr_ref, QRPoolEntry.status == 'claimed')
+                .values(status='available', claimed_by=None, claimed_at=None)
+            )
+        return bool(res.rowcount)
+
+    def _claim_without_returning(self, conn, item_type, claimed_by):
+        row = conn.execute(
+            select(QRPoolEntry.id, QRPoolEntry.qr_ref, QRPoolEntry.image_path)
+            .where(QRPoolEntry.item_type == item_type, QRPoolEntry.status == 'available')
+            .order_by(QRPoolEntry.id)
+            .limit(1)
+        ).first()
+        if not row:
+            return None
+        res = conn.execute(
+            update(QRPoolEntry)
+            .where(QRPoolEntry.id == row[0], QRPoolEntry.status == 'available')
+            .values(status='claimed', claimed_by=claimed_by, claimed_at=datetime.utcnow())
+        )
+        return (row[1], row[2]) if res.rowcount else None
+
+    def available_count(self, item_type: str) -> int:
+        with self.engine.connect() as conn:
+            return conn.execute(
+                select(func.count())
+                .select_from(QRPoolEntry)
+                .where(QRPoolEntry.item_type == item_type, QRPoolEntry.status == 'available')
+            ).scalar_one()
+
+    def stats(self) -> Dict[str, int]:
+        return {t: self.available_count(t) for t in self.item_types}
+
+    def prune_claimed(self) -> int:
+        """Delete claimed rows older than claim_retention_seconds; their images stay with the items"""
+        cutoff = datetime.utcnow() - timedelta(seconds=self.claim_retention_seconds)
+        with self.engine.begin() as conn:
+            res = conn.execute(
+                delete(QRPoolEntry).where(QRPoolEntry.status == 'claimed', QRPoolEntry.claimed_at < cutoff)
+            )
+        return res.rowcount or 0
+
+    def replenish(self, item_type: str, force: bool = False) -> int:
+        """Top up item_type to target_size; unless forced, only once below low_water.
+        Returns 0 without minting while another process replenishes"""
+        with self._replenish_lock, try_process_lock(self.engine, 'qr-pool', REPLENISH_LOCK_KEY) as acquired:
+            return self._replenish(item_type, force) if acquired else 0
+
+    def replenish_all(self) -> Dict[str, int]:
+        """One replenisher pass: prune old claims, then top up every item type (if no other
+        process is at it); returns the codes minted per type"""
+        minted = {}
+        with self._replenish_lock, try_process_lock(self.engine, 'qr-pool', REPLENISH_LOCK_KEY) as acquired:
+            if not acquired:
+                return minted
+            pruned = self.prune_claimed()
+            if pruned:
+                print(f"QR pool: pruned {pruned} claimed codes")
+            for item_type in self.item_types:
+                if self._stop.is_set():
+                    break
+                try:
+                    minted[item_type] = self._replenish(item_type)
+                except Exception as e:
+                    print(f"QR pool replenish error for {item_type}: {e}")
+        return minted
+
+    def _replenish(self, item_type: str, force: bool = False) -> int:
+        # Counted under the process lock, so two workers cannot both fill the same gap
+        available = self.available_count(item_type)
+        if not force and available >= self.low_water:
+            return 0
+        missing = self.target_size - available
+        added = 0
+        while added < missing:
+            refs = self.qr_generator.create_qr_references(min(self.batch_size, missing - added))
+            rows = []
+            for qr_ref in refs:
+                data, _ = self.qr_generator.encode_qr_for_ref(qr_ref, self.style, 'png', self.png_compress_level)
+                path = os.path.join(self.image_folder, f"railway_qr_mfg_{qr_ref}.png")
+                with open(path, 'wb') as fh:
+                    fh.write(data)
+                rows.append({'qr_ref': qr_ref, 'item_type': item_type, 'status': 'available',
+                             'image_path': path, 'created_at': datetime.utcnow()})
+            with self.engine.begin() as conn:
+                conn.execute(insert(QRPoolEntry), rows)
+            added += len(rows)
+        return added
+
+    def start(self):
+        """Start the replenisher thread unless it is running; safe to call from every request"""
+        if self._thread and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='qr-pool-replenisher', daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                for item_type, added in self.replenish_all().items():
+                    if added:
+                        print(f"QR pool: minted {added} {item_type} codes")
+            except Exception as e:
+                print(f"QR pool replenish error: {e}")
+            self._wake.wait(self.interval_seconds)
+            self._wake.clear()
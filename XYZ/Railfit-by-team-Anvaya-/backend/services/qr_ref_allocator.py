@@ -0,0 +1,151 @@
+# backend/services/qr_ref_allocator.py
+import threading
+from typing import List, Optional, Tuple
+from sqlalchemy import select, update, insert
+from sqlalchemy.exc import IntegrityError
+
+try:
+    from backend.models.id_sequence import IdSequence
+except Exception:
+    from models.id_sequence import IdSequence
+
+# Crockford base32: no I, L, O, U, and every symbol is valid in QR alphanumeric mode
+CROCKFORD_ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+_DECODE = {c: i for i, c in enumerate(CROCKFORD_ALPHABET)}
+_DECODE.update({'O': 0, 'I': 1, 'L': 1})
+# A sharded store mints each shard's refs with the shard number as the leading symbol
+MAX_SHARDS = len(CROCKFORD_ALPHABET)
+# Symbols of a minted ref before its check character
+REF_WIDTH = 9
+
+
+def check_char(body: str) -> str:
+    """Luhn mod 32 check character; catches all single-symbol errors and adjacent swaps"""
+    n = len(CROCKFORD_ALPHABET)
+    total = 0
+    factor = 2
+    for ch in reversed(body):
+        addend = factor * _DECODE[ch]
+        total += addend // n + addend % n
+        factor = 1 if factor == 2 else 2
+    return CROCKFORD_ALPHABET[(n - total % n) % n]
+
+
+def encode_ref(value: int, width: int = REF_WIDTH) -> str:
+    """Encode a sequence number as fixed-width Crockford base32 plus a check character"""
+    if value < 0:
+        raise ValueError('Sequence value must be non-negative')
+    digits = []
+    while value:
+        value, rem = divmod(value, 32)
+        digits.append(CROCKFORD_ALPHABET[rem])
+    body = ''.join(reversed(digits)).rjust(width, '0')
+    if len(body) > width:
+        raise ValueError(f'Sequence value does not fit in {width} symbols')
+    return body + check_char(body)
+
+
+def normalize_ref(ref: str) -> str:
+    """Upper-case and map the Crockford look-alikes (O->0, I/L->1)"""
+    ref = (ref or '').strip().upper()
+    return ''.join(CROCKFORD_ALPHABET[_DECODE[c]] if c in _DECODE else c for c in ref)
+
+
+def is_valid_ref(ref: str) -> bool:
+    ref = normalize_ref(ref)
+    if len(ref) < 2 or any(c not in _DECODE for c in ref):
+        return False
+    return check_char(ref[:-1]) == ref[-1]
+
+
+def decode_ref(ref: str) -> int:
+    ref = normalize_ref(ref)
+    if not is_valid_ref(ref):
+        raise ValueError(f'Invalid qr_ref: {ref}')
+    value = 0
+    for ch in ref[:-1]:
+        value = value * 32 + _DECODE[ch]
+    return value
+
+
+def ref_shard(ref: str, width: int = REF_WIDTH) -> Optional[int]:
+    """Shard hint of a ref minted by QRRefAllocator: its leading symbol (None for any other ref).
+    Refs minted before sharding start with 0, the shard that keeps the original database"""
+    ref = normalize_ref(ref)
+    if len(ref) != width + 1 or not is_valid_ref(ref):
+        return None
+    return _DECODE[ref[0]]
+
+
+class QRRefAllocator:
+    """Collision-free qr_ref minting from blocks reserved on a DB sequence.
+
+    Each process reserves `block_size` numbers with one UPDATE and then mints
+    refs locally, so there is no per-item uniqueness round trip and workers
+    only contend once per block. With `shard`, refs carry the shard number in
+    their leading symbol (see ref_shard) and the sequence counts within it.
+    """
+    def __init__(self, engine, block_size: int = 1000, sequence: str = 'qr_ref', width: int = REF_WIDTH,
+                 shard: int = None):
+        if block_size <= 0:
+            raise ValueError('block_size must be positive')
+        if shard is not None and not 0 <= shard < MAX_SHARDS:
+            raise ValueError(f'shard must be 0..{MAX_SHARDS - 1}')
+        self.engine = engine
+        self.block_size = block_size
+        self.sequence = sequence
+        self.width = width
+        self.shard = shard
+        # Sequence values per leading symbol
+        self._span = len(CROCKFORD_ALPHABET) ** (width - 1)
+        self._lock = threading.Lock()
+        self._next = 0
+        self._end = 0
+        IdSequence.__table__.create(bind=engine, checkfirst=True)
+
+    def for_item(self, item_data) -> 'QRRefAllocator':
+        """Allocator for an item's ref; always this one (see ShardedRefAllocator)"""
+        return self
+
+    def next_ref(self) -> str:
+        return self.next_refs(1)[0]
+
+    def next_refs(self, count: int) -> List[str]:
+        refs: List[str] = []
+        with self._lock:
+            while len(refs) < count:
+                if self._next >= self._end:
+                    self._next, self._end = self._reserve_block()
+                take = min(count - len(refs), self._end - self._next)
+                base = 0
+                if self.shard is not None:
+                    if self._next + take > self._span:
+                        raise ValueError(f'qr_ref sequence of shard {self.shard} is exhausted')
+                    base = self.shard * self._span
+                refs.extend(encode_ref(base + v, self.width) for v in range(self._next, self._next + take))
+                self._next += take
+        return refs
+
+    def _reserve_block(self) -> Tuple[int, int]:
+        """Atomically advance the sequence; returns the reserved [start, end) range"""
+        for _ in range(5):
+            with self.engine.begin() as conn:
+                res = conn.execute(
+                    update(IdSequence)
+                    .where(IdSequence.name == self.sequence)
+                    .values(next_value=IdSequence.next_value + self.block_size)
+                )
+                if res.rowcount:
+                    # Still inside the write transaction, so this reads our own increment
+                    end = conn.execute(
+                        select(IdSequence.next_value).where(IdSequence.name == self.sequence)
+                    ).scalar_one()
+                    return end - self.block_size, end
+            # First use of this sequence; another worker may create it concurrently
+            try:
+                with self.engine.begin() as conn:
+                    conn.execute(insert(IdSequence).values(name=self.sequence, next_value=1 + self.block_size))
+                return 1, 1 + self.block_size
+            except IntegrityError:
+                continue
+        raise RuntimeError(f'Could not reserve a block from sequence {self.sequence}')
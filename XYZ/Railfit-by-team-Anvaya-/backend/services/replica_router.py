@@ -0,0 +1,149 @@
+# backend/services/replica_router.py
+import contextvars
+import itertools
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+from sqlalchemy import select, update, insert
+from sqlalchemy.exc import IntegrityError
+
+try:
+    from backend.models.replication_heartbeat import ReplicationHeartbeat
+    from backend.utils.database import create_db_engine
+except Exception:
+    from models.replication_heartbeat import ReplicationHeartbeat
+    from utils.database import create_db_engine
+
+# Who is making the current request (set by the app); keys read-your-writes stickiness
+_current_actor = contextvars.ContextVar('railway_db_actor', default=None)
+
+
+def set_actor(actor: Optional[str]):
+    _current_actor.set(actor)
+
+
+def current_actor() -> Optional[str]:
+    return _current_actor.get()
+
+
+class ReplicaRouter:
+    """Routes reads to healthy replicas and everything else to the primary.
+
+    A background thread writes a heartbeat row on the primary every
+    `interval_seconds` and reads it back from each replica; a replica whose copy
+    trails by more than `max_lag_seconds` (or cannot be reached) is skipped until
+    it catches up. After an actor writes, its reads stay on the primary for
+    `sticky_seconds` so it sees its own changes.
+    """
+    HEARTBEAT = 'primary'
+
+    def __init__(self, primary_engine, replica_urls: List[str], max_lag_seconds: float = 5.0,
+                 sticky_seconds: float = 5.0, interval_seconds: float = 1.0, sqlite_profile: str = None):
+        self.primary = primary_engine
+        self.replicas = [create_db_engine(url, sqlite_profile, read_only=True) for url in replica_urls]
+        self.max_lag_seconds = max_lag_seconds
+        self.sticky_seconds = sticky_seconds
+        self.interval_seconds = interval_seconds
+        # Replica index -> lag in seconds (None: unreachable or never seen a heartbeat)
+        self.lag: Dict[int, Optional[float]] = {i: None for i in range(len(self.replicas))}
+        self._healthy: List = []
+        self._cycle = itertools.cycle([])
+        self._recent_writes: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._last_beat: Optional[datetime] = None
+        ReplicationHeartbeat.__table__.create(bind=primary_engine, checkfirst=True)
+
+    def engine_for_read(self):
+        """A healthy replica (round-robin), or the primary when none is usable or the actor just wrote"""
+        actor = current_actor()
+        if actor is not None:
+            wrote_at = self._recent_writes.get(actor)
+            if wrote_at is not None and time.monotonic() - wrote_at < self.sticky_seconds:
+                return self.primary
+        with self._lock:
+            if not self._healthy:
+                return self.primary
+            return next(self._cycle)
+
+    def note_write(self):
+        actor = current_actor()
+        if actor is None:
+            return
+        now = time.monotonic()
+        with self._lock:
+            self._recent_writes[actor] = now
+            if len(self._recent_writes) > 10000:
+                # Drop entries whose window has passed
+                self._recent_writes = {k: t for k, t in self._recent_writes.items()
+                                       if now - t < self.sticky_seconds}
+
+    def beat(self):
+        """Write the primary heartbeat"""
+        now = datetime.utcnow()
+        with self.primary.begin() as conn:
+            res = conn.execute(
+                update(ReplicationHeartbeat).where(ReplicationHeartbeat.name == self.HEARTBEAT).values(beat_at=now)
+            )
+            if not res.rowcount:
+                try:
+                    conn.execute(insert(ReplicationHeartbeat).values(name=self.HEARTBEAT, beat_at=now))
+                except IntegrityError:
+                    pass
+        self._last_beat = now
+
+    def check(self):
+        """Measure each replica's lag against the last heartbeat and refresh the healthy set"""
+        for i, engine in enumerate(self.replicas):
+            try:
+                with engine.connect() as conn:
+                    seen = conn.execute(
+                        select(ReplicationHeartbeat.beat_at).where(ReplicationHeartbeat.name == self.HEARTBEAT)
+                    ).scalar()
+                if seen is None or self._last_beat is None:
+                    self.lag[i] = None
+                else:
+                    self.lag[i] = max(0.0, (self._last_beat - seen).total_seconds())
+            except Exception as e:
+                if self.lag[i] is not None:
+                    print(f"Replica {i} unreachable: {e}")
+                self.lag[i] = None
+        healthy = [self.replicas[i] for i, lag in self.lag.items() if lag is not None and lag <= self.max_lag_seconds]
+        with self._lock:
+            self._healthy = healthy
+            self._cycle = itertools.cycle(healthy)
+
+    def refresh(self):
+        try:
+            self.beat()
+        except Exception as e:
+            print(f"Replication heartbeat error: {e}")
+        self.check()
+
+    def stats(self) -> dict:
+        return {
+            'replicas': len(self.replicas),
+            'healthy': len(self._healthy),
+            'lag_seconds': {str(i): lag for i, lag in self.lag.items()},
+            'max_lag_seconds': self.max_lag_seconds,
+        }
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='replica-router', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.refresh()
+            self._stop.wait(self.interval_seconds)
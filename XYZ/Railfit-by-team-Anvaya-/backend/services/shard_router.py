@@ -0,0 +1,114 @@
+# backend/services/shard_router.py
+import re
+import zlib
+from typing import Dict, List, Optional
+
+try:
+    from backend.services.qr_ref_allocator import MAX_SHARDS, QRRefAllocator, ref_shard
+except Exception:
+    from services.qr_ref_allocator import MAX_SHARDS, QRRefAllocator, ref_shard
+
+SHARD_KEYS = ('zone', 'item_id')
+# Railway zone codes: NR, CR, SECR, ECOR, ... (stored upper-cased)
+_ZONE = re.compile(r'^[A-Z0-9]{1,10}$')
+
+
+def normalize_zone(zone) -> Optional[str]:
+    """Upper-cased zone code; None for no zone, ValueError for a malformed one"""
+    if zone is None or (isinstance(zone, str) and not zone.strip()):
+        return None
+    code = str(zone).strip().upper()
+    if not _ZONE.match(code):
+        raise ValueError(f'Invalid zone: {zone} (1-10 letters or digits, e.g. NR, SECR)')
+    return code
+
+
+def parse_zone_map(spec: str) -> Dict[str, int]:
+    """'NR=0,NER=0,CR=1' -> {'NR': 0, 'NER': 0, 'CR': 1}"""
+    zone_map = {}
+    for entry in (spec or '').split(','):
+        if not entry.strip():
+            continue
+        zone, _, shard = entry.partition('=')
+        try:
+            zone_map[normalize_zone(zone)] = int(shard)
+        except (TypeError, ValueError):
+            raise ValueError(f'Invalid zone mapping: {entry.strip()} (expected ZONE=shard)')
+    return zone_map
+
+
+def stable_hash(value: str) -> int:
+    # Same value in every process (unlike hash() on str)
+    return zlib.crc32(value.encode('utf-8'))
+
+
+class ShardRouter:
+    """Picks the shard that stores an item.
+
+    key='zone': an item goes to the shard its zone is mapped to; zones missing
+    from the map are spread by hash, and items without a zone stay on shard 0
+    (the pre-sharding database). key='item_id': an item goes to the hash of its
+    item_id modulo the shard count. Refs minted for an item carry its shard in
+    their leading symbol (see qr_ref_allocator.ref_shard).
+    """
+    def __init__(self, shard_count: int, key: str = 'zone', zone_map: Dict[str, int] = None):
+        if not 1 <= shard_count <= MAX_SHARDS:
+            raise ValueError(f'Between 1 and {MAX_SHARDS} shards are supported')
+        if key not in SHARD_KEYS:
+            raise ValueError(f"Unknown shard key: {key} (expected one of: {', '.join(SHARD_KEYS)})")
+        self.shard_count = shard_count
+        self.key = key
+        self.zone_map = {normalize_zone(z): s for z, s in (zone_map or {}).items()}
+        bad = sorted(z for z, s in self.zone_map.items() if not 0 <= s < shard_count)
+        if bad:
+            raise ValueError(f"Zones mapped to a missing shard: {', '.join(bad)}")
+
+    def shard_for_zone(self, zone) -> int:
+        zone = normalize_zone(zone)
+        if zone is None:
+            return 0
+        if zone in self.zone_map:
+            return self.zone_map[zone]
+        return stable_hash(zone) % self.shard_count
+
+    def shard_for_item_id(self, item_id) -> Optional[int]:
+        """Home shard of item_id when sharding by item_id; None when any shard may hold it"""
+        if self.key != 'item_id' or not item_id:
+            return None
+        return stable_hash(str(item_id)) % self.shard_count
+
+    def shard_for(self, item_data) -> int:
+        """Shard a new item is stored on; ValueError for a malformed zone"""
+        if self.key == 'item_id':
+            home = self.shard_for_item_id(item_data.get('item_id'))
+            return 0 if home is None else home
+        return self.shard_for_zone(item_data.get('zone'))
+
+    def shard_for_ref(self, qr_ref) -> Optional[int]:
+        """Shard named by a minted ref, None for refs without a usable hint"""
+        shard = ref_shard(qr_ref)
+        return shard if shard is not None and shard < self.shard_count else None
+
+    def shards_for_filters(self, filters: dict) -> List[int]:
+        """Shards that can hold items matching filters: just one for a zone filter when sharding by zone"""
+        if self.key == 'zone' and (filters or {}).get('zone'):
+            return [self.shard_for_zone(filters['zone'])]
+        return list(range(self.shard_count))
+
+
+class ShardedRefAllocator:
+    """One QRRefAllocator per shard, each on its shard's own sequence; an item's
+    ref comes from the shard the router stores it on"""
+    def __init__(self, engines, router: ShardRouter, block_size: int = 1000):
+        self.router = router
+        self.allocators = [QRRefAllocator(engine, block_size, shard=i) for i, engine in enumerate(engines)]
+
+    def for_item(self, item_data) -> QRRefAllocator:
+        return self.allocators[self.router.shard_for(item_data or {})]
+
+    # Refs minted without an item are for shard 0, like items without a zone
+    def next_ref(self) -> str:
+        return self.allocators[0].next_ref()
+
+    def next_refs(self, count: int) -> List[str]:
+        return self.allocators[0].next_refs(count)
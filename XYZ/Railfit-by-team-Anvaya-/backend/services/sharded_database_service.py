@@ -0,0 +1,433 @@
+# backend/services/sharded_database_service.py
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from sqlalchemy import delete, select
+
+try:
+    from backend.models.railway_item import RailwayItem
+    from backend.models.column_types import code_for
+    from backend.models.shard_item_key import ShardItemKey
+    from backend.services.database_service import DatabaseService
+    from backend.services.item_archive import find_archived
+    from backend.services.item_rollups import ROLLUP_DIMENSIONS
+    from backend.services.shard_router import ShardRouter, ShardedRefAllocator, normalize_zone
+except Exception:
+    from models.railway_item import RailwayItem
+    from models.column_types import code_for
+    from models.shard_item_key import ShardItemKey
+    from services.database_service import DatabaseService
+    from services.item_archive import find_archived
+    from services.item_rollups import ROLLUP_DIMENSIONS
+    from services.shard_router import ShardRouter, ShardedRefAllocator, normalize_zone
+
+# Listing cursors: shard * CURSOR_SPAN + the last id returned from that shard
+CURSOR_SPAN = 2 ** 40
+
+
+class DuplicateItemError(ValueError):
+    """The item_id already exists, or is being created, on another shard"""
+
+
+class ShardedDatabaseService:
+    """The item store split over several databases, one DatabaseService per shard.
+
+    A ShardRouter places new items by zone or by item_id hash, and their refs
+    are minted on that shard, so lookups and writes by ref go to the shard named
+    by the ref's leading symbol; refs without a hint (legacy refs, refs supplied
+    with a manifest) and misses fall back to asking every shard. Searches and listings
+    are scattered over the shards a filter allows, in parallel, and merged.
+    A new item_id is claimed in shard 0's shard_item_keys before it is written, so
+    concurrent creations on two shards cannot both succeed; items from before
+    sharding have no claim and are found by asking the shards. Change feeds and
+    exports stay per shard (see shard()).
+    """
+    def __init__(self, shard_urls, key: str = 'zone', zone_map=None, lookup_cache=None,
+                 sqlite_profile: str = None, ref_block_size: int = 1000):
+        if not shard_urls:
+            raise ValueError('At least one shard URL is required')
+        self.router = ShardRouter(len(shard_urls), key, zone_map)
+        # The cache is keyed by qr_ref, unique over all shards; each shard invalidates its writes
+        self.lookup_cache = lookup_cache
+        self.shards = [DatabaseService(url, lookup_cache=lookup_cache, sqlite_profile=sqlite_profile)
+                       for url in shard_urls]
+        self.ref_allocator = ShardedRefAllocator([s.engine for s in self.shards], self.router, ref_block_size)
+        # Shard 0 keeps the pre-sharding database (items without a zone, seed data)
+        self.engine = self.shards[0].engine
+        self.replicas = None
+        self._workers = ThreadPoolExecutor(max_workers=len(self.shards), thread_name_prefix='item-shard')
+
+    def shard(self, number) -> DatabaseService:
+        """One shard's DatabaseService (per-shard change feed, exports); ValueError for a bad number"""
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            number = -1
+        if not 0 <= number < len(self.shards):
+            raise ValueError(f'shard must be 0..{len(self.shards) - 1}')
+        return self.shards[number]
+
+    @property
+    def session(self):
+        return self.shards[0].session
+
+    def remove_session(self):
+        for shard in self.shards:
+            shard.remove_session()
+
+    def parse_date(self, s: str):
+        return self.shards[0].parse_date(s)
+
+    @property
+    def search_backend(self) -> str:
+        """The shards' item search backend, or each shard's when they differ"""
+        backends = [shard.search_backend for shard in self.shards]
+        if len(set(backends)) == 1:
+            return backends[0]
+        return 'mixed: ' + ', '.join(f'{n}={backend}' for n, backend in enumerate(backends))
+
+    def stats(self) -> dict:
+        return {'shards': len(self.shards), 'key': self.router.key, 'zones': self.router.zone_map}
+
+    def _scatter(self, call, numbers=None):
+        """call(shard) on each shard number in parallel; results in shard order. Workers release
+        their sessions afterwards, so ORM objects come back detached with their loaded columns"""
+        numbers = list(range(len(self.shards))) if numbers is None else list(numbers)
+
+        def run(number):
+            shard = self.shards[number]
+            try:
+                return call(shard)
+            finally:
+                shard.remove_session()
+        return list(self._workers.map(run, numbers))
+
+    def _first(self, call, hint=None):
+        """(shard number, result) of the first shard where call(shard) is not None: the hinted
+        shard on its own, then the others in parallel; (None, None) if none has it"""
+        if hint is not None:
+            found = call(self.shards[hint])
+            if found is not None:
+                return hint, found
+        others = [n for n in range(len(self.shards)) if n != hint]
+        for number, found in zip(others, self._scatter(call, others)):
+            if found is not None:
+                return number, found
+        return None, None
+
+    def _shard_of_ref(self, qr_ref, archived: bool = False):
+        def holds(shard):
+            if archived:
+                return find_archived(shard.read_session, qr_ref)
+            return shard.read_session.execute(select(RailwayItem.id).where(RailwayItem.qr_ref == qr_ref)).scalar()
+        return self._first(holds, self.router.shard_for_ref(qr_ref))[0]
+
+    def _shard_of_item(self, item_id):
+        def holds(shard):
+            return shard.read_session.execute(select(RailwayItem.id).where(RailwayItem.item_id == item_id)).scalar()
+        return self._first(holds, self.router.shard_for_item_id(item_id))[0]
+
+    def _item_shards(self, item_ids, chunk: int = 5000, column=RailwayItem.item_id):
+        """Shard holding each of item_ids (or other unique values of column) that exists anywhere"""
+        def present(shard):
+            found = set()
+            with shard.read_engine.connect() as conn:
+                for start in range(0, len(item_ids), chunk):
+                    found.update(conn.execute(
+                        select(column).where(column.in_(item_ids[start:start + chunk]))
+                    ).scalars())
+            return found
+        located = {}
+        for number, found in enumerate(self._scatter(present)):
+            for item_id in found:
+                located.setdefault(item_id, number)
+        return located
+
+    def _claim_item_ids(self, wanted, chunk: int = 5000):
+        """Claim {item_id: shard} in shard 0's shard_item_keys; an item_id already claimed keeps
+        its shard. Returns ({item_id: owning shard}, item_ids claimed by this call)"""
+        table = ShardItemKey.__table__
+        item_ids = list(wanted)
+        owners, claimed = {}, []
+        with self.engine.begin() as conn:
+            for start in range(0, len(item_ids), chunk):
+                part = item_ids[start:start + chunk]
+                stmt = (self.shards[0]._insert(table).values([{'item_id': i, 'shard': wanted[i]} for i in part])
+                        .on_conflict_do_nothing().returning(table.c.item_id))
+                claimed += conn.execute(stmt).scalars().all()
+                owners.update(conn.execute(select(table.c.item_id, table.c.shard).where(table.c.item_id.in_(part))).all())
+        return owners, claimed
+
+    def _release_item_ids(self, item_ids, chunk: int = 5000):
+        """Drop claims for item_ids that were not written after all"""
+        item_ids = list(item_ids)
+        if not item_ids:
+            return
+        table = ShardItemKey.__table__
+        with self.engine.begin() as conn:
+            for start in range(0, len(item_ids), chunk):
+                conn.execute(delete(table).where(table.c.item_id.in_(item_ids[start:start + chunk])))
+
+    # --- single items: one shard ---
+
+    def save_item(self, item_data, qr_ref):
+        """Insert on the router's shard; DuplicateItemError if another shard holds or claimed the item_id"""
+        number = self.router.shard_for(item_data)
+        item_id = item_data['item_id']
+        held = self._shard_of_item(item_id)
+        if held is None:
+            owners, claimed = self._claim_item_ids({item_id: number})
+            held = owners[item_id]
+        else:
+            claimed = []
+        if held != number:
+            raise DuplicateItemError(f'item_id {item_id} already exists (shard {held})')
+        try:
+            return self.shards[number].save_item(item_data, qr_ref)
+        except Exception:
+            self._release_item_ids(claimed)
+            raise
+
+    def get_item_data_by_qr_ref(self, qr_ref):
+        if self.lookup_cache is None:
+            return self._load_item_data(qr_ref)
+        return self.lookup_cache.get(qr_ref, self._load_item_data)
+
+    def _load_item_data(self, qr_ref):
+        return self._first(lambda shard: shard._load_item_data(qr_ref), self.router.shard_for_ref(qr_ref))[1]
+
+    def update_item_status(self, qr_ref, status):
+        code_for('status', status)
+        number = self._shard_of_ref(qr_ref)
+        return None if number is None else self.shards[number].update_item_status(qr_ref, status)
+
+    def update_item_insights(self, qr_ref, ai_insights, quality_score=None):
+        number = self._shard_of_ref(qr_ref)
+        return None if number is None else self.shards[number].update_item_insights(qr_ref, ai_insights, quality_score)
+
+    def update_item_insights_batch(self, updates, chunk_size: int = 1000):
+        """DatabaseService.update_item_insights_batch over the shards: each chunk's refs are
+        located, then every shard writes its share in parallel, one transaction per shard"""
+        started = time.perf_counter()
+        report = {'total': 0, 'updated': 0, 'missing': [], 'conflicts': [], 'chunks': 0, 'errors': []}
+        chunk = []
+        for update_row in updates:
+            chunk.append(update_row)
+            if len(chunk) >= chunk_size:
+                self._write_insights_chunk(chunk, report)
+                chunk = []
+        if chunk:
+            self._write_insights_chunk(chunk, report)
+        elapsed = time.perf_counter() - started
+        report['elapsed_seconds'] = round(elapsed, 3)
+        report['rows_per_second'] = round(report['updated'] / elapsed) if elapsed else None
+        return report
+
+    def _write_insights_chunk(self, chunk, report):
+        chunk_number = report['chunks']
+        report['total'] += len(chunk)
+        report['chunks'] += 1
+        refs = list(dict.fromkeys(update_row[0] for update_row in chunk))
+        located = self._item_shards(refs, column=RailwayItem.qr_ref)
+        routed = {}
+        for update_row in chunk:
+            if update_row[0] in located:
+                routed.setdefault(located[update_row[0]], []).append(update_row)
+        report['missing'] += [ref for ref in refs if ref not in located]
+
+        def write(number):
+            # Engine connections only: no scoped sessions to release afterwards
+            rows = routed[number]
+            return self.shards[number].update_item_insights_batch(rows, len(rows))
+
+        numbers = sorted(routed)
+        for number, shard_report in zip(numbers, self._workers.map(write, numbers)):
+            report['updated'] += shard_report['updated']
+            report['missing'] += shard_report['missing']
+            report['conflicts'] += shard_report['conflicts']
+            report['errors'] += [dict(error, chunk=chunk_number, shard=number) for error in shard_report['errors']]
+
+    def restore_item(self, qr_ref):
+        number = self._shard_of_ref(qr_ref, archived=True)
+        return None if number is None else self.shards[number].restore_item(qr_ref)
+
+    def record_inspection(self, item_id, inspected_at=None, inspector=None, result=None, notes=None):
+        number = self._shard_of_item(item_id)
+        if number is None:
+            return None
+        return self.shards[number].record_inspection(item_id, inspected_at, inspector, result, notes)
+
+    def list_inspections(self, item_id, limit: int = 100):
+        number = self._shard_of_item(item_id)
+        return [] if number is None else self.shards[number].list_inspections(item_id, limit)
+
+    # --- every shard ---
+
+    def rebuild_rollups(self):
+        self._scatter(lambda shard: shard.rebuild_rollups())
+
+    def backfill_inspections(self, batch_size: int = 1000):
+        results = self._scatter(lambda shard: shard.backfill_inspections(batch_size))
+        return sum(r[0] for r in results), sum(r[1] for r in results)
+
+    def archive_inactive_items(self, *args, **kwargs):
+        results = self._scatter(lambda shard: shard.archive_inactive_items(*args, **kwargs))
+        return [{'shard': n, **r} for n, r in enumerate(results)]
+
+    def get_rollups(self, dimensions=ROLLUP_DIMENSIONS, top: int = 50):
+        """Counts summed over the shards; exact while no dimension has more than `top` keys on a shard"""
+        merged = {}
+        for counts in self._scatter(lambda shard: shard.get_rollups(dimensions, top)):
+            for dimension, keys in counts.items():
+                merged.setdefault(dimension, Counter()).update(keys)
+        return {dimension: dict(keys.most_common(top)) for dimension, keys in merged.items()}
+
+    def quick_search(self, query: str, limit: int = 20):
+        """Each shard's best `limit` matches, merged by score; results carry their shard"""
+        found = []
+        for number, items in enumerate(self._scatter(lambda shard: shard.quick_search(query, limit))):
+            found.extend(dict(item, shard=number) for item in items)
+        return sorted(found, key=lambda item: (-item['score'], item['item_id']))[:limit]
+
+    def search_items(self, filters: dict):
+        shards = self.router.shards_for_filters(filters)
+        return [item for items in self._scatter(lambda shard: shard.search_items(filters), shards) for item in items]
+
+    def find_active_parts(self, item_type: str, limit: int):
+        parts = self._scatter(lambda shard: shard.find_active_parts(item_type, limit))
+        return [part for found in parts for part in found][:limit]
+
+    def find_overdue_items(self, days: int = 180, item_type=None, include_never: bool = True, limit: int = 100):
+        """Merged as one shard orders them: never inspected first, then oldest inspection first"""
+        found = self._scatter(lambda shard: shard.find_overdue_items(days, item_type, include_never, limit))
+        items = [item for items in found for item in items]
+        items.sort(key=lambda i: (i.last_inspected_at is not None, i.last_inspected_at or datetime.min))
+        return items[:limit]
+
+    def find_expiring_warranties(self, days: int = 90, item_type=None, expired: bool = False, limit: int = 100):
+        found = self._scatter(lambda shard: shard.find_expiring_warranties(days, item_type, expired, limit))
+        items = [item for items in found for item in items]
+        items.sort(key=lambda i: i.warranty_expiry_date, reverse=expired)
+        return items[:limit]
+
+    def iter_item_records(self, filters: dict = None, fields=None, batch_size: int = 1000):
+        """Shard after shard, each in id order"""
+        for number in self.router.shards_for_filters(filters):
+            yield from self.shards[number].iter_item_records(filters, fields, batch_size)
+
+    def iter_item_refs(self, filters: dict, batch_size: int = 500):
+        for number in self.router.shards_for_filters(filters):
+            yield from self.shards[number].iter_item_refs(filters, batch_size)
+
+    def list_items_page(self, filters: dict = None, fields=None, after_id: int = None, limit: int = 100):
+        """Keyset page over (shard, id); the cursor is shard * CURSOR_SPAN + id"""
+        shards = self.router.shards_for_filters(filters)
+        start, after = divmod(after_id, CURSOR_SPAN) if after_id is not None else (shards[0], None)
+        records, next_cursor = [], None
+        for number in (n for n in shards if n >= start):
+            page, cursor = self.shards[number].list_items_page(
+                filters, fields, after if number == start else None, limit - len(records)
+            )
+            records.extend(page)
+            if cursor is not None:
+                next_cursor = number * CURSOR_SPAN + cursor
+                break
+            if len(records) >= limit:
+                # This shard is done; continue with the next one that has a match
+                later = [n for n in shards if n > number]
+                has_rows = self._scatter(lambda shard: bool(shard.list_items_page(filters, ['id'], None, 1)[0]), later)
+                following = next((n for n, rows in zip(later, has_rows) if rows), None)
+                if following is not None:
+                    next_cursor = following * CURSOR_SPAN
+                break
+        return records, next_cursor
+
+    # --- bulk ---
+
+    def bulk_save_items(self, items, ref_factory=None, batch_size: int = 5000, on_conflict: str = 'update'):
+        """DatabaseService.bulk_save_items over the shards: new item_ids go to the router's shard,
+        existing ones are upserted where they are. Rows without a qr_ref get one minted on their
+        shard when ref_factory is given (its refs would carry no shard). A zone that belongs to
+        another shard than the one holding the item is rejected: items are not moved."""
+        if on_conflict not in ('update', 'ignore'):
+            raise ValueError(f"Unknown on_conflict mode: {on_conflict}")
+        started = time.perf_counter()
+        report = {'total': 0, 'written': 0, 'rejected': 0, 'batches': []}
+        batch = []
+        for item in items:
+            batch.append(item)
+            if len(batch) >= batch_size:
+                self._bulk_write_batch(batch, report, ref_factory is not None, on_conflict)
+                batch = []
+        if batch:
+            self._bulk_write_batch(batch, report, ref_factory is not None, on_conflict)
+        elapsed = time.perf_counter() - started
+        report['elapsed_seconds'] = round(elapsed, 3)
+        report['rows_per_second'] = round(report['written'] / elapsed) if elapsed else None
+        return report
+
+    def _bulk_write_batch(self, batch, report, mint_refs, on_conflict):
+        offset = report['total']
+        errors = []
+        item_ids = [item['item_id'] for item in batch
+                    if isinstance(item, dict) and isinstance(item.get('item_id'), str)]
+        located = self._item_shards(item_ids)
+        placed = {}
+        for i, item in enumerate(batch):
+            if isinstance(item, dict):
+                try:
+                    placed[i] = (self.router.shard_for(item), normalize_zone(item.get('zone')))
+                except ValueError as e:
+                    errors.append({'row': offset + i, 'item_id': item.get('item_id'), 'error': str(e)})
+        # New item_ids are claimed for their shard first; one claimed meanwhile by another shard is held there
+        wanted = {batch[i]['item_id']: number for i, (number, _) in placed.items()
+                  if isinstance(batch[i].get('item_id'), str) and 0 < len(batch[i]['item_id']) <= 50
+                  and batch[i]['item_id'] not in located}
+        owners, claimed = self._claim_item_ids(wanted) if wanted else ({}, [])
+        located.update(owners)
+        routed = {}
+        for i, item in enumerate(batch):
+            number = 0
+            if isinstance(item, dict):
+                if i not in placed:
+                    continue
+                item_id = item.get('item_id')
+                number, zone = placed[i]
+                held = located.get(item_id) if isinstance(item_id, str) else None
+                if held is not None and held != number:
+                    if self.router.key == 'zone' and zone is not None:
+                        errors.append({'row': offset + i, 'item_id': item_id,
+                                       'error': f'item is stored on shard {held}, zone {zone} on shard {number}; '
+                                                f'items do not move between shards'})
+                        continue
+                    number = held
+            # Malformed rows go along and are rejected by the shard's validation
+            routed.setdefault(number, []).append(i)
+
+        def write(number):
+            # Engine connections only: no scoped sessions to release afterwards
+            rows = routed[number]
+            factory = self.ref_allocator.allocators[number].next_refs if mint_refs else None
+            return self.shards[number].bulk_save_items([batch[i] for i in rows], factory, len(rows), on_conflict)
+
+        numbers = sorted(routed)
+        written_by_shard = {}
+        for number, shard_report in zip(numbers, self._workers.map(write, numbers)):
+            written_by_shard[number] = shard_report['written']
+            rows = routed[number]
+            for shard_batch in shard_report['batches']:
+                for error in shard_batch['errors']:
+                    errors.append(dict(error, row=None if error['row'] is None else offset + rows[error['row']]))
+        if claimed and errors:
+            # Release the claims of rows that were rejected or whose shard batch failed
+            stored = self._item_shards(claimed)
+            self._release_item_ids([item_id for item_id in claimed if stored.get(item_id) != owners[item_id]])
+        written = sum(written_by_shard.values())
+        report['batches'].append({
+            'batch': len(report['batches']), 'rows': len(batch), 'written': written,
+            'shards': written_by_shard, 'errors': sorted(errors, key=lambda e: (e['row'] is None, e['row'] or 0)),
+        })
+        report['total'] += len(batch)
+        report['written'] += written
+        report['rejected'] += sum(1 for e in errors if e['row'] is not None)
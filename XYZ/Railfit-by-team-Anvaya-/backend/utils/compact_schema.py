@@ -0,0 +1,179 @@
+"""Migration of railway_items from the legacy text layout to the compact one.
+
+Legacy databases keep item_type and status as VARCHAR names and supply_date
+as a timestamp (TEXT on SQLite). The compact layout (models/column_types.py)
+stores SMALLINT codes listed in item_codes, supply_date as a day, and a
+warranty_expiry_date derived from warranty_period. The app does not convert
+a legacy database when it starts: run scripts/migrate_compact_schema.py.
+"""
+from datetime import datetime, timedelta
+from sqlalchemy import MetaData, Integer, Date, create_engine, func, inspect, select, text
+from sqlalchemy.pool import NullPool
+from sqlalchemy.schema import CreateTable, CreateIndex
+
+try:
+    from backend.models.column_types import EPOCH, code_for, code_names, is_known
+    from backend.models.item_code import ItemCode, add_item_code, sync_item_codes
+    from backend.models.railway_item import RailwayItem, warranty_expiry, warranty_offset
+    from backend.utils.partitioning import is_partitioned, rebuild_items_table
+except Exception:
+    from models.column_types import EPOCH, code_for, code_names, is_known
+    from models.item_code import ItemCode, add_item_code, sync_item_codes
+    from models.railway_item import RailwayItem, warranty_expiry, warranty_offset
+    from utils.partitioning import is_partitioned, rebuild_items_table
+
+ITEMS_TABLE = 'railway_items'
+CODE_COLUMNS = ('item_type', 'status')
+
+
+def legacy_columns(bind) -> set:
+    """railway_items columns still in the legacy layout (empty if compact or not created yet);
+    bind is an engine, or a connection to look from inside its transaction"""
+    inspector = inspect(bind)
+    if not inspector.has_table(ITEMS_TABLE):
+        return set()
+    types = {c['name']: c['type'] for c in inspector.get_columns(ITEMS_TABLE)}
+    legacy = {name for name in CODE_COLUMNS if name in types and not isinstance(types[name], Integer)}
+    # Compact days: DATE on PostgreSQL, INTEGER on SQLite
+    if 'supply_date' in types and not isinstance(types['supply_date'], (Integer, Date)):
+        legacy.add('supply_date')
+    return legacy
+
+
+def require_compact(engine):
+    """Refuse to start on a legacy railway_items; scripts/migrate_compact_schema.py converts it"""
+    if engine.dialect.name == 'sqlite':
+        # A plain connection: the production profile would switch the file to WAL on connect
+        probe = create_engine(engine.url, poolclass=NullPool)
+        try:
+            legacy = legacy_columns(probe)
+        finally:
+            probe.dispose()
+    else:
+        legacy = legacy_columns(engine)
+    if legacy:
+        raise RuntimeError(
+            f'railway_items is in the legacy text layout ({", ".join(sorted(legacy))}); '
+            f'migrate it with scripts/migrate_compact_schema.py --db-url {engine.url.render_as_string()}'
+        )
+
+
+def migrate_to_compact(engine, keep_old: bool = False) -> int:
+    """Convert railway_items to the compact layout in one transaction; returns the rows converted.
+    Names missing from item_codes get new codes first. keep_old: keep a partitioned
+    table's pre-migration copy as railway_items_legacy."""
+    if not legacy_columns(engine):
+        return 0
+    ItemCode.__table__.create(bind=engine, checkfirst=True)
+    sync_item_codes(engine)
+    with engine.begin() as conn:
+        # Every worker runs this at startup: the first takes the table, the others wait here
+        # and then find it compact (converting it twice would map every code to NULL)
+        if engine.dialect.name == 'postgresql':
+            conn.exec_driver_sql(f'LOCK TABLE {ITEMS_TABLE} IN ACCESS EXCLUSIVE MODE')
+        else:
+            conn.exec_driver_sql('BEGIN IMMEDIATE')
+        legacy = legacy_columns(conn)
+        if not legacy:
+            return 0
+        for kind in CODE_COLUMNS:
+            if kind not in legacy:
+                continue
+            for name in conn.execute(text(f'SELECT DISTINCT {kind} FROM {ITEMS_TABLE} WHERE {kind} IS NOT NULL')).scalars():
+                if not is_known(kind, name):
+                    print(f"  new {kind} code {add_item_code(conn, kind, name)}: {name}")
+        if engine.dialect.name == 'postgresql':
+            return _migrate_postgres(conn, engine, legacy, keep_old)
+        return _migrate_sqlite(conn, legacy)
+
+
+def _quote(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+
+def _code_case(kind: str) -> str:
+    whens = ' '.join(f'WHEN {_quote(name)} THEN {code_for(kind, name)}' for name in code_names(kind))
+    return f'CASE {kind} {whens} END'
+
+
+def _warranty_case(conn, supply_day: str) -> str:
+    """SQL for supply_day + warranty_period over the distinct periods in the table (PostgreSQL)"""
+    whens = []
+    for period in conn.execute(text(f'SELECT DISTINCT warranty_period FROM {ITEMS_TABLE}')).scalars():
+        offset = warranty_offset(period)
+        if offset:
+            whens.append(f'WHEN {_quote(period)} THEN ({supply_day} + make_interval(months => {offset[0]}, '
+                         f'days => {offset[1]}))::date')
+    return f'CASE warranty_period {" ".join(whens)} END' if whens else 'NULL::date'
+
+
+def _migrate_postgres(conn, engine, legacy, keep_old):
+    """Convert in the caller's transaction, which holds the table lock"""
+    supply_day = 'supply_date::date'
+    moved = conn.execute(select(func.count()).select_from(RailwayItem.__table__)).scalar_one()
+    expressions = {kind: _code_case(kind) for kind in CODE_COLUMNS if kind in legacy}
+    if 'supply_date' in legacy:
+        expressions['supply_date'] = supply_day
+    expressions['warranty_expiry_date'] = _warranty_case(conn, supply_day)
+    if is_partitioned(engine):
+        # The partition key's type cannot be altered in place: rebuild with the new column types
+        old = f'{ITEMS_TABLE}_legacy'
+        moved = rebuild_items_table(conn, old, expressions, index_suffix='_legacy')
+        if not keep_old:
+            conn.exec_driver_sql(f'DROP TABLE {old}')
+        return moved
+    conn.exec_driver_sql(f'ALTER TABLE {ITEMS_TABLE} ADD COLUMN IF NOT EXISTS warranty_expiry_date DATE')
+    types = {'item_type': 'SMALLINT', 'status': 'SMALLINT', 'supply_date': 'DATE', 'warranty_expiry_date': 'DATE'}
+    clauses = [f'ALTER COLUMN {name} DROP DEFAULT' for name in CODE_COLUMNS if name in legacy]
+    clauses += [f'ALTER COLUMN {name} TYPE {types[name]} USING ({sql})' for name, sql in expressions.items()]
+    # One table rewrite; the indexes are rebuilt with it
+    conn.exec_driver_sql(f'ALTER TABLE {ITEMS_TABLE} ' + ', '.join(clauses))
+    return moved
+
+
+def _epoch_days(value):
+    return None if value is None else (value.date() - EPOCH).days
+
+
+def _legacy_day(value):
+    """A legacy supply_date (ISO text) or an already compact one (epoch days) as a datetime"""
+    if value is None:
+        return None
+    if isinstance(value, int):
+        return datetime.combine(EPOCH + timedelta(days=value), datetime.min.time())
+    return datetime.fromisoformat(value)
+
+
+def _migrate_sqlite(conn, legacy):
+    """SQLite cannot change a column's type: copy into a compact table, then swap it in, in the
+    caller's write transaction. Ids are kept, so the FTS5 index stays valid; the table's triggers
+    (the FTS5 ones among them) go with the DROP and are recreated from their stored SQL"""
+    table = RailwayItem.__table__
+    staging = f'{ITEMS_TABLE}_compact'
+    expressions = {kind: _code_case(kind) for kind in CODE_COLUMNS if kind in legacy}
+    if 'supply_date' in legacy:
+        expressions['supply_date'] = "CAST(julianday(substr(supply_date, 1, 10)) - 2440587.5 AS INTEGER)"
+    expressions['warranty_expiry_date'] = 'compact_warranty_expiry(supply_date, warranty_period)'
+    conn.connection.driver_connection.create_function(
+        'compact_warranty_expiry', 2,
+        lambda supplied, period: _epoch_days(warranty_expiry(_legacy_day(supplied), period)),
+        deterministic=True,
+    )
+    present = {c['name'] for c in inspect(conn).get_columns(ITEMS_TABLE)}
+    names = [c.name for c in table.columns]
+    selected = ', '.join(expressions.get(n, n if n in present else 'NULL') for n in names)
+    triggers = conn.execute(
+        text("SELECT sql FROM sqlite_master WHERE type = 'trigger' AND tbl_name = :t"), {'t': ITEMS_TABLE}
+    ).scalars().all()
+    conn.exec_driver_sql(f'DROP TABLE IF EXISTS {staging}')
+    conn.execute(CreateTable(table.to_metadata(MetaData(), name=staging)))
+    moved = conn.exec_driver_sql(
+        f'INSERT INTO {staging} ({", ".join(names)}) SELECT {selected} FROM {ITEMS_TABLE}'
+    ).rowcount
+    conn.exec_driver_sql(f'DROP TABLE {ITEMS_TABLE}')
+    conn.exec_driver_sql(f'ALTER TABLE {staging} RENAME TO {ITEMS_TABLE}')
+    for index in table.indexes:
+        conn.execute(CreateIndex(index))
+    for statement in triggers:
+        conn.exec_driver_sql(statement)
+    return moved
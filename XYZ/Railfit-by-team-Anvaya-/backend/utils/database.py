@@ -1,24 +1,294 @@
+import hashlib
 import os
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+import tempfile
+import threading
+from contextlib import contextmanager
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import sessionmaker, scoped_session
+from sqlalchemy.pool import StaticPool
 from dotenv import load_dotenv
 
 load_dotenv()
 
 DATABASE_URL = os.getenv('DATABASE_URL', 'sqlite:///railway_qr.db')
-_engine = create_engine(DATABASE_URL, echo=False, future=True)
-_SessionLocal = sessionmaker(bind=_engine, autoflush=False, autocommit=False)
+# 'production' (WAL, single writer + read-only pool) or 'default' (stock SQLite settings)
+SQLITE_PROFILE = os.getenv('SQLITE_PROFILE', 'production')
+
+
+def sqlite_pragmas() -> dict:
+    """Connect-time pragmas of the production SQLite profile"""
+    return {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'mmap_size': int(os.getenv('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024))),
+        'cache_size': -int(os.getenv('SQLITE_CACHE_KB', str(64 * 1024))),
+        'busy_timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '5000')),
+        'temp_store': 'MEMORY',
+    }
+
+
+def is_sqlite_file(url: str) -> bool:
+    parsed = make_url(url)
+    return parsed.get_backend_name() == 'sqlite' and parsed.database not in (None, '', ':memory:')
+
+
+def apply_sqlite_profile(engine, read_only: bool = False):
+    """Run the profile pragmas on every new DBAPI connection of engine"""
+    pragmas = sqlite_pragmas()
+    if read_only:
+        # journal_mode is persistent and set by the writer; readers must not write
+        pragmas.pop('journal_mode')
+        pragmas['query_only'] = 'ON'
+
+    @event.listens_for(engine, 'connect')
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f'PRAGMA {name}={value}')
+        finally:
+            cursor.close()
+
+
+def engine_options(url: str, profile: str = None, read_only: bool = False) -> dict:
+    """Pool settings for one engine per process; tunable through DB_POOL_* env vars"""
+    options = {'echo': False, 'future': True, 'pool_pre_ping': True}
+    parsed = make_url(url)
+    if parsed.get_backend_name() == 'sqlite' and parsed.database in (None, '', ':memory:'):
+        # One shared in-memory database for every thread
+        options.update(poolclass=StaticPool, connect_args={'check_same_thread': False})
+        return options
+    if parsed.get_backend_name() == 'sqlite' and (profile or SQLITE_PROFILE) == 'production' and not read_only:
+        # SQLite allows one writer at a time: queue writers in-process on a dedicated
+        # connection rather than have them collide on the file lock. The overflow
+        # connection serves an engine.begin() (bulk writes, rollups) while a request
+        # session holds the writer; the two then wait on busy_timeout, not the pool
+        options.update(
+            pool_size=int(os.getenv('SQLITE_WRITER_CONNECTIONS', '1')),
+            max_overflow=max(1, int(os.getenv('SQLITE_WRITER_OVERFLOW', '1'))),
+            pool_timeout=float(os.getenv('DB_POOL_TIMEOUT', '30')),
+        )
+        return options
+    options.update(
+        pool_size=int(os.getenv('DB_POOL_SIZE', '10')),
+        max_overflow=int(os.getenv('DB_MAX_OVERFLOW', '20')),
+        pool_timeout=float(os.getenv('DB_POOL_TIMEOUT', '30')),
+        pool_recycle=int(os.getenv('DB_POOL_RECYCLE', '1800')),
+    )
+    return options
+
+
+def create_db_engine(url: str = None, profile: str = None, read_only: bool = False):
+    url = url or DATABASE_URL
+    profile = profile or SQLITE_PROFILE
+    engine = create_engine(url, **engine_options(url, profile, read_only))
+    if profile == 'production' and is_sqlite_file(url):
+        apply_sqlite_profile(engine, read_only)
+    return engine
+
+
+def create_read_engine(url: str = None, profile: str = None, primary=None):
+    """Engine for lookups: a read-only pool for production SQLite, otherwise the primary"""
+    url = url or DATABASE_URL
+    if (profile or SQLITE_PROFILE) == 'production' and is_sqlite_file(url):
+        return create_db_engine(url, profile, read_only=True)
+    return primary if primary is not None else create_db_engine(url, profile)
+
+
+def create_session_factory(engine):
+    return sessionmaker(bind=engine, autoflush=False, autocommit=False)
+
+
+def create_read_session_factory(engine):
+    """Sessions for lookups: each query runs in its own transaction (driver autocommit), so a
+    request does not hold a read transaction, and its snapshot, from the first query to teardown"""
+    return sessionmaker(bind=engine.execution_options(isolation_level='AUTOCOMMIT'),
+                        autoflush=False, autocommit=False, expire_on_commit=False)
+
+
+_engine = create_db_engine(DATABASE_URL)
+_SessionLocal = create_session_factory(_engine)
+# Thread-local session for request handlers; removed on app-context teardown
+_ScopedSession = scoped_session(_SessionLocal)
+_read_engine = create_read_engine(DATABASE_URL, primary=_engine)
+_ReadScopedSession = scoped_session(create_read_session_factory(_read_engine))
+_init_lock = threading.Lock()
+_initialized = False
 
 # Lazy import models to avoid circular deps
 
 def init_db():
+    global _initialized
+    with _init_lock:
+        if _initialized:
+            return
+        try:
+            from backend.models.railway_item import Base as Base2
+            import backend.models.inspection  # noqa: F401
+            import backend.models.item_rollup  # noqa: F401
+            import backend.models.archived_item  # noqa: F401
+            import backend.models.item_change  # noqa: F401
+            import backend.models.item_code  # noqa: F401
+            import backend.models.shard_item_key  # noqa: F401
+        except Exception:
+            from models.railway_item import Base as Base2
+            import models.inspection  # noqa: F401
+            import models.item_rollup  # noqa: F401
+            import models.archived_item  # noqa: F401
+            import models.item_change  # noqa: F401
+            import models.item_code  # noqa: F401
+            import models.shard_item_key  # noqa: F401
+        create_schema(_engine, Base2.metadata)
+        _initialized = True
+
+
+def create_schema(engine, metadata):
+    """Create missing tables, columns and indexes (railway_items partitioned if configured) and
+    load the item codes. A legacy railway_items is not converted here: see require_compact"""
     try:
-        from backend.models.railway_item import Base as Base2
+        from backend.utils.partitioning import partitioning_enabled, prepare_partitioned_schema
+        from backend.utils.compact_schema import require_compact
+        from backend.models.item_code import sync_item_codes
     except Exception:
-        from models.railway_item import Base as Base2
-    # Create all tables
-    Base2.metadata.create_all(bind=_engine)
+        from utils.partitioning import partitioning_enabled, prepare_partitioned_schema
+        from utils.compact_schema import require_compact
+        from models.item_code import sync_item_codes
+    # Before anything writes to the database
+    require_compact(engine)
+    # Every worker process runs this at startup; one at a time
+    with schema_lock(engine):
+        if partitioning_enabled(engine):
+            prepare_partitioned_schema(engine)
+        metadata.create_all(bind=engine)
+        ensure_columns(engine, metadata)
+        sync_item_codes(engine)
+        ensure_indexes(engine, metadata)
+
+
+# pg_advisory_lock key of create_schema (any constant the app does not use elsewhere)
+SCHEMA_LOCK_KEY = 7215000349
+
+
+@contextmanager
+def schema_lock(engine):
+    """Hold a lock across processes: a session advisory lock on PostgreSQL, an flock on a
+    lock file in the temp directory for a SQLite file; in-memory databases need none"""
+    if engine.dialect.name == 'postgresql':
+        with engine.connect() as conn:
+            conn.execute(text('SELECT pg_advisory_lock(:key)'), {'key': SCHEMA_LOCK_KEY})
+            conn.commit()
+            try:
+                yield
+            finally:
+                conn.execute(text('SELECT pg_advisory_unlock(:key)'), {'key': SCHEMA_LOCK_KEY})
+                conn.commit()
+        return
+    path = engine.url.database if is_sqlite_file(str(engine.url)) else None
+    try:
+        import fcntl
+    except ImportError:
+        # Windows: no flock; the compact migration still re-checks under its write lock
+        fcntl = None
+    if path is None or fcntl is None:
+        yield
+        return
+    with open(lock_file_path(path, 'schema'), 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+@contextmanager
+def try_process_lock(engine, name: str, key: int):
+    """Non-blocking lock across processes; yields whether this process holds it. A session
+    advisory lock on PostgreSQL, an flock on a lock file in the temp directory for a SQLite file"""
+    if engine.dialect.name == 'postgresql':
+        with engine.connect() as conn:
+            acquired = bool(conn.execute(text('SELECT pg_try_advisory_lock(:key)'), {'key': key}).scalar())
+            conn.commit()
+            try:
+                yield acquired
+            finally:
+                if acquired:
+                    conn.execute(text('SELECT pg_advisory_unlock(:key)'), {'key': key})
+                    conn.commit()
+        return
+    path = engine.url.database if is_sqlite_file(str(engine.url)) else None
+    try:
+        import fcntl
+    except ImportError:
+        fcntl = None
+    if path is None or fcntl is None:
+        # In-memory databases are private to the process; Windows has no flock
+        yield True
+        return
+    with open(lock_file_path(path, name), 'a') as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def lock_file_path(database: str, name: str) -> str:
+    """Lock file for a SQLite database, kept in the temp directory rather than beside it
+    (the database may live in the source tree); one per database path and lock name"""
+    digest = hashlib.sha1(os.path.abspath(database).encode('utf-8')).hexdigest()[:16]
+    return os.path.join(tempfile.gettempdir(), f'railway-{name}-{digest}.lock')
+
+
+def ensure_columns(engine, metadata):
+    """create_all does not alter existing tables; add missing nullable columns"""
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    statements = []
+    for table in metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        present = {c['name'] for c in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in present or not column.nullable:
+                continue
+            col_type = column.type.compile(dialect=engine.dialect)
+            statements.append(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {col_type}')
+    if statements:
+        with engine.begin() as conn:
+            for statement in statements:
+                conn.exec_driver_sql(statement)
+
+
+def ensure_indexes(engine, metadata):
+    """create_all skips indexes on tables that already exist; add any that are missing"""
+    for table in metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
+
+def get_engine():
+    return _engine
+
+
+def get_read_engine():
+    return _read_engine
 
 
 def get_db_session():
+    """A new, independent session; the caller must close it"""
     return _SessionLocal()
+
+
+def get_scoped_session():
+    """The request/thread-scoped session registry shared by DatabaseService"""
+    return _ScopedSession
+
+
+def get_read_scoped_session():
+    """Thread-scoped sessions on the read engine (read-only pool under production SQLite)"""
+    return _ReadScopedSession
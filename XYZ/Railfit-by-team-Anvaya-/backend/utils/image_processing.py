@@ -2,6 +2,13 @@ from PIL import Image
 import io
 
 class ImageProcessing:
+    # Output formats the QR endpoints can negotiate, keyed by short name
+    MIMETYPES = {
+        'png': 'image/png',
+        'webp': 'image/webp',
+        'svg': 'image/svg+xml',
+    }
+
     @staticmethod
     def load_image_from_bytes(image_bytes: bytes) -> Image.Image:
         return Image.open(io.BytesIO(image_bytes))
@@ -11,3 +18,20 @@ class ImageProcessing:
         buf = io.BytesIO()
         image.save(buf, format='PNG')
         return buf.getvalue()
+
+    @staticmethod
+    def encode_image(image: Image.Image, fmt: str = 'png', png_compress_level: int = 6) -> bytes:
+        """Encode a raster image once into the requested format"""
+        buf = io.BytesIO()
+        if fmt == 'png':
+            image.save(buf, format='PNG', compress_level=png_compress_level)
+        elif fmt == 'webp':
+            # QR modules need exact edges, so always lossless
+            image.save(buf, format='WEBP', lossless=True, method=4)
+        else:
+            raise ValueError(f"Unsupported raster format: {fmt}")
+        return buf.getvalue()
+
+    @staticmethod
+    def mimetype_for(fmt: str) -> str:
+        return ImageProcessing.MIMETYPES.get(fmt, 'application/octet-stream')
@@ -0,0 +1,45 @@
+"""Fast JSON encoding for API responses and row streams.
+
+orjson (when installed) encodes dicts, lists and datetimes natively, with
+datetimes in the same ISO format as to_dict(). Without it, the stdlib json
+module with an isoformat fallback gives the same output more slowly.
+"""
+import json
+from datetime import date, datetime
+from typing import Iterable, Iterator
+
+try:
+    import orjson  # Optional: several times faster than json
+    _HAS_ORJSON = True
+except Exception:
+    orjson = None
+    _HAS_ORJSON = False
+
+JSON_MIMETYPE = 'application/json'
+
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+def dumps(obj) -> bytes:
+    if _HAS_ORJSON:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, default=_default, separators=(',', ':')).encode('utf-8')
+
+
+def iter_json_array(records: Iterable, chunk_size: int = 500) -> Iterator[bytes]:
+    """Encode records as one JSON array, yielding a chunk per `chunk_size` records"""
+    yield b'['
+    batch, separator = [], b''
+    for record in records:
+        batch.append(record)
+        if len(batch) >= chunk_size:
+            # One encoder call per chunk; strip the list's own brackets
+            yield separator + dumps(batch)[1:-1]
+            batch, separator = [], b','
+    if batch:
+        yield separator + dumps(batch)[1:-1]
+    yield b']'
@@ -0,0 +1,217 @@
+"""Optional PostgreSQL range partitioning of railway_items by supply_date year.
+
+Enabled with DB_PARTITIONING=supply_year. PostgreSQL requires unique
+constraints on a partitioned table to include the partition key, so the
+partitioned table's primary key is (id, supply_date) and global uniqueness of
+item_id / qr_ref moves to railway_item_keys, maintained by row triggers.
+"""
+import os
+from datetime import datetime
+from sqlalchemy import MetaData, Table, Index, text
+from sqlalchemy.schema import CreateTable, CreateIndex
+
+PARTITIONING = os.getenv('DB_PARTITIONING', 'none')
+ITEMS_TABLE = 'railway_items'
+KEYS_TABLE = 'railway_item_keys'
+
+_KEYS_DDL = f"""
+CREATE TABLE IF NOT EXISTS {KEYS_TABLE} (
+  item_id VARCHAR(50) PRIMARY KEY,
+  qr_ref VARCHAR(12) NOT NULL UNIQUE
+)
+"""
+
+_TRIGGERS_DDL = [
+    f"""
+CREATE OR REPLACE FUNCTION railway_item_keys_sync() RETURNS trigger AS $$
+BEGIN
+  IF TG_OP = 'INSERT' THEN
+    INSERT INTO {KEYS_TABLE} (item_id, qr_ref) VALUES (NEW.item_id, NEW.qr_ref);
+    RETURN NEW;
+  END IF;
+  DELETE FROM {KEYS_TABLE} WHERE item_id = OLD.item_id;
+  RETURN OLD;
+END
+$$ LANGUAGE plpgsql
+""",
+    f"DROP TRIGGER IF EXISTS railway_item_keys_insert ON {ITEMS_TABLE}",
+    f"""CREATE TRIGGER railway_item_keys_insert AFTER INSERT ON {ITEMS_TABLE}
+  FOR EACH ROW EXECUTE FUNCTION railway_item_keys_sync()""",
+    f"DROP TRIGGER IF EXISTS railway_item_keys_delete ON {ITEMS_TABLE}",
+    f"""CREATE TRIGGER railway_item_keys_delete AFTER DELETE ON {ITEMS_TABLE}
+  FOR EACH ROW EXECUTE FUNCTION railway_item_keys_sync()""",
+]
+
+
+def partitioning_enabled(engine) -> bool:
+    return PARTITIONING == 'supply_year' and engine.dialect.name == 'postgresql'
+
+
+def is_partitioned(engine, table: str = ITEMS_TABLE) -> bool:
+    if engine.dialect.name != 'postgresql':
+        return False
+    with engine.connect() as conn:
+        return bool(conn.execute(
+            text("SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+                 "WHERE c.relname = :name AND pg_table_is_visible(c.oid)"),
+            {'name': table},
+        ).first())
+
+
+def partitioned_items_table() -> Table:
+    """railway_items as a RANGE (supply_date) parent: composite PK, no global unique indexes"""
+    try:
+        from backend.models.railway_item import RailwayItem
+    except Exception:
+        from models.railway_item import RailwayItem
+    source = RailwayItem.__table__
+    columns = []
+    for column in source.columns:
+        copy = column._copy()
+        copy.unique = None
+        copy.index = None
+        copy.primary_key = column.name in ('id', 'supply_date')
+        if column.name == 'id':
+            copy.autoincrement = True
+        columns.append(copy)
+    table = Table(ITEMS_TABLE, MetaData(), *columns, postgresql_partition_by='RANGE (supply_date)')
+    # Same names as the unpartitioned single-column indexes, so ensure_indexes skips them
+    Index('ix_railway_items_item_id', table.c.item_id)
+    Index('ix_railway_items_qr_ref', table.c.qr_ref)
+    Index('uq_railway_items_item_supply', table.c.item_id, table.c.supply_date, unique=True)
+    return table
+
+
+def partition_name(year: int) -> str:
+    return f'{ITEMS_TABLE}_y{year}'
+
+
+def default_year_range():
+    now = datetime.utcnow().year
+    first = int(os.getenv('PARTITION_FIRST_YEAR', str(now - 10)))
+    ahead = int(os.getenv('PARTITION_YEARS_AHEAD', '2'))
+    return first, now + ahead
+
+
+def create_partitioned_items_table(conn):
+    """Create the parent, the keys table and triggers, and a DEFAULT partition"""
+    table = partitioned_items_table()
+    conn.execute(CreateTable(table))
+    for index in table.indexes:
+        conn.execute(CreateIndex(index))
+    conn.exec_driver_sql(_KEYS_DDL)
+    for statement in _TRIGGERS_DDL:
+        conn.exec_driver_sql(statement)
+    conn.exec_driver_sql(f'CREATE TABLE IF NOT EXISTS {ITEMS_TABLE}_default PARTITION OF {ITEMS_TABLE} DEFAULT')
+
+
+def ensure_year_partitions(engine, first_year: int, last_year: int):
+    """Create yearly partitions [first_year, last_year] that do not exist yet; returns created names"""
+    with engine.begin() as conn:
+        return _ensure_year_partitions(conn, first_year, last_year)
+
+
+def _partitions_of(conn, parent: str):
+    return [r[0] for r in conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "JOIN pg_class p ON p.oid = i.inhparent WHERE p.relname = :parent"
+    ), {'parent': parent})]
+
+
+def _ensure_year_partitions(conn, first_year: int, last_year: int):
+    existing = set(_partitions_of(conn, ITEMS_TABLE))
+    default = f'{ITEMS_TABLE}_default'
+    created = []
+    for year in range(first_year, last_year + 1):
+        name = partition_name(year)
+        if name in existing:
+            continue
+        start, end = f'{year}-01-01', f'{year + 1}-01-01'
+        stranded = conn.execute(text(
+            f'SELECT 1 FROM {default} WHERE supply_date >= :start AND supply_date < :end LIMIT 1'
+        ), {'start': start, 'end': end}).first()
+        if stranded:
+            # The new range may not overlap rows already in DEFAULT: move them across first
+            conn.exec_driver_sql(f'ALTER TABLE {ITEMS_TABLE} DETACH PARTITION {default}')
+        conn.exec_driver_sql(f"CREATE TABLE {name} PARTITION OF {ITEMS_TABLE} FOR VALUES FROM ('{start}') TO ('{end}')")
+        if stranded:
+            # Rows only change partition: their railway_item_keys entries stay as they are
+            conn.exec_driver_sql(f'ALTER TABLE {name} DISABLE TRIGGER railway_item_keys_insert')
+            conn.exec_driver_sql(
+                f"WITH moved AS (DELETE FROM {default} WHERE supply_date >= '{start}' "
+                f"AND supply_date < '{end}' RETURNING *) INSERT INTO {name} SELECT * FROM moved"
+            )
+            conn.exec_driver_sql(f'ALTER TABLE {name} ENABLE TRIGGER railway_item_keys_insert')
+            conn.exec_driver_sql(f'ALTER TABLE {ITEMS_TABLE} ATTACH PARTITION {default} DEFAULT')
+        created.append(name)
+    return created
+
+
+def list_partitions(engine):
+    """[(partition, bounds, approx rows)] for railway_items"""
+    with engine.connect() as conn:
+        return conn.execute(text(
+            "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid), c.reltuples::bigint "
+            "FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "JOIN pg_class p ON p.oid = i.inhparent WHERE p.relname = :parent ORDER BY c.relname"
+        ), {'parent': ITEMS_TABLE}).all()
+
+
+def prepare_partitioned_schema(engine):
+    """Create the partitioned parent if railway_items does not exist yet, then the yearly partitions"""
+    with engine.begin() as conn:
+        exists = conn.execute(text('SELECT to_regclass(:name)'), {'name': ITEMS_TABLE}).scalar()
+        if not exists:
+            create_partitioned_items_table(conn)
+    if is_partitioned(engine):
+        ensure_year_partitions(engine, *default_year_range())
+
+
+def migrate_to_partitioned(engine, keep_old: bool = False):
+    """Rebuild an existing unpartitioned railway_items as the partitioned layout, in one transaction.
+    Returns the number of rows moved."""
+    if is_partitioned(engine):
+        return 0
+    old = f'{ITEMS_TABLE}_unpartitioned'
+    with engine.begin() as conn:
+        moved = rebuild_items_table(conn, old, index_suffix='_unpart')
+        if not keep_old:
+            conn.exec_driver_sql(f'DROP TABLE {old}')
+    return moved
+
+
+def rebuild_items_table(conn, old: str, expressions: dict = None, index_suffix: str = '_old'):
+    """Rename railway_items (plain or partitioned) to `old`, create the partitioned layout and copy
+    the rows across in conn's transaction; the caller drops `old`. expressions: SQL over the old
+    row per column (default: the column itself). Returns the number of rows copied."""
+    expressions = expressions or {}
+    years = conn.execute(text(
+        f'SELECT EXTRACT(YEAR FROM min(supply_date))::int, EXTRACT(YEAR FROM max(supply_date))::int FROM {ITEMS_TABLE}'
+    )).first()
+    conn.exec_driver_sql('ALTER TABLE IF EXISTS inspections DROP CONSTRAINT IF EXISTS inspections_item_id_fkey')
+    sequence = conn.execute(text("SELECT pg_get_serial_sequence(:t, 'id')"), {'t': ITEMS_TABLE}).scalar()
+    suffix = old[len(ITEMS_TABLE):]
+    for table in [ITEMS_TABLE] + _partitions_of(conn, ITEMS_TABLE):
+        indexes = conn.execute(text('SELECT indexname FROM pg_indexes WHERE tablename = :t'), {'t': table}).all()
+        conn.exec_driver_sql(f'ALTER TABLE {table} RENAME TO {table}{suffix}')
+        for (index,) in indexes:
+            conn.exec_driver_sql(f'ALTER INDEX {index} RENAME TO {index[:50]}{index_suffix}')
+    if sequence:
+        conn.exec_driver_sql(f'ALTER SEQUENCE {sequence} RENAME TO {old}_id_seq')
+    create_partitioned_items_table(conn)
+    # A partitioned source's key rows come back with the copy
+    conn.exec_driver_sql(f'DELETE FROM {KEYS_TABLE}')
+    first, last = default_year_range()
+    if years and years[0] is not None:
+        first, last = min(first, years[0]), max(last, years[1])
+    _ensure_year_partitions(conn, first, last)
+    names = [c.name for c in partitioned_items_table().columns]
+    selected = ', '.join(expressions.get(name, name) for name in names)
+    moved = conn.exec_driver_sql(
+        f'INSERT INTO {ITEMS_TABLE} ({", ".join(names)}) SELECT {selected} FROM {old}'
+    ).rowcount
+    conn.exec_driver_sql(
+        f"SELECT setval(pg_get_serial_sequence('{ITEMS_TABLE}', 'id'), "
+        f"(SELECT COALESCE(max(id), 0) + 1 FROM {ITEMS_TABLE}), false)"
+    )
+    return moved
@@ -4,14 +4,124 @@ CREATE TABLE IF NOT EXISTS railway_items (
   item_id TEXT UNIQUE NOT NULL,
   qr_ref TEXT UNIQUE NOT NULL,
   vendor_lot TEXT NOT NULL,
-  supply_date TEXT NOT NULL,
+  supply_date INTEGER NOT NULL,          -- days since 1970-01-01 (DATE on PostgreSQL)
   warranty_period TEXT,
-  item_type TEXT NOT NULL,
+  warranty_expiry_date INTEGER,          -- supply_date + warranty_period, same encoding
+  item_type SMALLINT NOT NULL,           -- item_codes code, kind 'item_type'
   manufacturer TEXT,
+  zone TEXT,                             -- railway zone code (NR, CR, ...), the shard key by zone
   inspection_dates TEXT,
   ai_insights TEXT,
   quality_score REAL,
-  status TEXT DEFAULT 'active',
+  status SMALLINT,                       -- item_codes code, kind 'status' (1 = active)
+  last_inspected_at TEXT,
   created_at TEXT,
   updated_at TEXT
 );
+CREATE INDEX IF NOT EXISTS ix_railway_items_lot_type_supply ON railway_items (vendor_lot, item_type, supply_date);
+CREATE INDEX IF NOT EXISTS ix_railway_items_type_supply ON railway_items (item_type, supply_date);
+CREATE INDEX IF NOT EXISTS ix_railway_items_type_status ON railway_items (item_type, status, id);
+CREATE INDEX IF NOT EXISTS ix_railway_items_status_inspected ON railway_items (status, last_inspected_at);
+CREATE INDEX IF NOT EXISTS ix_railway_items_updated ON railway_items (updated_at, id);
+CREATE INDEX IF NOT EXISTS ix_railway_items_status_warranty ON railway_items (status, warranty_expiry_date);
+
+-- Codes of railway_items.item_type / status (see backend/models/column_types.py);
+-- legacy text-layout databases are converted by scripts/migrate_compact_schema.py
+CREATE TABLE IF NOT EXISTS item_codes (
+  kind TEXT NOT NULL,
+  code SMALLINT NOT NULL,
+  name TEXT NOT NULL,
+  PRIMARY KEY (kind, code),
+  UNIQUE (kind, name)
+);
+INSERT OR IGNORE INTO item_codes (kind, code, name) VALUES
+  ('item_type', 1, 'elastic_rail_clip'), ('item_type', 2, 'rail_pad'), ('item_type', 3, 'liner'), ('item_type', 4, 'sleeper'),
+  ('status', 1, 'active'), ('status', 2, 'replaced'), ('status', 3, 'scrapped'), ('status', 4, 'under_inspection');
+
+-- Append-only inspection history; railway_items.last_inspected_at mirrors the latest row
+CREATE TABLE IF NOT EXISTS inspections (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  item_id TEXT NOT NULL REFERENCES railway_items (item_id),
+  inspected_at TEXT NOT NULL,
+  inspector TEXT,
+  result TEXT,
+  notes TEXT,
+  created_at TEXT
+);
+CREATE UNIQUE INDEX IF NOT EXISTS ix_inspections_item_time ON inspections (item_id, inspected_at);
+
+-- Block-allocated qr_ref counters (see backend/services/qr_ref_allocator.py)
+CREATE TABLE IF NOT EXISTS id_sequences (
+  name TEXT PRIMARY KEY,
+  next_value BIGINT NOT NULL DEFAULT 1
+);
+
+-- Sharded stores: the shard each item_id was created on, kept on shard 0
+CREATE TABLE IF NOT EXISTS shard_item_keys (
+  item_id TEXT PRIMARY KEY,
+  shard SMALLINT NOT NULL
+);
+
+-- Pre-minted QR pool (see backend/services/qr_pool.py)
+CREATE TABLE IF NOT EXISTS qr_pool (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  qr_ref TEXT UNIQUE NOT NULL,
+  item_type TEXT NOT NULL,
+  status TEXT NOT NULL DEFAULT 'available',
+  image_path TEXT,
+  claimed_by TEXT,
+  claimed_at TEXT,
+  created_at TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_qr_pool_claim ON qr_pool (item_type, status, id);
+
+-- Running counts per (dimension, key) for /api/stats (see backend/services/item_rollups.py)
+CREATE TABLE IF NOT EXISTS item_rollups (
+  dimension TEXT NOT NULL,
+  key TEXT NOT NULL,
+  count BIGINT NOT NULL DEFAULT 0,
+  PRIMARY KEY (dimension, key)
+);
+CREATE INDEX IF NOT EXISTS ix_item_rollups_dimension_count ON item_rollups (dimension, count);
+
+-- Retired items moved out of railway_items (see backend/services/item_archive.py);
+-- payload is the full row as zlib-compressed JSON
+CREATE TABLE IF NOT EXISTS railway_items_archive (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  item_id TEXT NOT NULL,
+  qr_ref TEXT NOT NULL,
+  status TEXT,
+  archived_at TEXT,
+  payload BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_railway_items_archive_qr_ref ON railway_items_archive (qr_ref);
+CREATE INDEX IF NOT EXISTS ix_railway_items_archive_item_id ON railway_items_archive (item_id);
+
+-- Change feed / outbox, appended in the writing transaction (see backend/services/change_feed.py)
+CREATE TABLE IF NOT EXISTS item_changes (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  item_id TEXT NOT NULL,
+  qr_ref TEXT,
+  op TEXT NOT NULL,
+  before TEXT,
+  after TEXT,
+  changed_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_item_changes_item ON item_changes (item_id, id);
+CREATE INDEX IF NOT EXISTS ix_item_changes_changed_at ON item_changes (changed_at);
+
+-- Item search (see backend/services/item_search.py); SQLite, synced by insert/update/delete triggers:
+-- CREATE VIRTUAL TABLE item_search USING fts5(item_id, vendor_lot, manufacturer,
+--   content='railway_items', content_rowid='id', tokenize='trigram');
+-- PostgreSQL: text_pattern_ops B-trees on item_id and vendor_lot, and with pg_trgm
+-- CREATE INDEX ix_railway_items_search_trgm ON railway_items
+--   USING gin (item_id gin_trgm_ops, vendor_lot gin_trgm_ops, manufacturer gin_trgm_ops);
+
+-- PostgreSQL with DB_PARTITIONING=supply_year (see backend/utils/partitioning.py):
+--   railway_items is PARTITION BY RANGE (supply_date), PRIMARY KEY (id, supply_date),
+--   one railway_items_y<YEAR> partition per year plus railway_items_default;
+--   item_id / qr_ref uniqueness is kept by triggers in:
+-- CREATE TABLE railway_item_keys (
+--   item_id VARCHAR(50) PRIMARY KEY,
+--   qr_ref VARCHAR(12) NOT NULL UNIQUE
+-- );
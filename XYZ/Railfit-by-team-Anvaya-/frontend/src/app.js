@@ -835,9 +835,10 @@ class RailwayQRApp {
         this.stopWebcamScanning();
         this.showScanSuccess();
         const scanResult = { data: decodedText, confidence: 1.0, method: 'webcam_realtime', timestamp: new Date().toISOString(), quality_score: 0.95 };
-        if (decodedText && decodedText.startsWith('INDIAN_RAILWAYS:')) {
-            const qrRef = decodedText.replace('INDIAN_RAILWAYS:', '');
-            this.processRailwayQRScan(qrRef, scanResult);
+        // Legacy "INDIAN_RAILWAYS:<ref>", compact "IR:<REF>" or numeric "91..." payloads;
+        // the lookup endpoint decodes the raw payload
+        if (decodedText && /^(INDIAN_RAILWAYS:.+|IR:[0-9A-Z]{10,12}|91\d{15})$/.test(decodedText.trim())) {
+            this.processRailwayQRScan(encodeURIComponent(decodedText.trim()), scanResult);
         } else {
             this.displayScanError('Not a valid Indian Railways QR code');
         }
@@ -0,0 +1,98 @@
+"""Move retired fittings out of railway_items into the compressed archive table.
+
+    python scripts/archive_items.py --dry-run                          # how many rows would move
+    python scripts/archive_items.py --older-than-months 12             # run e.g. nightly from cron
+    python scripts/archive_items.py --statuses scrapped --vacuum       # reclaim space afterwards
+    python scripts/archive_items.py --restore QR_REF                   # bring one item back
+
+Archived items still resolve through /api/lookup/<qr_ref> (marked
+"archived": true); POST /api/items/<qr_ref>/restore does the same restore
+over HTTP. /api/stats counts the hot table only.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')))
+
+from sqlalchemy import text  # noqa: E402
+from backend.services.database_service import DatabaseService  # noqa: E402
+from backend.services.item_archive import ARCHIVE_AFTER_MONTHS, ARCHIVE_STATUSES, BATCH_SIZE, archive_stats  # noqa: E402
+
+
+def table_sizes(engine):
+    """On-disk size per table in MB (PostgreSQL, or SQLite with the dbstat table)"""
+    tables = ('railway_items', 'railway_items_archive')
+    try:
+        with engine.connect() as conn:
+            if engine.dialect.name == 'postgresql':
+                # Partitioned parents hold no data themselves: sum over the partition tree
+                query = ('SELECT COALESCE((SELECT SUM(pg_total_relation_size(relid)) FROM pg_partition_tree(to_regclass(:t))), '
+                         'pg_total_relation_size(to_regclass(:t)))')
+            else:
+                # Table plus its indexes
+                query = ("SELECT SUM(pgsize) FROM dbstat WHERE name = :t OR name IN "
+                         "(SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = :t)")
+            return {t: int(conn.execute(text(query), {'t': t}).scalar() or 0) / 1e6 for t in tables}
+    except Exception:
+        return {}
+
+
+def report(engine, label):
+    stats = archive_stats(engine)
+    sizes = table_sizes(engine)
+    size_text = ', '.join(f'{t} {mb:.1f} MB' for t, mb in sizes.items())
+    print(f"{label}: {stats['hot_items']} hot, {stats['archived_items']} archived "
+          f"({stats['archived_bytes'] / 1e6:.1f} MB compressed payload){'; ' + size_text if size_text else ''}")
+
+
+def vacuum(engine):
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        if engine.dialect.name == 'postgresql':
+            conn.execute(text('VACUUM ANALYZE railway_items'))
+            conn.execute(text('VACUUM ANALYZE railway_items_archive'))
+        else:
+            conn.execute(text('VACUUM'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Hot/cold tiering of railway_items')
+    parser.add_argument('--db-url', default=os.getenv('DATABASE_URL'))
+    parser.add_argument('--older-than-months', type=int, default=ARCHIVE_AFTER_MONTHS,
+                        help='Only rows whose updated_at is older than this')
+    parser.add_argument('--statuses', default=','.join(ARCHIVE_STATUSES), help='Comma-separated item statuses')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--dry-run', action='store_true')
+    parser.add_argument('--restore', metavar='QR_REF', help='Restore one archived item instead')
+    parser.add_argument('--vacuum', action='store_true', help='VACUUM after archiving to return the space')
+    args = parser.parse_args()
+
+    db = DatabaseService(args.db_url)
+    if args.restore:
+        try:
+            restored = db.restore_item(args.restore)
+        except ValueError as e:
+            parser.exit(1, f'Cannot restore: {e}\n')
+        if restored is None:
+            parser.exit(1, f'{args.restore} is not archived\n')
+        print(f"Restored {restored['item_id']} ({args.restore}) as id {restored['id']}")
+        return
+
+    statuses = [s.strip() for s in args.statuses.split(',') if s.strip()]
+    report(db.engine, 'Before')
+    started = time.perf_counter()
+    run = db.archive_inactive_items(args.older_than_months, statuses, args.batch_size, args.dry_run)
+    elapsed = time.perf_counter() - started
+    if args.dry_run:
+        print(f"{run['candidates']} items with status in {statuses} untouched since {run['cutoff']} would be archived")
+        return
+    print(f"Archived {run['archived']} items in {run['batches']} batches ({elapsed:.1f}s, "
+          f"{run['packed_bytes'] / 1e6:.1f} MB compressed)")
+    if args.vacuum:
+        vacuum(db.engine)
+    report(db.engine, 'After')
+
+
+if __name__ == '__main__':
+    main()
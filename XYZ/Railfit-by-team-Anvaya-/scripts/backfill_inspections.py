@@ -0,0 +1,29 @@
+"""Move legacy railway_items.inspection_dates JSON into the inspections table.
+
+Adds the inspections table / last_inspected_at column if needed, inserts one
+row per parseable date (re-running is safe) and sets last_inspected_at.
+
+    python scripts/backfill_inspections.py [--db-url sqlite:///backend/railway_qr.db]
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')))
+
+from backend.services.database_service import DatabaseService  # noqa: E402
+from backend.utils.database import DATABASE_URL  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Backfill the inspections table from inspection_dates')
+    parser.add_argument('--db-url', default=DATABASE_URL)
+    parser.add_argument('--batch-size', type=int, default=1000)
+    args = parser.parse_args()
+    db = DatabaseService(args.db_url)
+    migrated, skipped = db.backfill_inspections(args.batch_size)
+    print(f"Backfilled inspections for {migrated} items ({skipped} unparseable dates skipped)")
+
+
+if __name__ == '__main__':
+    main()
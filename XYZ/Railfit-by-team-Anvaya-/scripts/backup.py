@@ -1,14 +1,445 @@
-import shutil, os, datetime
+"""Online database backups: full, incremental and differential, with retention and verification.
 
-def backup_database(db_path='railway_barcode.db', backup_dir='backups'):
+    python scripts/backup.py backup                            # full backup of DATABASE_URL into backups/
+    python scripts/backup.py backup --mode incremental         # SQLite: pages changed since the previous backup
+    python scripts/backup.py backup --mode differential --verify
+    python scripts/backup.py list
+    python scripts/backup.py verify 20250101T020000123         # restore to a temp file and check it
+    python scripts/backup.py restore <id> --to restored.db     # or --to postgresql://... for a dump
+    python scripts/backup.py prune --keep-full 4 --max-age-days 35
+
+SQLite: the online backup API copies `--pages-per-step` pages at a time into
+a snapshot file, pausing `--sleep-ms` between steps. In WAL mode (the
+production profile) the source connection holds one read transaction for the
+whole copy, so the copy is a single consistent snapshot that never restarts,
+and the app keeps reading and writing (the WAL cannot be checkpointed past
+the snapshot until the backup ends). The snapshot is then stored gzip'd
+(full) or as the gzip'd pages whose hash differs from the previous backup
+(incremental) or from the last full (differential), with a per-page hash map
+for the next run. A restore replays the chain and must reproduce the
+snapshot's sha256.
+
+PostgreSQL: pg_dump in custom format (compressed), streamed to the file and
+hashed as it goes, at lower CPU priority. It reads from an exported
+snapshot, so --count-rows counts exactly what was dumped. pg_dump has no
+incremental mode: use WAL archiving for point-in-time recovery.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')))
+
+from sqlalchemy import create_engine, text  # noqa: E402
+from sqlalchemy.engine import make_url  # noqa: E402
+from backend.utils.database import DATABASE_URL  # noqa: E402
+
+MANIFEST = 'manifest.json'
+MODES = ('full', 'incremental', 'differential')
+# Tables counted when verifying a restore
+COUNT_TABLES = ('railway_items', 'inspections', 'item_changes', 'railway_items_archive')
+DIGEST_SIZE = 8
+PAGE_RECORD = struct.Struct('>I')
+CHUNK = 1024 * 1024
+
+
+# Manifest ---------------------------------------------------------------------------------------
+
+def load_manifest(backup_dir):
+    try:
+        with open(os.path.join(backup_dir, MANIFEST)) as fh:
+            return json.load(fh)
+    except FileNotFoundError:
+        return {'backups': []}
+
+
+def save_manifest(backup_dir, manifest):
+    path = os.path.join(backup_dir, MANIFEST)
+    with open(path + '.tmp', 'w') as fh:
+        json.dump(manifest, fh, indent=2)
+    os.replace(path + '.tmp', path)
+
+
+def find_backup(manifest, backup_id):
+    for entry in manifest['backups']:
+        if entry['id'] == backup_id:
+            return entry
+    raise SystemExit(f'No backup {backup_id} in the manifest')
+
+
+def chain_for(manifest, entry):
+    """Backups to replay for entry, full first"""
+    chain = [entry]
+    while chain[0]['mode'] != 'full':
+        chain.insert(0, find_backup(manifest, chain[0]['parent']))
+    return chain
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for block in iter(lambda: fh.read(CHUNK), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# SQLite -----------------------------------------------------------------------------------------
+
+def sqlite_snapshot(db_path, target, pages_per_step, sleep_ms, progress=True):
+    """Consistent copy of a live database with the online backup API, in page batches"""
+    src = sqlite3.connect(db_path, isolation_level=None)
+    dst = sqlite3.connect(target)
+    try:
+        journal_mode = src.execute('PRAGMA journal_mode').fetchone()[0].lower()
+        if journal_mode == 'wal':
+            # One read transaction for the whole copy: writers are not blocked and the
+            # backup sees no changes, so it never restarts
+            src.execute('BEGIN')
+            src.execute('SELECT count(*) FROM sqlite_master').fetchone()
+        last = [0.0]
+
+        def report(status, remaining, total):
+            now = time.monotonic()
+            if progress and (now - last[0] > 5 or remaining == 0):
+                last[0] = now
+                print(f"  copied {total - remaining}/{total} pages")
+
+        src.backup(dst, pages=pages_per_step, progress=report, sleep=sleep_ms / 1000.0)
+        if journal_mode == 'wal':
+            src.execute('COMMIT')
+    finally:
+        dst.close()
+        src.close()
+    # The copy keeps the source's WAL flag in its header; restores open it like the original
+    return journal_mode
+
+
+def page_hashes(path, page_size):
+    with open(path, 'rb') as fh:
+        for page in iter(lambda: fh.read(page_size), b''):
+            yield page, hashlib.blake2b(page, digest_size=DIGEST_SIZE).digest()
+
+
+def backup_sqlite(db_path, backup_dir, backup_id, mode, parent, pages_per_step, sleep_ms):
+    snapshot = os.path.join(backup_dir, f'.{backup_id}.snapshot')
+    try:
+        journal_mode = sqlite_snapshot(db_path, snapshot, pages_per_step, sleep_ms)
+        with sqlite3.connect(snapshot) as conn:
+            page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+        previous = b''
+        if parent is not None:
+            with open(os.path.join(backup_dir, parent['pagemap']), 'rb') as fh:
+                previous = fh.read()
+            if parent['page_size'] != page_size:
+                print('Page size changed since the parent backup; taking a full backup')
+                mode, parent, previous = 'full', None, b''
+
+        data_file = f"{backup_id}.{'db' if mode == 'full' else 'pages'}.gz"
+        pagemap_file = f'{backup_id}.pagemap'
+        sha = hashlib.sha256()
+        pages = changed = 0
+        with gzip.open(os.path.join(backup_dir, data_file + '.tmp'), 'wb', compresslevel=6) as out, \
+                open(os.path.join(backup_dir, pagemap_file + '.tmp'), 'wb') as pagemap:
+            for page, digest in page_hashes(snapshot, page_size):
+                sha.update(page)
+                pagemap.write(digest)
+                offset = pages * DIGEST_SIZE
+                if mode == 'full':
+                    out.write(page)
+                    changed += 1
+                elif previous[offset:offset + DIGEST_SIZE] != digest:
+                    out.write(PAGE_RECORD.pack(pages + 1) + page)
+                    changed += 1
+                pages += 1
+        for name in (data_file, pagemap_file):
+            os.replace(os.path.join(backup_dir, name + '.tmp'), os.path.join(backup_dir, name))
+    finally:
+        if os.path.exists(snapshot):
+            os.remove(snapshot)
+    return {
+        'mode': mode,
+        'parent': parent['id'] if parent else None,
+        'files': [data_file, pagemap_file],
+        'data_file': data_file,
+        'pagemap': pagemap_file,
+        'page_size': page_size,
+        'page_count': pages,
+        'changed_pages': changed,
+        'journal_mode': journal_mode,
+        'sha256': sha.hexdigest(),
+    }
+
+
+def restore_sqlite(manifest, backup_dir, entry, target):
+    """Replay full + page files into target; the result must match the snapshot's sha256"""
+    tmp = target + '.restoring'
+    for step in chain_for(manifest, entry):
+        path = os.path.join(backup_dir, step['data_file'])
+        if step['mode'] == 'full':
+            with gzip.open(path, 'rb') as src, open(tmp, 'wb') as dst:
+                shutil.copyfileobj(src, dst, CHUNK)
+            continue
+        record_size = PAGE_RECORD.size + step['page_size']
+        with gzip.open(path, 'rb') as src, open(tmp, 'r+b') as dst:
+            for record in iter(lambda: src.read(record_size), b''):
+                (pgno,) = PAGE_RECORD.unpack(record[:PAGE_RECORD.size])
+                dst.seek((pgno - 1) * step['page_size'])
+                dst.write(record[PAGE_RECORD.size:])
+            # The database may have shrunk (VACUUM) since the previous step
+            dst.truncate(step['page_count'] * step['page_size'])
+    if file_sha256(tmp) != entry['sha256']:
+        os.remove(tmp)
+        raise RuntimeError(f"restored copy of {entry['id']} does not match the backup checksum")
+    os.replace(tmp, target)
+
+
+def verify_sqlite(manifest, backup_dir, entry, quick=True):
+    with tempfile.TemporaryDirectory(dir=backup_dir) as work:
+        target = os.path.join(work, 'restored.db')
+        restore_sqlite(manifest, backup_dir, entry, target)
+        conn = sqlite3.connect(target)
+        try:
+            check = conn.execute('PRAGMA quick_check' if quick else 'PRAGMA integrity_check').fetchone()[0]
+            tables = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            counts = {t: conn.execute(f'SELECT count(*) FROM {t}').fetchone()[0] for t in COUNT_TABLES if t in tables}
+        finally:
+            conn.close()
+    return {'ok': check == 'ok', 'check': check, 'counts': counts}
+
+
+# PostgreSQL -------------------------------------------------------------------------------------
+
+def libpq_url(url):
+    return make_url(url).set(drivername='postgresql').render_as_string(hide_password=False)
+
+
+def backup_postgres(url, backup_dir, backup_id, count_rows, compress):
+    dump_file = f'{backup_id}.dump'
+    path = os.path.join(backup_dir, dump_file)
+    engine = create_engine(url)
+    sha = hashlib.sha256()
+    size = 0
+    # pg_dump reads the snapshot this transaction exports, so counts and dump agree; the
+    # isolation level is set before the driver opens the transaction
+    with engine.connect().execution_options(isolation_level='REPEATABLE READ', postgresql_readonly=True) as conn:
+        snapshot = conn.execute(text('SELECT pg_export_snapshot()')).scalar()
+        counts = {}
+        if count_rows:
+            for table in COUNT_TABLES:
+                if conn.execute(text('SELECT to_regclass(:t)'), {'t': table}).scalar():
+                    counts[table] = conn.execute(text(f'SELECT count(*) FROM {table}')).scalar()
+        command = [os.getenv('PG_DUMP', 'pg_dump'), '--format=custom', f'--compress={compress}',
+                   f'--snapshot={snapshot}', '--no-password', f'--dbname={libpq_url(url)}']
+        # Lower CPU priority; the dump is one sequential reader per table
+        proc = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                preexec_fn=lambda: os.nice(10))
+        with open(path + '.tmp', 'wb') as out:
+            for block in iter(lambda: proc.stdout.read(CHUNK), b''):
+                out.write(block)
+                sha.update(block)
+                size += len(block)
+        stderr = proc.stderr.read().decode('utf-8', 'replace')
+        if proc.wait() != 0:
+            os.remove(path + '.tmp')
+            raise RuntimeError(f'pg_dump failed: {stderr.strip()}')
+    engine.dispose()
+    os.replace(path + '.tmp', path)
+    return {'mode': 'full', 'parent': None, 'files': [dump_file], 'data_file': dump_file,
+            'sha256': sha.hexdigest(), 'counts': counts}
+
+
+def restore_postgres(backup_dir, entry, target_url, clean=True):
+    command = [os.getenv('PG_RESTORE', 'pg_restore'), '--no-owner', '--no-password',
+               f'--dbname={libpq_url(target_url)}']
+    if clean:
+        command += ['--clean', '--if-exists']
+    command.append(os.path.join(backup_dir, entry['data_file']))
+    result = subprocess.run(command, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f'pg_restore failed: {result.stderr.strip()}')
+
+
+def verify_postgres(backup_dir, entry, scratch_url=None):
+    path = os.path.join(backup_dir, entry['data_file'])
+    if file_sha256(path) != entry['sha256']:
+        return {'ok': False, 'check': 'checksum mismatch'}
+    listing = subprocess.run([os.getenv('PG_RESTORE', 'pg_restore'), '--list', path], capture_output=True, text=True)
+    if listing.returncode != 0:
+        return {'ok': False, 'check': listing.stderr.strip()}
+    result = {'ok': True, 'check': f"{listing.stdout.count(' TABLE DATA ')} tables in the archive"}
+    if scratch_url:
+        restore_postgres(backup_dir, entry, scratch_url)
+        engine = create_engine(scratch_url)
+        with engine.connect() as conn:
+            counts = {t: conn.execute(text(f'SELECT count(*) FROM {t}')).scalar()
+                      for t in COUNT_TABLES if conn.execute(text('SELECT to_regclass(:t)'), {'t': t}).scalar()}
+        engine.dispose()
+        result['counts'] = counts
+        expected = entry.get('counts') or {}
+        mismatched = {t: (n, counts.get(t)) for t, n in expected.items() if counts.get(t) != n}
+        if mismatched:
+            result.update(ok=False, check=f'row counts differ (backup, restored): {mismatched}')
+    return result
+
+
+# Commands ---------------------------------------------------------------------------------------
+
+def backup_database(db_url=None, backup_dir='backups', mode='full', pages_per_step=1024, sleep_ms=5.0,
+                    count_rows=False, compress=6):
+    """Take one backup of db_url (default DATABASE_URL) and record it in the manifest"""
+    url = db_url or DATABASE_URL
+    parsed = make_url(url)
     os.makedirs(backup_dir, exist_ok=True)
-    ts = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
-    dst = os.path.join(backup_dir, f'{os.path.basename(db_path)}.{ts}.bak')
-    if os.path.exists(db_path):
-        shutil.copy2(db_path, dst)
-        print('Backup created:', dst)
+    manifest = load_manifest(backup_dir)
+    started = time.perf_counter()
+    backup_id = datetime.utcnow().strftime('%Y%m%dT%H%M%S%f')[:-3]
+    source = parsed.render_as_string(hide_password=True)
+    previous = [b for b in manifest['backups'] if b['source'] == source]
+
+    if parsed.get_backend_name() == 'sqlite':
+        db_path = parsed.database
+        if not db_path or db_path == ':memory:' or not os.path.exists(db_path):
+            raise SystemExit(f'Database not found: {db_path}')
+        parent = None
+        if mode == 'incremental' and previous:
+            parent = previous[-1]
+        elif mode == 'differential':
+            fulls = [b for b in previous if b['mode'] == 'full']
+            parent = fulls[-1] if fulls else None
+        if mode != 'full' and parent is None:
+            print(f'No earlier backup of {source}; taking a full backup')
+            mode = 'full'
+        entry = backup_sqlite(db_path, backup_dir, backup_id, mode, parent, pages_per_step, sleep_ms)
+    elif parsed.get_backend_name() == 'postgresql':
+        if mode != 'full':
+            raise SystemExit('pg_dump has no incremental mode: take full backups and archive WAL '
+                             '(archive_command) for point-in-time recovery')
+        entry = backup_postgres(url, backup_dir, backup_id, count_rows, compress)
     else:
-        print('Database not found:', db_path)
+        raise SystemExit(f'Unsupported database: {parsed.get_backend_name()}')
+
+    entry.update(
+        id=backup_id,
+        engine=parsed.get_backend_name(),
+        source=source,
+        created_at=datetime.utcnow().isoformat(),
+        seconds=round(time.perf_counter() - started, 2),
+        bytes=sum(os.path.getsize(os.path.join(backup_dir, f)) for f in entry['files']),
+    )
+    entry['base'] = entry['id'] if entry['mode'] == 'full' else chain_for(manifest, entry)[0]['id']
+    manifest['backups'].append(entry)
+    save_manifest(backup_dir, manifest)
+    return entry
+
+
+def verify_backup(backup_dir, backup_id, scratch_url=None, full_check=False):
+    manifest = load_manifest(backup_dir)
+    entry = find_backup(manifest, backup_id)
+    started = time.perf_counter()
+    try:
+        if entry['engine'] == 'sqlite':
+            result = verify_sqlite(manifest, backup_dir, entry, quick=not full_check)
+        else:
+            result = verify_postgres(backup_dir, entry, scratch_url)
+    except Exception as e:
+        result = {'ok': False, 'check': str(e)}
+    result['seconds'] = round(time.perf_counter() - started, 2)
+    entry['verified'] = dict(result, at=datetime.utcnow().isoformat())
+    save_manifest(backup_dir, manifest)
+    return result
+
+
+def prune_backups(backup_dir, keep_full=4, max_age_days=None):
+    """Keep the newest keep_full full backups (and what depends on them); never the last full"""
+    manifest = load_manifest(backup_dir)
+    removed = []
+    for source in {b['source'] for b in manifest['backups']}:
+        fulls = [b for b in manifest['backups'] if b['source'] == source and b['mode'] == 'full']
+        keep = {b['id'] for b in fulls[-keep_full:]} if keep_full > 0 else set()
+        if max_age_days is not None:
+            cutoff = (datetime.utcnow() - timedelta(days=max_age_days)).isoformat()
+            keep = {i for i in keep if find_backup(manifest, i)['created_at'] >= cutoff}
+        keep.add(fulls[-1]['id'])
+        for entry in [b for b in manifest['backups'] if b['source'] == source and b['base'] not in keep]:
+            for name in entry['files']:
+                path = os.path.join(backup_dir, name)
+                if os.path.exists(path):
+                    os.remove(path)
+            manifest['backups'].remove(entry)
+            removed.append(entry['id'])
+    save_manifest(backup_dir, manifest)
+    return removed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Online database backups')
+    parser.add_argument('--db-url', default=os.getenv('DATABASE_URL'))
+    parser.add_argument('--dir', default=os.getenv('BACKUP_DIR', 'backups'))
+    sub = parser.add_subparsers(dest='command', required=True)
+    backup = sub.add_parser('backup')
+    backup.add_argument('--mode', choices=MODES, default='full')
+    backup.add_argument('--pages-per-step', type=int, default=1024, help='SQLite pages copied per backup step')
+    backup.add_argument('--sleep-ms', type=float, default=5.0, help='Pause between SQLite backup steps')
+    backup.add_argument('--count-rows', action='store_true', help='PostgreSQL: record row counts for verification')
+    backup.add_argument('--compress', type=int, default=6, help='pg_dump compression level')
+    backup.add_argument('--verify', action='store_true', help='Verify the new backup right away')
+    sub.add_parser('list')
+    verify = sub.add_parser('verify')
+    verify.add_argument('id')
+    verify.add_argument('--scratch-url', help='PostgreSQL: restore into this (disposable) database and count rows')
+    verify.add_argument('--integrity-check', action='store_true', help='SQLite: full integrity_check, not quick_check')
+    restore = sub.add_parser('restore')
+    restore.add_argument('id')
+    restore.add_argument('--to', required=True, help='SQLite file path, or a PostgreSQL URL')
+    prune = sub.add_parser('prune')
+    prune.add_argument('--keep-full', type=int, default=4)
+    prune.add_argument('--max-age-days', type=int, default=None)
+    args = parser.parse_args()
+
+    if args.command == 'backup':
+        entry = backup_database(args.db_url, args.dir, args.mode, args.pages_per_step, args.sleep_ms,
+                                args.count_rows, args.compress)
+        detail = f", {entry['changed_pages']}/{entry['page_count']} pages" if entry['engine'] == 'sqlite' else ''
+        print(f"Backup {entry['id']}: {entry['bytes'] / 1e6:.1f} MB in {entry['seconds']}s{detail}")
+        if args.verify:
+            result = verify_backup(args.dir, entry['id'])
+            print(f"Verify: {'ok' if result['ok'] else 'FAILED'} ({result['check']}) {result.get('counts', '')}")
+            if not result['ok']:
+                sys.exit(1)
+    elif args.command == 'list':
+        for entry in load_manifest(args.dir)['backups']:
+            verified = entry.get('verified')
+            state = 'unverified' if not verified else ('verified' if verified['ok'] else 'VERIFY FAILED')
+            print(f"{entry['id']:<22}{entry['mode']:<14}{entry['bytes'] / 1e6:>9.1f} MB  base {entry['base']}  {state}")
+    elif args.command == 'verify':
+        result = verify_backup(args.dir, args.id, args.scratch_url, args.integrity_check)
+        print(f"{args.id}: {'ok' if result['ok'] else 'FAILED'} ({result['check']}) {result.get('counts', '')}")
+        if not result['ok']:
+            sys.exit(1)
+    elif args.command == 'restore':
+        manifest = load_manifest(args.dir)
+        entry = find_backup(manifest, args.id)
+        if entry['engine'] == 'sqlite':
+            if os.path.exists(args.to):
+                raise SystemExit(f'{args.to} exists; restore into a new path and swap it in while the app is stopped')
+            restore_sqlite(manifest, args.dir, entry, args.to)
+        else:
+            restore_postgres(args.dir, entry, args.to)
+        print(f'Restored {args.id} to {args.to}')
+    elif args.command == 'prune':
+        removed = prune_backups(args.dir, args.keep_full, args.max_age_days)
+        print(f"Removed {len(removed)} backups{': ' + ', '.join(removed) if removed else ''}")
+
 
 if __name__ == '__main__':
-    backup_database()
+    main()
@@ -0,0 +1,110 @@
+"""Compare item list serialisation paths on a large synthetic table.
+
+    orm     ORM query -> RailwayItem objects -> to_dict() -> Flask jsonify (the previous path)
+    core    Core select -> serialize_row() dicts -> Flask jsonify
+    stream  Core select (yield_per) -> plain dicts -> orjson chunks (iter_json_array)
+
+Each path encodes the same rows and must produce identical JSON values.
+Reports wall time, rows/s, time to the first byte and, with --memory, the
+peak Python allocation (tracemalloc; slows every path down).
+
+    python scripts/bench_serialization.py --rows 200000
+    python scripts/bench_serialization.py --rows 1000000 --reuse --memory
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')))
+
+from flask import Flask  # noqa: E402
+from sqlalchemy import select  # noqa: E402
+from backend.models.railway_item import RailwayItem  # noqa: E402
+from backend.services.database_service import DatabaseService  # noqa: E402
+from backend.utils import json_stream  # noqa: E402
+from generate_fleet import ensure_fleet  # noqa: E402
+
+
+def path_orm(db, app, filters):
+    items = db.search_items(filters)
+    with app.app_context():
+        yield app.json.response([i.to_dict() for i in items]).get_data()
+
+
+def path_core(db, app, filters):
+    table = RailwayItem.__table__
+    stmt = db._apply_filters(select(*table.columns), filters).order_by(table.c.id)
+    rows = [RailwayItem.serialize_row(r) for r in db.read_session.execute(stmt).mappings()]
+    with app.app_context():
+        yield app.json.response(rows).get_data()
+
+
+def path_stream(db, app, filters):
+    yield from json_stream.iter_json_array(db.iter_item_records(filters))
+
+
+PATHS = {'orm': path_orm, 'core': path_core, 'stream': path_stream}
+
+
+def run(name, db, app, filters, memory: bool):
+    if memory:
+        tracemalloc.start()
+    started = time.perf_counter()
+    first_byte = None
+    size = 0
+    chunks = []
+    for chunk in PATHS[name](db, app, filters):
+        # The opening bracket alone does not count as the first byte of data
+        if first_byte is None and len(chunk) > 1:
+            first_byte = time.perf_counter() - started
+        size += len(chunk)
+        if not memory:
+            chunks.append(chunk)
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1] if memory else None
+    if memory:
+        tracemalloc.stop()
+    db.remove_session()
+    return elapsed, first_byte, size, peak, b''.join(chunks)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Item list serialisation benchmark')
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--db-url', default=None, help='Defaults to a SQLite file in the temp dir')
+    parser.add_argument('--reuse', action='store_true', help='Skip data generation if the table is populated')
+    parser.add_argument('--item-type', default=None, help='Filter (default: all rows)')
+    parser.add_argument('--paths', default='orm,core,stream')
+    parser.add_argument('--memory', action='store_true', help='Also measure peak allocation')
+    args = parser.parse_args()
+
+    url = args.db_url or f"sqlite:///{os.path.join(tempfile.gettempdir(), f'railway_serial_{args.rows}.db')}"
+    print(f"Database: {url}  (orjson: {'yes' if json_stream._HAS_ORJSON else 'no'})")
+    db = DatabaseService(url)
+    ensure_fleet(db, args.rows, reuse=args.reuse)
+    app = Flask(__name__)
+    filters = {'item_type': args.item_type} if args.item_type else {}
+
+    reference = None
+    print(f"\n{'path':<8}{'rows/s':>12}{'total s':>10}{'first byte ms':>15}{'MB out':>9}{'peak MB':>9}")
+    for name in args.paths.split(','):
+        elapsed, first_byte, size, peak, body = run(name, db, app, filters, args.memory)
+        rows = args.rows if not filters else None
+        if body:
+            decoded = json.loads(body)
+            rows = len(decoded)
+            if reference is None:
+                reference = decoded
+            elif decoded != reference:
+                print(f"  !! {name} output differs from the first path")
+        peak_text = f"{peak / 1e6:>9.0f}" if peak is not None else f"{'-':>9}"
+        print(f"{name:<8}{(rows or 0) / elapsed:>12.0f}{elapsed:>10.2f}{first_byte * 1000:>15.1f}"
+              f"{size / 1e6:>9.1f}{peak_text}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""Compare scan-lookup throughput during bulk writes under the SQLite profiles.
+
+For each profile a fresh SQLite file is seeded with a synthetic fleet
+(generate_fleet.py), then one thread keeps writing generated deliveries
+through bulk_save_items while N threads resolve random qr_refs the way
+/api/lookup does (lookup cache disabled). Reports lookups/s, lookup p50/p99,
+failed lookups and the write rate achieved alongside.
+
+    python scripts/bench_sqlite_profile.py --rows 100000 --readers 8 --seconds 10
+    python scripts/bench_sqlite_profile.py --profiles production
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')))
+
+from sqlalchemy import select  # noqa: E402
+from backend.models.railway_item import RailwayItem  # noqa: E402
+from backend.services.database_service import DatabaseService  # noqa: E402
+from backend.services.qr_ref_allocator import QRRefAllocator  # noqa: E402
+from generate_fleet import FleetGenerator, load_fleet  # noqa: E402
+
+
+def run_profile(profile: str, rows: int, readers: int, seconds: float, batch: int) -> dict:
+    path = os.path.join(tempfile.mkdtemp(prefix=f'railway_sqlite_{profile}_'), 'bench.db')
+    db = DatabaseService(f'sqlite:///{path}', sqlite_profile=profile)
+    load_fleet(db, rows, seed=7, progress=False)
+    with db.engine.connect() as conn:
+        qr_refs = conn.execute(select(RailwayItem.qr_ref)).scalars().all()
+    deliveries = FleetGenerator(QRRefAllocator(db.engine, block_size=batch).next_refs, seed=11, inspection_years=0)
+
+    stop = threading.Event()
+    lock = threading.Lock()
+    latencies, failures = [], [0]
+    written = [0]
+
+    def writer():
+        next_id = rows
+        while not stop.is_set():
+            items, _ = next(deliveries.generate(batch, next_id, batch))
+            report = db.bulk_save_items(items, batch_size=batch)
+            next_id += batch
+            with lock:
+                written[0] += report['written']
+
+    def reader(seed: int):
+        local_rng = random.Random(seed)
+        samples, failed = [], 0
+        while not stop.is_set():
+            qr_ref = local_rng.choice(qr_refs)
+            started = time.perf_counter()
+            try:
+                if db.get_item_data_by_qr_ref(qr_ref) is None:
+                    failed += 1
+            except Exception:
+                failed += 1
+            samples.append(time.perf_counter() - started)
+        db.remove_session()
+        with lock:
+            latencies.extend(samples)
+            failures[0] += failed
+
+    threads = [threading.Thread(target=writer)] + [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+    began = time.perf_counter()
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - began
+    latencies.sort()
+    total = len(latencies)
+    return {
+        'profile': profile,
+        'lookups_per_s': total / elapsed,
+        'p50_ms': latencies[total // 2] * 1000 if total else 0,
+        'p99_ms': latencies[max(0, int(total * 0.99) - 1)] * 1000 if total else 0,
+        'failed': failures[0],
+        'writes_per_s': written[0] / elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='SQLite profile benchmark: lookups during bulk writes')
+    parser.add_argument('--rows', type=int, default=100000, help='Rows seeded before the run')
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=10.0)
+    parser.add_argument('--batch', type=int, default=2000, help='Rows per bulk write batch')
+    parser.add_argument('--profiles', default='default,production')
+    args = parser.parse_args()
+
+    results = []
+    for profile in args.profiles.split(','):
+        print(f"Running profile '{profile}' ({args.rows} rows, {args.readers} readers, {args.seconds:.0f}s)...")
+        results.append(run_profile(profile.strip(), args.rows, args.readers, args.seconds, args.batch))
+    print(f"\n{'profile':<12}{'lookups/s':>12}{'p50 ms':>10}{'p99 ms':>10}{'failed':>8}{'writes/s':>12}")
+    for r in results:
+        print(f"{r['profile']:<12}{r['lookups_per_s']:>12.0f}{r['p50_ms']:>10.2f}{r['p99_ms']:>10.2f}"
+              f"{r['failed']:>8}{r['writes_per_s']:>12.0f}")
+
+
+if __name__ == '__main__':
+    main()
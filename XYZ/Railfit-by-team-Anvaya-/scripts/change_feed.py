@@ -0,0 +1,64 @@
+"""Follow or prune the item change feed (item_changes).
+
+    python scripts/change_feed.py tail --since 0                 # print changes as JSON lines, keep polling
+    python scripts/change_feed.py tail --since 1200 --ops status,archived --once
+    python scripts/change_feed.py prune --days 30                # retention, e.g. daily from cron
+
+A consumer keeps the id of the last change it processed and resumes after it;
+over HTTP the same feed is GET /api/changes?since=<id>.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')))
+
+from backend.services.change_feed import prune_changes, serialize_change  # noqa: E402
+from backend.services.database_service import DatabaseService  # noqa: E402
+from backend.utils.json_stream import dumps  # noqa: E402
+
+
+def cmd_tail(db, args):
+    since = args.since
+    ops = [o.strip() for o in args.ops.split(',') if o.strip()] or None
+    while True:
+        changes = db.get_changes(since, args.batch_size, ops)
+        for record in changes:
+            sys.stdout.write(dumps(serialize_change(record)).decode('utf-8') + '\n')
+        sys.stdout.flush()
+        db.remove_session()
+        if changes:
+            since = changes[-1]['id']
+        if len(changes) < args.batch_size:
+            if args.once:
+                print(f"# next since={since}", file=sys.stderr)
+                return
+            time.sleep(args.interval)
+
+
+def cmd_prune(db, args):
+    removed = prune_changes(db.engine, args.days)
+    print(f"Removed {removed} changes older than {args.days} days")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Item change feed tools')
+    parser.add_argument('--db-url', default=os.getenv('DATABASE_URL'))
+    sub = parser.add_subparsers(dest='command', required=True)
+    tail = sub.add_parser('tail')
+    tail.add_argument('--since', type=int, default=0, help='Last change id already processed')
+    tail.add_argument('--ops', default='', help='Comma-separated ops (default: all)')
+    tail.add_argument('--batch-size', type=int, default=1000)
+    tail.add_argument('--interval', type=float, default=1.0, help='Seconds between polls when caught up')
+    tail.add_argument('--once', action='store_true', help='Stop when caught up')
+    prune = sub.add_parser('prune')
+    prune.add_argument('--days', type=int, default=30)
+    args = parser.parse_args()
+
+    db = DatabaseService(args.db_url)
+    {'tail': cmd_tail, 'prune': cmd_prune}[args.command](db, args)
+
+
+if __name__ == '__main__':
+    main()
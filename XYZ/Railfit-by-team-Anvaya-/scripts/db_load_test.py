@@ -0,0 +1,94 @@
+"""Concurrent load test for the pooled, request-scoped DB session layer.
+
+Drives the real Flask app from many threads (QR generation writes interleaved
+with lookups and vendor searches) and checks that no request fails, every
+written item is readable, and all pooled connections are returned afterwards.
+
+    python scripts/db_load_test.py --threads 16 --requests 50
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend')
+
+
+def run(threads: int, requests_per_thread: int, db_url: str):
+    os.environ['DATABASE_URL'] = db_url
+    os.environ.setdefault('QR_CODE_FOLDER', tempfile.mkdtemp(prefix='qr_load_'))
+    os.environ.setdefault('UPLOAD_FOLDER', tempfile.mkdtemp(prefix='upload_load_'))
+    sys.path.insert(0, os.path.abspath(BACKEND_DIR))
+    with contextlib.redirect_stdout(io.StringIO()):
+        import app as railway_app
+
+    flask_app = railway_app.app
+    client = flask_app.test_client()
+    tokens = {}
+    for user, password, role in (('manufacturer', 'mfg123', 'manufacturer'), ('vendor', 'vendor123', 'vendor')):
+        tokens[role] = client.post('/api/login', json={'username': user, 'password': password, 'role': role}).get_json()['token']
+
+    errors = []
+    written = []
+    lock = threading.Lock()
+    latencies = []
+
+    def worker(worker_id: int):
+        local = flask_app.test_client()
+        mfg = {'Authorization': f"Bearer {tokens['manufacturer']}"}
+        vendor = {'Authorization': f"Bearer {tokens['vendor']}"}
+        for n in range(requests_per_thread):
+            started = time.perf_counter()
+            if n % 3 == 0:
+                resp = local.post('/api/manufacturer/generate-qr?response=url&format=svg', headers=mfg, json={
+                    'item_id': f'LT-{worker_id:03d}-{n:05d}', 'vendor_lot': f'LOT{worker_id % 4}',
+                    'item_type': 'rail_pad', 'supply_date': '2025-01-15', 'warranty_period': '3 years',
+                })
+                if resp.status_code == 200:
+                    with lock:
+                        written.append(resp.get_json()['qr_ref'])
+            elif n % 3 == 1 and written:
+                resp = local.get(f'/api/lookup/{written[-1]}')
+            else:
+                resp = local.post('/api/vendor/search-parts', headers=vendor, json={'part_type': 'rail_pad', 'supplier': f'LOT{worker_id % 4}'})
+            with lock:
+                latencies.append(time.perf_counter() - started)
+                if resp.status_code != 200:
+                    errors.append((resp.status_code, resp.get_data(as_text=True)[:200]))
+
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            list(executor.map(worker, range(threads)))
+        elapsed = time.perf_counter() - started
+
+        missing = [ref for ref in written if client.get(f'/api/lookup/{ref}').status_code != 200]
+    pool = railway_app.db_service.engine.pool
+    latencies.sort()
+    total = len(latencies)
+    print(f"requests: {total} in {elapsed:.2f}s ({total / elapsed:.0f} req/s) across {threads} threads")
+    if total:
+        print(f"latency p50={latencies[total // 2] * 1000:.1f}ms p99={latencies[int(total * 0.99) - 1] * 1000:.1f}ms")
+    print(f"errors: {len(errors)}  written: {len(written)}  missing after write: {len(missing)}")
+    print(f"pool: {pool.status()}")
+    for err in errors[:5]:
+        print('  ', err)
+    checked_out = pool.checkedout() if hasattr(pool, 'checkedout') else 0
+    return not errors and not missing and checked_out == 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Concurrent load test for DB session handling')
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=30, help='Requests per thread')
+    parser.add_argument('--db-url', default=None, help='Defaults to a fresh temporary SQLite file')
+    args = parser.parse_args()
+    url = args.db_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='railway_load_'), 'load.db')}"
+    ok = run(args.threads, args.requests, url)
+    print('PASS' if ok else 'FAIL')
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,58 @@
+"""Export railway_items, inspections and item tombstones as partitioned Parquet datasets for analysis.
+
+    python scripts/export_parquet.py --out exports/                 # incremental after the first run
+    python scripts/export_parquet.py --out exports/ --full          # rewrite everything
+    python scripts/export_parquet.py --out exports/ --tables items --row-group-size 50000
+
+Layout: <out>/railway_items/supply_year=YYYY/part-<run>.parquet,
+<out>/inspections/inspected_year=YYYY/part-<run>.parquet and
+<out>/item_tombstones/changed_year=YYYY/part-<run>.parquet; each table's
+watermark is kept in <out>/_export_manifest.json. Incremental runs add files
+with the rows changed since, so a changed item can appear in several runs:
+keep the row with the latest updated_at per item_id. Archived items never
+appear again in railway_items: drop the item_ids whose latest tombstone
+(highest id) is 'archived' and not 'restored'. In pandas:
+
+    pd.read_parquet('exports/railway_items')   # supply_year becomes a column
+"""
+import argparse
+import os
+import resource
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')))
+
+from backend.services.parquet_export import EXPORTS, ParquetExporter, ROW_GROUP_SIZE  # noqa: E402
+from backend.utils.database import create_read_engine  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Parquet export of railway_items / inspections / tombstones')
+    parser.add_argument('--db-url', default=os.getenv('DATABASE_URL'))
+    parser.add_argument('--out', default=os.getenv('EXPORT_DIR', 'exports'))
+    parser.add_argument('--tables', default=','.join(EXPORTS), help=f"Comma-separated: {', '.join(EXPORTS)}")
+    parser.add_argument('--full', action='store_true', help='Ignore the watermark and replace earlier files')
+    parser.add_argument('--row-group-size', type=int, default=ROW_GROUP_SIZE)
+    parser.add_argument('--compression', default='zstd')
+    args = parser.parse_args()
+
+    tables = [t.strip() for t in args.tables.split(',') if t.strip()]
+    unknown = [t for t in tables if t not in EXPORTS]
+    if unknown:
+        parser.error(f"unknown tables: {', '.join(unknown)}")
+    engine = create_read_engine(args.db_url)
+    exporter = ParquetExporter(engine, args.out, args.row_group_size, args.compression)
+    for table in tables:
+        started = time.perf_counter()
+        run = exporter.export(table, full=args.full)
+        elapsed = time.perf_counter() - started
+        rate = run['rows'] / elapsed if elapsed else 0
+        print(f"{table}: {run['mode']} run {run['run_id']}, {run['rows']} rows in {len(run['files'])} files "
+              f"({rate:.0f} rows/s), watermark {run['watermark']}")
+    # ru_maxrss is in KiB on Linux
+    print(f"Peak RSS: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB")
+
+
+if __name__ == '__main__':
+    main()
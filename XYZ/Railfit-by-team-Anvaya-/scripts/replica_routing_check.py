@@ -0,0 +1,101 @@
+"""Exercise read-replica routing locally with two SQLite files (or real URLs).
+
+"Replication" between the files is simulated by copying the primary over the
+replica with the SQLite backup API. The check verifies that reads go to the
+replica when it is caught up, fall back to the primary once it lags beyond
+the limit, and that a writer's own reads stay on the primary for the
+read-your-writes window.
+
+    python scripts/replica_routing_check.py
+    python scripts/replica_routing_check.py --primary postgresql://.../railway --replica postgresql://.../railway_ro --no-sync
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')))
+
+from backend.services.database_service import DatabaseService  # noqa: E402
+from backend.services.replica_router import set_actor  # noqa: E402
+
+
+def sync(primary_path: str, replica_path: str):
+    src = sqlite3.connect(primary_path)
+    dst = sqlite3.connect(replica_path)
+    with dst:
+        src.backup(dst)
+    src.close()
+    dst.close()
+
+
+def routed_to(db: DatabaseService) -> str:
+    # Read sessions are bound to an autocommit view of the engine, which shares its pool
+    pool = db.read_session.get_bind().pool
+    return 'replica' if any(pool is replica.pool for replica in db.replicas.replicas) else 'primary'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replica routing check')
+    parser.add_argument('--primary', default=None)
+    parser.add_argument('--replica', default=None)
+    parser.add_argument('--no-sync', action='store_true', help='Real replication: do not copy files')
+    parser.add_argument('--max-lag', type=float, default=1.0)
+    parser.add_argument('--sticky', type=float, default=1.0)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix='railway_replica_')
+    primary = args.primary or f"sqlite:///{os.path.join(tmp, 'primary.db')}"
+    replica = args.replica or f"sqlite:///{os.path.join(tmp, 'replica.db')}"
+    files = None if args.no_sync else (primary[len('sqlite:///'):], replica[len('sqlite:///'):])
+
+    # The default profile keeps rollback-journal files, which copy cleanly with the backup API
+    db = DatabaseService(primary, replica_urls=[replica], replica_max_lag=args.max_lag,
+                         read_your_writes_seconds=args.sticky, sqlite_profile='default')
+    router = db.replicas
+    failures = []
+
+    def expect(label, want):
+        got = routed_to(db)
+        db.remove_session()
+        print(f"  {label:<48} -> {got}")
+        if got != want:
+            failures.append(f"{label}: expected {want}, got {got}")
+
+    set_actor('station-1')
+    router.beat()
+    if files:
+        sync(*files)
+    router.check()
+    expect('caught-up replica', 'replica')
+
+    db.save_item({'item_id': 'RR-1', 'vendor_lot': 'L1', 'item_type': 'liner'}, 'RRCHECK00001')
+    expect('writer right after its write', 'primary')
+    set_actor('official-7')
+    expect('another actor right after the write', 'replica')
+    print(f"  cache fill for the fresh ref sees it: {db.get_item_data_by_qr_ref('RRCHECK00001') is not None}")
+    db.remove_session()
+
+    time.sleep(args.sticky + 0.1)
+    set_actor('station-1')
+    expect('writer after the stickiness window', 'replica')
+
+    # Replica stops receiving changes while the primary keeps beating
+    time.sleep(args.max_lag + 0.2)
+    router.refresh()
+    print(f"  replica lag: {router.lag[0]:.2f}s (limit {args.max_lag}s)")
+    expect('lagging replica', 'primary')
+
+    if files:
+        sync(*files)
+    router.check()
+    expect('replica caught up again', 'replica')
+
+    print('PASS' if not failures else 'FAIL\n  ' + '\n  '.join(failures))
+    return not failures
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
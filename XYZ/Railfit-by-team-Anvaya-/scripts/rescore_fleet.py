@@ -0,0 +1,99 @@
+"""Recompute AI insights for every item and write them back in batches.
+
+    python scripts/rescore_fleet.py --chunk-size 1000
+    python scripts/rescore_fleet.py --item-type rail_pad --check-updated-at
+    python scripts/rescore_fleet.py --limit 20000 --compare-single 2000     # batched vs per-item writes
+
+Items are read a page at a time (keyset on id), scored with RailwayAIAnalyzer
+and written with DatabaseService.update_item_insights_batch. With
+--check-updated-at an item that changed after it was read is left alone and
+counted as a conflict; rerun to pick it up.
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')))
+
+from backend.services.ai_analyzer import RailwayAIAnalyzer  # noqa: E402
+from backend.services.database_service import DatabaseService  # noqa: E402
+
+FIELDS = ['id', 'qr_ref', 'item_type', 'supply_date', 'warranty_period', 'warranty_expiry_date',
+          'last_inspected_at', 'updated_at']
+
+
+def score(analyzer, record):
+    # The analyzer works on to_dict() values (ISO strings)
+    data = {k: v.isoformat() if isinstance(v, datetime) else v for k, v in record.items()}
+    insights = analyzer.analyze_item_performance(data)
+    return insights, insights['quality_score']['score']
+
+
+def iter_pages(db, filters, page_size, limit):
+    after_id, seen = None, 0
+    while True:
+        rows, after_id = db.list_items_page(filters, FIELDS, after_id, page_size)
+        db.remove_session()
+        for row in rows:
+            yield row
+            seen += 1
+            if limit and seen >= limit:
+                return
+        if after_id is None:
+            return
+
+
+def single(db, analyzer, filters, count):
+    """Per-item update_item_insights calls, for comparison"""
+    started = time.perf_counter()
+    done = 0
+    for record in iter_pages(db, filters, 1000, count):
+        insights, quality = score(analyzer, record)
+        db.update_item_insights(record['qr_ref'], insights, quality)
+        db.remove_session()
+        done += 1
+    elapsed = time.perf_counter() - started
+    return done, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Batched AI insight write-back')
+    parser.add_argument('--db-url', default=os.getenv('DATABASE_URL'))
+    parser.add_argument('--chunk-size', type=int, default=1000, help='Updates per transaction')
+    parser.add_argument('--item-type', default=None)
+    parser.add_argument('--limit', type=int, default=0, help='Stop after this many items (0: all)')
+    parser.add_argument('--check-updated-at', action='store_true', help='Skip items changed since they were read')
+    parser.add_argument('--compare-single', type=int, default=0, metavar='N',
+                        help='First time N per-item update_item_insights calls')
+    args = parser.parse_args()
+
+    db = DatabaseService(args.db_url)
+    analyzer = RailwayAIAnalyzer()
+    filters = {'item_type': args.item_type} if args.item_type else {}
+
+    if args.compare_single:
+        done, elapsed = single(db, analyzer, filters, args.compare_single)
+        print(f"single: {done} items in {elapsed:.1f}s ({done / elapsed if elapsed else 0:.0f} items/s)")
+
+    def updates():
+        for record in iter_pages(db, filters, args.chunk_size, args.limit):
+            insights, quality = score(analyzer, record)
+            if args.check_updated_at:
+                yield record['qr_ref'], insights, quality, record['updated_at']
+            else:
+                yield record['qr_ref'], insights, quality
+
+    report = db.update_item_insights_batch(updates(), chunk_size=args.chunk_size)
+    print(f"batched: {report['updated']} of {report['total']} items in {report['elapsed_seconds']}s "
+          f"({report['rows_per_second']} items/s, {report['chunks']} chunks; scoring included)")
+    if report['conflicts'] or report['missing'] or report['errors']:
+        print(f"  conflicts: {len(report['conflicts'])}  missing: {len(report['missing'])}  "
+              f"failed chunks: {len(report['errors'])}")
+        for error in report['errors'][:5]:
+            print(f"  {error['error']}")
+
+
+if __name__ == '__main__':
+    main()
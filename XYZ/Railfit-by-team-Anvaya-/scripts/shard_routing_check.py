@@ -0,0 +1,244 @@
+"""Exercise the sharded item store locally with several SQLite files (or real URLs).
+
+Loads a small fleet through ShardedDatabaseService and verifies that items
+land on the shard their zone (or item_id hash) routes to, that minted refs
+name that shard so a lookup queries one database only, that legacy refs
+without a hint are still found, that filtered listings touch only the
+matching shard, that an item_id created on two shards at once is saved on
+one, that batched insight updates reach every shard, and that scatter-gather
+search, paging and rollups see every shard.
+
+    python scripts/shard_routing_check.py [--shards 3] [--key zone|item_id] [--items 3000]
+    python scripts/shard_routing_check.py --shard-url postgresql://.../rail_s0 --shard-url postgresql://.../rail_s1
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')))
+
+from sqlalchemy import event, func, select  # noqa: E402
+from backend.models.railway_item import RailwayItem  # noqa: E402
+from backend.services.qr_ref_allocator import ref_shard  # noqa: E402
+from backend.services.sharded_database_service import DuplicateItemError, ShardedDatabaseService  # noqa: E402
+
+ZONES = ['NR', 'CR', 'WR', 'ER', 'SR', 'NFR', 'SECR', 'ECOR']
+ITEM_TYPES = ['elastic_rail_clip', 'rail_pad', 'liner', 'sleeper']
+
+
+class QueryCounter:
+    """Statements run per shard, over the shard's write and read engines"""
+    def __init__(self, db):
+        self.counts = Counter()
+        for number, shard in enumerate(db.shards):
+            for engine in {shard.engine, shard.read_engine}:
+                event.listen(engine, 'before_cursor_execute', self._counter(number))
+
+    def _counter(self, number):
+        def count(conn, cursor, statement, parameters, context, executemany):
+            self.counts[number] += 1
+        return count
+
+    def shards_touched(self, call):
+        self.counts.clear()
+        result = call()
+        return result, sorted(self.counts)
+
+
+def fleet(count, seed=7):
+    rng = random.Random(seed)
+    start = datetime(2018, 1, 1)
+    for i in range(count):
+        yield {
+            'item_id': f'SH-{i:06d}',
+            'vendor_lot': f'LOT-{i // 50:04d}',
+            'item_type': rng.choice(ITEM_TYPES),
+            'zone': ZONES[i % len(ZONES)],
+            'supply_date': (start + timedelta(days=rng.randrange(2900))).date().isoformat(),
+            'warranty_period': rng.choice(['2 years', '5 years', '18 months']),
+            'manufacturer': rng.choice(['Track Components Ltd', 'Railway Parts Manufacturer']),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Sharded item store check')
+    parser.add_argument('--shard-url', action='append', default=[], help='Shard database URL (repeat)')
+    parser.add_argument('--shards', type=int, default=3, help='Local SQLite shards without --shard-url')
+    parser.add_argument('--key', choices=('zone', 'item_id'), default='zone')
+    parser.add_argument('--items', type=int, default=3000)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix='railway_shards_')
+    urls = args.shard_url or [f"sqlite:///{os.path.join(tmp, f'shard{n}.db')}" for n in range(args.shards)]
+    zone_map = {'NR': 0, 'NFR': 0, 'CR': 1 % len(urls), 'WR': (len(urls) - 1)}
+    db = ShardedDatabaseService(urls, key=args.key, zone_map=zone_map)
+    router = db.router
+    counter = QueryCounter(db)
+    failures = []
+
+    def expect(label, ok, detail=''):
+        print(f"  {label:<58} {'ok' if ok else 'FAIL'} {detail}")
+        if not ok:
+            failures.append(label)
+
+    print(f"{len(urls)} shards, key={args.key}, zones={zone_map}")
+    report = db.bulk_save_items(fleet(args.items), ref_factory=True, batch_size=1000)
+    db.remove_session()
+    print(f"  bulk: {report['written']} written in {report['elapsed_seconds']}s, per shard "
+          f"{[b['shards'] for b in report['batches']][:1]}")
+    expect('bulk load writes every row', report['written'] == args.items, f"rejected={report['rejected']}")
+
+    misplaced, bad_hints, per_shard = 0, 0, []
+    for number, shard in enumerate(db.shards):
+        with shard.read_engine.connect() as conn:
+            rows = conn.execute(select(RailwayItem.item_id, RailwayItem.zone, RailwayItem.qr_ref)).all()
+        per_shard.append(len(rows))
+        misplaced += sum(1 for r in rows if router.shard_for({'item_id': r.item_id, 'zone': r.zone}) != number)
+        bad_hints += sum(1 for r in rows if ref_shard(r.qr_ref) != number)
+    print(f"  items per shard: {per_shard}")
+    expect('every item is on its routed shard', misplaced == 0, f'misplaced={misplaced}')
+    expect('every minted ref names its shard', bad_hints == 0, f'wrong hints={bad_hints}')
+
+    # Single-item path: mint on the routed shard, then look up by ref
+    item = {'item_id': 'SH-NEW-1', 'vendor_lot': 'LOT-NEW', 'item_type': 'liner', 'zone': 'WR',
+            'supply_date': '2024-03-01', 'warranty_period': '5 years'}
+    qr_ref = db.ref_allocator.for_item(item).next_ref()
+    db.save_item(item, qr_ref)
+    home = router.shard_for(item)
+    data, touched = counter.shards_touched(lambda: db.get_item_data_by_qr_ref(qr_ref))
+    db.remove_session()
+    expect('lookup by minted ref queries one shard', data is not None and touched == [home], f'touched={touched}')
+    # Under zone sharding another zone means another shard; under item_id the same one
+    other_zone = next((z for z in ZONES if router.shard_for_zone(z) != home), 'NR')
+    try:
+        db.save_item(dict(item, zone=other_zone), db.ref_allocator.next_ref())
+        duplicate_rejected = False
+    except ValueError:
+        duplicate_rejected = args.key == 'zone'
+    except Exception:
+        # Same shard: its unique constraint rejects the item_id
+        duplicate_rejected = args.key == 'item_id'
+    db.remove_session()
+    expect('an item_id cannot be created on a second shard', duplicate_rejected)
+    if args.key == 'zone' and router.shard_for_zone(other_zone) != home:
+        # Both check the shards before either inserts; the claim on shard 0 lets one through
+        start, outcomes = threading.Barrier(2), []
+
+        def create(zone):
+            start.wait()
+            try:
+                db.save_item(dict(item, item_id='SH-RACE-1', zone=zone), db.ref_allocator.next_ref())
+                outcomes.append('saved')
+            except DuplicateItemError:
+                outcomes.append('duplicate')
+            finally:
+                db.remove_session()
+        threads = [threading.Thread(target=create, args=(zone,)) for zone in ('WR', other_zone)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        holders = [n for n, shard in enumerate(db.shards)
+                   if shard.read_session.execute(select(RailwayItem.id).where(RailwayItem.item_id == 'SH-RACE-1')).scalar()]
+        db.remove_session()
+        expect('concurrent creation on two shards saves one', sorted(outcomes) == ['duplicate', 'saved'] and
+               len(holders) == 1, f'outcomes={sorted(outcomes)} shards={holders}')
+
+    # A pre-sharding ref carries no usable hint; it is found by asking every shard
+    db.shards[0].save_item({'item_id': 'SH-LEGACY', 'vendor_lot': 'LOT-OLD', 'item_type': 'rail_pad'}, 'legacyref001')
+    data, touched = counter.shards_touched(lambda: db.get_item_data_by_qr_ref('legacyref001'))
+    db.remove_session()
+    expect('legacy ref is found by fan-out', data is not None and len(touched) == len(urls), f'touched={touched}')
+    missing, touched = counter.shards_touched(lambda: db.get_item_data_by_qr_ref('nosuchref000'))
+    expect('unknown ref is a miss on every shard', missing is None and len(touched) == len(urls))
+
+    # Writes by ref / item_id go to the owning shard
+    updated, touched = counter.shards_touched(lambda: db.update_item_status(qr_ref, 'under_inspection'))
+    db.remove_session()
+    expect('status update by ref touches one shard', updated is not None and touched == [home], f'touched={touched}')
+    recorded = db.record_inspection('SH-NEW-1', datetime(2024, 6, 1), 'check', 'ok')
+    db.remove_session()
+    expect('inspection recorded on the item shard', recorded is not None and
+           db.list_inspections('SH-NEW-1')[0]['inspected_at'].startswith('2024-06-01'))
+    db.remove_session()
+
+    # Upserts stay where the item is; a zone that belongs elsewhere is rejected under zone sharding
+    first, second = list(fleet(2))
+    moved_zone = next((z for z in ZONES if router.shard_for_zone(z) != router.shard_for(second)), None)
+    upsert = db.bulk_save_items([dict(first, vendor_lot='LOT-UPDATED'), dict(second, zone=moved_zone)],
+                                ref_factory=True)
+    db.remove_session()
+    errors = [e['error'] for b in upsert['batches'] for e in b['errors']]
+    updated = db.search_items({'vendor_lot': 'LOT-UPDATED'})
+    db.remove_session()
+    if args.key == 'zone':
+        expect('upsert in place, cross-shard zone change rejected',
+               upsert['written'] == 1 and len(errors) == 1 and [i.item_id for i in updated] == [first['item_id']],
+               errors[0][:70] if errors else '')
+    else:
+        expect('upserts stay on the item_id shard', upsert['written'] == 2 and not errors)
+    total_items = sum(db.get_rollups(('status',), 100)['status'].values())
+    db.remove_session()
+    extra = 3 if args.key == 'zone' and len(urls) > 1 else 2
+    expect('rollups summed over shards count every item', total_items == args.items + extra, f'total={total_items}')
+
+    # Batched insight write-back: each shard writes its own refs
+    refs = [r['qr_ref'] for r in db.list_items_page({}, ['qr_ref'], None, args.items)[0][::max(1, args.items // 300)]]
+    db.remove_session()
+    written = db.update_item_insights_batch([(ref, {'rescored': True}, 75.0) for ref in refs] +
+                                            [('nosuchref000', {}, 1.0)], chunk_size=100)
+    rescored = 0
+    for shard in db.shards:
+        with shard.read_engine.connect() as conn:
+            rescored += conn.execute(
+                select(func.count()).select_from(RailwayItem).where(RailwayItem.quality_score == 75.0)
+            ).scalar_one()
+    expect('insight batch updates refs on every shard', written['updated'] == len(refs) == rescored and
+           written['missing'] == ['nosuchref000'] and not written['errors'],
+           f"updated={written['updated']}/{len(refs)} over {len({ref_shard(r) for r in refs} - {None})} shards")
+
+    # Scatter-gather
+    if args.key == 'zone':
+        page, touched = counter.shards_touched(lambda: db.list_items_page({'zone': 'CR'}, ['item_id', 'zone'], None, 50))
+        db.remove_session()
+        expect('zone-filtered listing touches one shard',
+               touched == [router.shard_for_zone('CR')] and all(r['zone'] == 'CR' for r in page[0]), f'touched={touched}')
+    seen, cursor, pages = [], None, 0
+    while True:
+        rows, cursor = db.list_items_page({}, ['item_id'], cursor, 500)
+        db.remove_session()
+        seen.extend(r['item_id'] for r in rows)
+        pages += 1
+        if cursor is None:
+            break
+    expect('paging over all shards returns every item once', len(seen) == len(set(seen)) == args.items + extra,
+           f'{len(seen)} rows in {pages} pages')
+    hits, touched = counter.shards_touched(lambda: db.quick_search('LOT-00', 20))
+    db.remove_session()
+    expect('quick search scatters to every shard and merges',
+           len(touched) == len(urls) and len(hits) == 20 and len({h['shard'] for h in hits}) > 1,
+           f"from shards {sorted({h['shard'] for h in hits})}")
+    expiring = db.find_expiring_warranties(3650, limit=200)
+    dates = [i.warranty_expiry_date for i in expiring]
+    expect('expiring warranties merged in date order', len(dates) == 200 and dates == sorted(dates))
+    streamed = sum(1 for _ in db.iter_item_records({'item_type': 'liner'}, ['item_id']))
+    db.remove_session()
+    with_sql = 0
+    for shard in db.shards:
+        with shard.read_engine.connect() as conn:
+            with_sql += conn.execute(
+                select(func.count()).select_from(RailwayItem).where(RailwayItem.item_type == 'liner')
+            ).scalar_one()
+    expect('streamed search sees every shard', streamed == with_sql, f'{streamed} liners')
+
+    print('PASS' if not failures else 'FAIL\n  ' + '\n  '.join(failures))
+    return not failures
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)